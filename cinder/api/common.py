@@ -47,7 +47,12 @@ api_common_opts = [
                      "query volumes. Default values "
                      "are: ['name', 'status', "
                      "'metadata', 'availability_zone' ,"
-                     "'bootable']")
+                     "'bootable']"),
+    cfg.IntOpt('osapi_max_bulk_create_count',
+               default=500,
+               min=1,
+               help='The maximum number of volumes a single bulk volume '
+                    'creation request creates'),
 ]
 
 CONF = cfg.CONF
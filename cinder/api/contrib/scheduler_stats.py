@@ -15,10 +15,12 @@
 """The Scheduler Stats extension"""
 
 from oslo_log import log as logging
+from webob import exc
 
 from cinder.api import extensions
 from cinder.api.openstack import wsgi
 from cinder.api.views import scheduler_stats as scheduler_stats_view
+from cinder import exception
 from cinder.scheduler import rpcapi
 
 
@@ -50,6 +52,22 @@ class SchedulerStatsController(wsgi.Controller):
 
         return self._view_builder.pools(req, pools, detail)
 
+    def get_timings(self, req):
+        """Show the time spent by the scheduler filters and weighers.
+
+        The histograms are the ones of the scheduler process that handles
+        the request, they are not merged across the scheduler services.
+        """
+        context = req.environ['cinder.context']
+        authorize(context, 'get_timings')
+
+        try:
+            timings = self.scheduler_api.get_timings(context)
+        except exception.ServiceTooOld as error:
+            raise exc.HTTPNotImplemented(explanation=error.msg)
+
+        return self._view_builder.timings(req, timings)
+
 
 class Scheduler_stats(extensions.ExtensionDescriptor):
     """Scheduler stats support."""
@@ -64,7 +82,8 @@ class Scheduler_stats(extensions.ExtensionDescriptor):
         res = extensions.ResourceExtension(
             Scheduler_stats.alias,
             SchedulerStatsController(),
-            collection_actions={"get_pools": "GET"})
+            collection_actions={"get_pools": "GET",
+                                "get_timings": "GET"})
 
         resources.append(res)
 
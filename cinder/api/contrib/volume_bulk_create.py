@@ -0,0 +1,132 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import uuidutils
+from webob import exc
+
+from cinder.api import extensions
+from cinder.api.openstack import wsgi
+from cinder.api.v2.views import volumes as volume_views
+from cinder.api.v2 import volumes
+from cinder import exception
+from cinder.i18n import _LI
+from cinder import volume as cinder_volume
+from cinder.volume import volume_types
+
+CONF = cfg.CONF
+CONF.import_opt('osapi_max_bulk_create_count', 'cinder.api.common')
+
+LOG = logging.getLogger(__name__)
+authorize = extensions.extension_authorizer('volume', 'volume_bulk_create')
+
+
+class VolumeBulkCreateController(wsgi.Controller):
+    """The /os-volume-bulk-create controller for the OpenStack API."""
+
+    _view_builder_class = volume_views.ViewBuilder
+
+    def __init__(self, *args, **kwargs):
+        super(VolumeBulkCreateController, self).__init__(*args, **kwargs)
+        self.volume_api = cinder_volume.API()
+
+    @wsgi.response(202)
+    @wsgi.serializers(xml=volumes.VolumesTemplate)
+    @wsgi.deserializers(xml=volumes.CreateDeserializer)
+    def create(self, req, body):
+        """Create several identical volumes.
+
+        The volumes are created like with a volume create request, then
+        sent to the scheduler in a single request so that it can place them
+        in one pass.
+
+        Required HTTP Body:
+
+        {
+         'volume':
+          {
+           'count': <Number of volumes to create, at most
+                     osapi_max_bulk_create_count>,
+           'size':  <Size of each volume in GB>,
+          }
+        }
+
+        Optional elements to 'volume' are:
+            name               A name for the new volumes.
+            description        A description for the new volumes.
+            volume_type        ID or name of the volume type of the new
+                               volumes.
+            metadata           Key/value pairs to be associated with the new
+                               volumes.
+            availability_zone  The availability zone of the new volumes.
+            scheduler_hints    Hints for the scheduler, applied to each
+                               volume.
+        """
+        context = req.environ['cinder.context']
+        authorize(context)
+
+        self.assert_valid_body(body, 'volume')
+
+        volume = body['volume']
+        self.validate_name_and_description(volume)
+
+        count = self.validate_integer(
+            volume.get('count'), 'count', min_value=1,
+            max_value=CONF.osapi_max_bulk_create_count)
+        size = self.validate_integer(volume.get('size'), 'size',
+                                     min_value=1)
+
+        LOG.debug('Bulk create volume request body: %s', body)
+
+        kwargs = {}
+        req_volume_type = volume.get('volume_type', None)
+        if req_volume_type:
+            try:
+                if not uuidutils.is_uuid_like(req_volume_type):
+                    kwargs['volume_type'] = \
+                        volume_types.get_volume_type_by_name(
+                            context, req_volume_type)
+                else:
+                    kwargs['volume_type'] = volume_types.get_volume_type(
+                        context, req_volume_type)
+            except exception.VolumeTypeNotFound as error:
+                raise exc.HTTPNotFound(explanation=error.msg)
+
+        kwargs['metadata'] = volume.get('metadata', None)
+        kwargs['availability_zone'] = volume.get('availability_zone', None)
+        kwargs['scheduler_hints'] = volume.get('scheduler_hints', None)
+
+        LOG.info(_LI("Create %(count)d volumes of %(size)s GB"),
+                 {'count': count, 'size': size}, context=context)
+
+        new_volumes = self.volume_api.create_volumes(
+            context, count, size, volume.get('name'),
+            volume.get('description'), **kwargs)
+
+        return self._view_builder.detail_list(req, new_volumes)
+
+
+class Volume_bulk_create(extensions.ExtensionDescriptor):
+    """Create several identical volumes in one request."""
+
+    name = 'VolumeBulkCreate'
+    alias = 'os-volume-bulk-create'
+    namespace = ('http://docs.openstack.org/volume/ext/'
+                 'os-volume-bulk-create/api/v1')
+    updated = '2016-10-01T00:00:00+00:00'
+
+    def get_resources(self):
+        controller = VolumeBulkCreateController()
+        res = extensions.ResourceExtension(Volume_bulk_create.alias,
+                                           controller)
+        return [res]
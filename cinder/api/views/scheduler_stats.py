@@ -51,3 +51,12 @@ class ViewBuilder(common.ViewBuilder):
         pools_dict = dict(pools=plist)
 
         return pools_dict
+
+    def timings(self, request, timings):
+        """View of the histograms of the scheduler filters and weighers."""
+        return {
+            'timings': {
+                'filters': timings.get('filters', {}),
+                'weighers': timings.get('weighers', {}),
+            }
+        }
@@ -22,11 +22,16 @@
 """
 
 import abc
+import bisect
+import collections
+import functools
 import hashlib
 import json
 import os
+import uuid
 
 import eventlet
+from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_service import loopingcall
@@ -46,13 +51,252 @@ LOG = logging.getLogger(__name__)
 chunkedbackup_service_opts = [
     cfg.StrOpt('backup_compression_algorithm',
                default='zlib',
-               help='Compression algorithm (None to disable)'),
+               help='Compression algorithm (None to disable). zlib, bz2, '
+                    'zstd and lz4 are supported, zstd and lz4 require the '
+                    'zstandard and lz4 Python packages.'),
+    cfg.IntOpt('backup_compression_level',
+               help='Compression level of backup_compression_algorithm. '
+                    'Its valid range depends on the algorithm, the default '
+                    'level of the algorithm is used when it is unset.'),
+    cfg.IntOpt('backup_object_writers',
+               default=1,
+               min=1,
+               help='Number of backup objects that are compressed and '
+                    'written to the backup repository concurrently while '
+                    'the next chunk of the volume is read and hashed. Each '
+                    'writer holds at most one chunk of data in memory.'),
+    cfg.IntOpt('backup_restore_prefetch_objects',
+               default=0,
+               min=0,
+               help='Number of backup objects downloaded and decompressed '
+                    'concurrently ahead of the one being written to the '
+                    'volume during a restore. Each prefetched object is '
+                    'held in memory, 0 disables prefetching.'),
+    cfg.IntOpt('backup_restore_fsync_interval',
+               default=0,
+               min=0,
+               help='Number of backup objects written to the volume between '
+                    'two fsync calls during a restore. 0 means the volume '
+                    'is only synced once, at the end of the restore.'),
+    cfg.BoolOpt('backup_dedup',
+                default=False,
+                help='Store the blocks of new backups once in a '
+                     'content-addressed store shared by all the backups of '
+                     'the backup repository, so that identical blocks of '
+                     'different volumes and backups are only uploaded '
+                     'once. Ignored by the drivers using a repository per '
+                     'project, such as the Swift driver in per_user '
+                     'authentication mode.'),
+    cfg.IntOpt('backup_dedup_block_size',
+               default=4 * units.Mi,
+               min=units.Mi,
+               help='Size in bytes of the blocks of the deduplication '
+                    'store, rounded down to a multiple of the hash block '
+                    'size of the backup driver. Each block is an object '
+                    'of the backup repository and a database row.'),
+    cfg.BoolOpt('backup_sparse',
+                default=False,
+                help='Record the hash blocks of a volume that only hold '
+                     'zeroes as holes in the backup metadata instead of '
+                     'storing them, and punch holes in the volume instead '
+                     'of writing zeroes when they are restored.'),
+    cfg.StrOpt('backup_dedup_container',
+               default='backup_dedup',
+               help='Container, bucket or directory of the backup '
+                    'repository holding the deduplicated blocks. It must '
+                    'not be used as the container of any backup.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(chunkedbackup_service_opts)
 
 
+class _Compressor(object):
+    """Compression library with the compress/decompress interface of zlib."""
+
+    def __init__(self, compress, decompress):
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _zstd_compress(zstandard, level, data):
+    # Compression contexts are not thread safe and chunks are compressed
+    # concurrently, so every chunk gets its own.
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _zstd_decompress(zstandard, data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def get_compressor(algorithm, level=None):
+    """Return the compressor of an algorithm, None for no compression.
+
+       The returned object has the compress and decompress functions of the
+       zlib module. Objects store the name of the algorithm used, so every
+       algorithm remains supported for decompression.
+    """
+    try:
+        if algorithm.lower() in ('none', 'off', 'no'):
+            return None
+        elif algorithm.lower() in ('zlib', 'gzip'):
+            import zlib as compressor
+            if level is None:
+                return compressor
+            return _Compressor(lambda data: compressor.compress(data, level),
+                               compressor.decompress)
+        elif algorithm.lower() in ('bz2', 'bzip2'):
+            import bz2 as compressor
+            if level is None:
+                return compressor
+            return _Compressor(lambda data: compressor.compress(data, level),
+                               compressor.decompress)
+        elif algorithm.lower() in ('zstd', 'zstandard'):
+            import zstandard
+            if level is None:
+                level = 3
+            return _Compressor(
+                functools.partial(_zstd_compress, zstandard, level),
+                functools.partial(_zstd_decompress, zstandard))
+        elif algorithm.lower() == 'lz4':
+            import lz4.frame
+            if level is None:
+                level = 0
+            return _Compressor(
+                functools.partial(lz4.frame.compress,
+                                  compression_level=level),
+                lz4.frame.decompress)
+    except ImportError:
+        pass
+
+    err = _('unsupported compression algorithm: %s') % algorithm
+    raise ValueError(err)
+
+
+class _RestoredExtents(object):
+    """Disjoint, sorted byte ranges of a volume that are already claimed.
+
+       Restores walk a backup chain from the newest backup to the oldest one,
+       so any range claimed before has been overwritten by a later backup.
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def claim(self, start, end):
+        """Claim [start, end) and return the sub-ranges not claimed before."""
+        first = bisect.bisect_right(self._ends, start)
+        last = first
+        free = []
+        pos = start
+        while last < len(self._starts) and self._starts[last] < end:
+            if self._starts[last] > pos:
+                free.append((pos, self._starts[last]))
+            pos = max(pos, self._ends[last])
+            last += 1
+        if pos < end:
+            free.append((pos, end))
+
+        if last > first:
+            start = min(start, self._starts[first])
+            end = max(end, self._ends[last - 1])
+        self._starts[first:last] = [start]
+        self._ends[first:last] = [end]
+        return free
+
+
+def _dedup_key(sha256s):
+    """Return the key of the dedup block made of the given hash blocks."""
+    if len(sha256s) == 1:
+        return sha256s[0]
+    return hashlib.sha256(''.join(sha256s).encode('utf-8')).hexdigest()
+
+
+def _dedup_units(sha256s, unit_blocks, chunk_blocks):
+    """Yield the key, first and last hash block of each dedup block.
+
+       A dedup block is made of unit_blocks consecutive hash blocks and
+       never spans two chunks of chunk_blocks hash blocks.
+    """
+    for chunk_first in range(0, len(sha256s), chunk_blocks):
+        chunk_last = min(chunk_first + chunk_blocks, len(sha256s))
+        for first in range(chunk_first, chunk_last, unit_blocks):
+            last = min(first + unit_blocks, chunk_last)
+            yield _dedup_key(sha256s[first:last]), first, last
+
+
+class _DedupReferences(object):
+    """References a backup holds on the blocks of the dedup store."""
+
+    def __init__(self, container):
+        self.container = container
+        self.blocks = {}
+        self.refs = collections.Counter()
+
+    def add(self, sha256, count, block):
+        self.blocks[sha256] = [block.object_name, block.compression,
+                               block.length]
+        self.refs[sha256] += count
+
+
+class _ObjectWriterPool(object):
+    """Bounded pool of greenthreads writing backup objects.
+
+       spawn() blocks while all writers are busy, so the number of chunks
+       held in memory stays bounded no matter how fast the volume is read.
+    """
+
+    def __init__(self, size):
+        self._pool = eventlet.GreenPool(size)
+        self._pending = []
+        self._aborted = False
+
+    def spawn(self, func, *args, **kwargs):
+        self._reap()
+        self._pending.append(self._pool.spawn(self._run, func, *args,
+                                              **kwargs))
+
+    def _run(self, func, *args, **kwargs):
+        # The writers that did not start before the abort are skipped.
+        if not self._aborted:
+            func(*args, **kwargs)
+
+    def _reap(self):
+        # Surface the failure of a finished writer as early as possible
+        # instead of reading the rest of the volume first.
+        pending = []
+        for writer in self._pending:
+            if writer.dead:
+                writer.wait()
+            else:
+                pending.append(writer)
+        self._pending = pending
+
+    def wait(self):
+        """Wait for all writers, re-raising the first failure."""
+        pending, self._pending = self._pending, []
+        for writer in pending:
+            writer.wait()
+
+    def abort(self):
+        """Skip the writers not started yet and wait for the others.
+
+           The running writers are not killed: one killed between the
+           write of an object and the database update recording it would
+           leave an unknown object or dedup reference behind.
+        """
+        self._aborted = True
+        pending, self._pending = self._pending, []
+        for writer in pending:
+            try:
+                writer.wait()
+            except Exception:
+                # The failure aborting the backup is the one reported.
+                LOG.debug('Backup object writer failed during abort.',
+                          exc_info=True)
+
+
 @six.add_metaclass(abc.ABCMeta)
 class ChunkedBackupDriver(driver.BackupDriver):
     """Abstract chunked backup driver.
@@ -66,23 +310,14 @@ class ChunkedBackupDriver(driver.BackupDriver):
     """
 
     DRIVER_VERSION = '1.0.0'
-    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1'}
+    # Backups with holes or using the dedup store can not be restored by
+    # older drivers.
+    EXTENDED_DRIVER_VERSION = '1.1.0'
+    DRIVER_VERSION_MAPPING = {'1.0.0': '_plan_restore_v1',
+                              '1.1.0': '_plan_restore_v1'}
 
     def _get_compressor(self, algorithm):
-        try:
-            if algorithm.lower() in ('none', 'off', 'no'):
-                return None
-            elif algorithm.lower() in ('zlib', 'gzip'):
-                import zlib as compressor
-                return compressor
-            elif algorithm.lower() in ('bz2', 'bzip2'):
-                import bz2 as compressor
-                return compressor
-        except ImportError:
-            pass
-
-        err = _('unsupported compression algorithm: %s') % algorithm
-        raise ValueError(err)
+        return get_compressor(algorithm, CONF.backup_compression_level)
 
     def __init__(self, context, chunk_size_bytes, sha_block_size_bytes,
                  backup_default_container, enable_progress_timer,
@@ -99,8 +334,29 @@ class ChunkedBackupDriver(driver.BackupDriver):
         self.backup_compression_algorithm = CONF.backup_compression_algorithm
         self.compressor = \
             self._get_compressor(CONF.backup_compression_algorithm)
+        self.object_writers = CONF.backup_object_writers
+        self.restore_prefetch_objects = CONF.backup_restore_prefetch_objects
+        self.restore_fsync_interval = CONF.backup_restore_fsync_interval
+        self.dedup = CONF.backup_dedup
+        if self.dedup and self._repository_per_project():
+            # A block stored in the repository of a project can't be
+            # referenced by the backups of the others.
+            LOG.warning(_LW('backup_dedup is ignored, the backup '
+                            'repository of %s is per project.'),
+                        self.__class__.__name__)
+            self.dedup = False
+        self.dedup_container = CONF.backup_dedup_container
+        self.dedup_unit_blocks = max(
+            1, CONF.backup_dedup_block_size // sha_block_size_bytes)
+        self.sparse = CONF.backup_sparse
+        self.zero_sha256 = hashlib.sha256(
+            b'\0' * self.sha_block_size_bytes).hexdigest()
         self.support_force_delete = True
 
+    def _repository_per_project(self):
+        """Return whether each project has its own backup repository."""
+        return False
+
     # To create your own "chunked" backup driver, implement the following
     # abstract methods.
 
@@ -198,13 +454,27 @@ class ChunkedBackupDriver(driver.BackupDriver):
         return filename
 
     def _write_metadata(self, backup, volume_id, container, object_list,
-                        volume_meta, extra_metadata=None):
+                        volume_meta, extra_metadata=None, dedup=None,
+                        holes=None):
         filename = self._metadata_filename(backup)
         LOG.debug('_write_metadata started, container name: %(container)s,'
                   ' metadata filename: %(filename)s.',
                   {'container': container, 'filename': filename})
         metadata = {}
         metadata['version'] = self.DRIVER_VERSION
+        if dedup is not None:
+            # The blocks of the volume are listed in the sha256 file, the
+            # metadata maps every distinct one to its object in the store.
+            metadata['version'] = self.EXTENDED_DRIVER_VERSION
+            metadata['dedup_container'] = dedup.container
+            metadata['dedup_blocks'] = dedup.blocks
+            metadata['dedup_block_size'] = (self.dedup_unit_blocks *
+                                            self.sha_block_size_bytes)
+            metadata['dedup_chunk_size'] = self.chunk_size_bytes
+        if holes:
+            # [offset, length] of the zero extents that have no object.
+            metadata['version'] = self.EXTENDED_DRIVER_VERSION
+            metadata['holes'] = holes
         metadata['backup_id'] = backup['id']
         metadata['volume_id'] = volume_id
         metadata['backup_name'] = backup['display_name']
@@ -308,8 +578,14 @@ class ChunkedBackupDriver(driver.BackupDriver):
                 volume_size_bytes)
 
     def _backup_chunk(self, backup, container, data, data_offset,
-                      object_meta, extra_metadata):
-        """Backup data chunk based on the object metadata and offset."""
+                      object_meta, extra_metadata, writer_pool=None):
+        """Backup data chunk based on the object metadata and offset.
+
+           The object is registered in the object list right away so that
+           the metadata keeps the order in which the volume was read. When a
+           writer pool is given, compressing and writing the object happens
+           in the background.
+        """
         object_prefix = object_meta['prefix']
         object_list = object_meta['list']
 
@@ -319,25 +595,173 @@ class ChunkedBackupDriver(driver.BackupDriver):
         obj[object_name] = {}
         obj[object_name]['offset'] = data_offset
         obj[object_name]['length'] = len(data)
+        object_list.append(obj)
+        object_id += 1
+        object_meta['list'] = object_list
+        object_meta['id'] = object_id
+
+        if writer_pool is None:
+            self._write_chunk(container, object_name, data, obj[object_name],
+                              extra_metadata)
+        else:
+            writer_pool.spawn(self._write_chunk, container, object_name,
+                              data, obj[object_name], extra_metadata)
+
+        LOG.debug('Calling eventlet.sleep(0)')
+        eventlet.sleep(0)
+
+    def _write_chunk(self, container, object_name, data, obj,
+                     extra_metadata):
+        """Compress a chunk and store it as a backup object."""
         LOG.debug('Backing up chunk of data from volume.')
-        algorithm, output_data = self._prepare_output_data(data)
-        obj[object_name]['compression'] = algorithm
+        # zlib, bz2 and hashlib release the GIL, so running them in native
+        # threads lets several chunks use several cores.
+        algorithm, output_data = tpool.execute(self._prepare_output_data,
+                                               data)
+        obj['compression'] = algorithm
         LOG.debug('About to put_object')
         with self.get_object_writer(
                 container, object_name, extra_metadata=extra_metadata
         ) as writer:
             writer.write(output_data)
-        md5 = hashlib.md5(data).hexdigest()
-        obj[object_name]['md5'] = md5
+        md5 = tpool.execute(self._calculate_md5, data)
+        obj['md5'] = md5
         LOG.debug('backup MD5 for %(object_name)s: %(md5)s',
                   {'object_name': object_name, 'md5': md5})
-        object_list.append(obj)
-        object_id += 1
-        object_meta['list'] = object_list
-        object_meta['id'] = object_id
 
-        LOG.debug('Calling eventlet.sleep(0)')
-        eventlet.sleep(0)
+    @staticmethod
+    def _calculate_md5(data):
+        return hashlib.md5(data).hexdigest()
+
+    def _calculate_shas(self, data):
+        """Return the sha256 of every sha block of a chunk of data."""
+        shalist = []
+        off = 0
+        datalen = len(data)
+        while off < datalen:
+            chunk_start = off
+            chunk_end = chunk_start + self.sha_block_size_bytes
+            if chunk_end > datalen:
+                chunk_end = datalen
+            chunk = data[chunk_start:chunk_end]
+            sha = hashlib.sha256(chunk).hexdigest()
+            shalist.append(sha)
+            off += self.sha_block_size_bytes
+        return shalist
+
+    def _is_zero_block(self, sha, length):
+        if length == self.sha_block_size_bytes:
+            return sha == self.zero_sha256
+        return sha == hashlib.sha256(b'\0' * length).hexdigest()
+
+    def _chunk_extents(self, shalist, datalen, parent_shalist=None,
+                       shaindex=0):
+        """Split a chunk into the extents that must be backed up.
+
+           Returns a list of (start, end, is_hole) tuples of offsets in the
+           chunk. Blocks unchanged since the parent backup are left out, when
+           sparse backups are enabled zero blocks form hole extents.
+        """
+        extents = []
+        for idx, sha in enumerate(shalist):
+            if (parent_shalist is not None and
+                    sha == parent_shalist[shaindex + idx]):
+                continue
+            start = idx * self.sha_block_size_bytes
+            end = min(start + self.sha_block_size_bytes, datalen)
+            is_hole = self.sparse and self._is_zero_block(sha, end - start)
+            if extents and extents[-1][1] == start and \
+                    extents[-1][2] == is_hole:
+                extents[-1] = (extents[-1][0], end, is_hole)
+            else:
+                extents.append((start, end, is_hole))
+        return extents
+
+    @staticmethod
+    def _add_hole(holes, offset, length):
+        if holes and holes[-1][0] + holes[-1][1] == offset:
+            holes[-1][1] += length
+        else:
+            holes.append([offset, length])
+
+    def _backup_dedup_chunk(self, data, shalist, extents, dedup,
+                            extra_metadata, writer_pool):
+        """Reference the dedup blocks holding data extents of a chunk.
+
+           Blocks already in the dedup store are referenced with one query,
+           the other ones are stored by the writer pool.
+        """
+        block_size = self.sha_block_size_bytes
+        data_blocks = set(block_start // block_size
+                          for start, end, is_hole in extents if not is_hole
+                          for block_start in range(start, end, block_size))
+        units = [(key, first, last) for key, first, last in
+                 _dedup_units(shalist, self.dedup_unit_blocks, len(shalist))
+                 if any(idx in data_blocks for idx in range(first, last))]
+        if not units:
+            return
+        counts = collections.Counter(key for key, _first, _last in units)
+        blocks = self.db.backup_dedup_blocks_ref(self.context,
+                                                 dedup.container, counts)
+        for key, block in blocks.items():
+            dedup.add(key, counts[key], block)
+
+        spawned = set(blocks)
+        for key, first, last in units:
+            if key in spawned:
+                continue
+            spawned.add(key)
+            block_data = data[first * block_size:last * block_size]
+            writer_pool.spawn(self._store_dedup_block, dedup, key, block_data,
+                              counts[key], extra_metadata)
+
+    def _store_dedup_block(self, dedup, sha, data, count, extra_metadata):
+        """Reference a block of the dedup store, storing it if needed."""
+        output = None
+        while True:
+            # The block may have been stored since the chunk was looked up,
+            # by this backup or by a concurrent one.
+            block = self.db.backup_dedup_blocks_ref(
+                self.context, dedup.container, {sha: count}).get(sha)
+            if block is not None:
+                break
+
+            # Every copy of a block gets a new object name, so that storing
+            # it never races with the deletion of a previous copy.
+            object_name = '%s-%s' % (sha, uuid.uuid4().hex)
+            if output is None:
+                output = tpool.execute(self._prepare_output_data, data)
+            algorithm, output_data = output
+            with self.get_object_writer(
+                    dedup.container, object_name,
+                    extra_metadata=extra_metadata) as writer:
+                writer.write(output_data)
+            try:
+                block = self.db.backup_dedup_block_create(
+                    self.context, dedup.container, sha,
+                    {'object_name': object_name,
+                     'compression': algorithm,
+                     'length': len(data),
+                     'refcount': count})
+                break
+            except exception.BackupDedupBlockExists:
+                LOG.debug('Block %s was stored by a concurrent backup.', sha)
+                self.delete_object(dedup.container, object_name)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self.delete_object(dedup.container, object_name)
+        dedup.add(sha, count, block)
+
+    def _release_dedup_blocks(self, container, refs):
+        """Drop references to dedup blocks, deleting unreferenced ones."""
+        object_names = self.db.backup_dedup_blocks_unref(self.context,
+                                                         container, refs)
+        for object_name in object_names:
+            self.delete_object(container, object_name)
+            LOG.debug('deleted dedup block: %(object_name)s'
+                      ' in container: %(container)s.',
+                      {'object_name': object_name, 'container': container})
+            eventlet.sleep(0)
 
     def _prepare_output_data(self, data):
         if self.compressor is None:
@@ -363,7 +787,8 @@ class ChunkedBackupDriver(driver.BackupDriver):
                    })
         return algorithm, compressed_data
 
-    def _finalize_backup(self, backup, container, object_meta, object_sha256):
+    def _finalize_backup(self, backup, container, object_meta, object_sha256,
+                         dedup=None, holes=None):
         """Write the backup's metadata to the backup repository."""
         object_list = object_meta['list']
         object_id = object_meta['id']
@@ -379,7 +804,9 @@ class ChunkedBackupDriver(driver.BackupDriver):
                              container,
                              object_list,
                              volume_meta,
-                             extra_metadata)
+                             extra_metadata,
+                             dedup,
+                             holes)
         backup.object_count = object_id
         backup.save()
         LOG.debug('backup %s finished.', backup['id'])
@@ -454,6 +881,10 @@ class ChunkedBackupDriver(driver.BackupDriver):
 
         (object_meta, object_sha256, extra_metadata, container,
          volume_size_bytes) = self._prepare_backup(backup)
+        dedup = None
+        if self.dedup:
+            dedup = _DedupReferences(self.dedup_container)
+            self.put_container(dedup.container)
 
         counter = 0
         total_block_sent_num = 0
@@ -475,87 +906,95 @@ class ChunkedBackupDriver(driver.BackupDriver):
 
         sha256_list = object_sha256['sha256s']
         shaindex = 0
+        holes = []
         is_backup_canceled = False
-        while True:
-            # First of all, we check the status of this backup. If it
-            # has been changed to delete or has been deleted, we cancel the
-            # backup process to do forcing delete.
-            backup = objects.Backup.get_by_id(self.context, backup.id)
-            if backup.status in (fields.BackupStatus.DELETING,
-                                 fields.BackupStatus.DELETED):
-                is_backup_canceled = True
-                # To avoid the chunk left when deletion complete, need to
-                # clean up the object of chunk again.
-                self.delete(backup)
-                LOG.debug('Cancel the backup process of %s.', backup.id)
-                break
-            data_offset = volume_file.tell()
-            data = volume_file.read(self.chunk_size_bytes)
-            if data == b'':
-                break
-
-            # Calculate new shas with the datablock.
-            shalist = []
-            off = 0
-            datalen = len(data)
-            while off < datalen:
-                chunk_start = off
-                chunk_end = chunk_start + self.sha_block_size_bytes
-                if chunk_end > datalen:
-                    chunk_end = datalen
-                chunk = data[chunk_start:chunk_end]
-                sha = hashlib.sha256(chunk).hexdigest()
-                shalist.append(sha)
-                off += self.sha_block_size_bytes
-            sha256_list.extend(shalist)
-
-            # If parent_backup is not None, that means an incremental
-            # backup will be performed.
-            if parent_backup:
-                # Find the extent that needs to be backed up.
-                extent_off = -1
-                for idx, sha in enumerate(shalist):
-                    if sha != parent_backup_shalist[shaindex]:
-                        if extent_off == -1:
-                            # Start of new extent.
-                            extent_off = idx * self.sha_block_size_bytes
-                    else:
-                        if extent_off != -1:
-                            # We've reached the end of extent.
-                            extent_end = idx * self.sha_block_size_bytes
+        # Reading and hashing happen here while up to object_writers
+        # previously read chunks are compressed and written concurrently.
+        writer_pool = _ObjectWriterPool(self.object_writers)
+        try:
+            while True:
+                # First of all, we check the status of this backup. If it
+                # has been changed to delete or has been deleted, we cancel
+                # the backup process to do forcing delete.
+                backup = objects.Backup.get_by_id(self.context, backup.id)
+                if backup.status in (fields.BackupStatus.DELETING,
+                                     fields.BackupStatus.DELETED):
+                    is_backup_canceled = True
+                    # Wait for the in-flight writers so that no object is
+                    # created after the clean up.
+                    writer_pool.abort()
+                    if dedup is not None:
+                        self._release_dedup_blocks(dedup.container,
+                                                   dedup.refs)
+                    # To avoid the chunk left when deletion complete, need
+                    # to clean up the object of chunk again.
+                    self.delete(backup)
+                    LOG.debug('Cancel the backup process of %s.', backup.id)
+                    break
+                data_offset = volume_file.tell()
+                data = tpool.execute(volume_file.read, self.chunk_size_bytes)
+                if data == b'':
+                    break
+
+                # Calculate new shas with the datablock.
+                shalist = tpool.execute(self._calculate_shas, data)
+                datalen = len(data)
+                sha256_list.extend(shalist)
+
+                # If parent_backup is not None, that means an incremental
+                # backup will be performed and only the extents changed since
+                # the parent backup are backed up.
+                if parent_backup and dedup is None:
+                    extents = self._chunk_extents(shalist, datalen,
+                                                  parent_backup_shalist,
+                                                  shaindex)
+                else:
+                    extents = self._chunk_extents(shalist, datalen)
+                shaindex += len(shalist)
+                for extent_off, extent_end, is_hole in extents:
+                    if is_hole:
+                        self._add_hole(holes, data_offset + extent_off,
+                                       extent_end - extent_off)
+                # With the dedup store every block is referenced, blocks
+                # unchanged since the parent backup are simply not uploaded.
+                if dedup is not None:
+                    self._backup_dedup_chunk(data, shalist, extents, dedup,
+                                             extra_metadata, writer_pool)
+                else:
+                    for extent_off, extent_end, is_hole in extents:
+                        if is_hole:
+                            continue
+                        segment = data
+                        if extent_end - extent_off < datalen:
                             segment = data[extent_off:extent_end]
-                            self._backup_chunk(backup, container, segment,
-                                               data_offset + extent_off,
-                                               object_meta,
-                                               extra_metadata)
-                            extent_off = -1
-                    shaindex += 1
-
-                # The last extent extends to the end of data buffer.
-                if extent_off != -1:
-                    extent_end = datalen
-                    segment = data[extent_off:extent_end]
-                    self._backup_chunk(backup, container, segment,
-                                       data_offset + extent_off,
-                                       object_meta, extra_metadata)
-                    extent_off = -1
-            else:  # Do a full backup.
-                self._backup_chunk(backup, container, data, data_offset,
-                                   object_meta, extra_metadata)
-
-            # Notifications
-            total_block_sent_num += self.data_block_num
-            counter += 1
-            if counter == self.data_block_num:
-                # Send the notification to Ceilometer when the chunk
-                # number reaches the data_block_num.  The backup percentage
-                # is put in the metadata as the extra information.
-                self._send_progress_notification(self.context, backup,
-                                                 object_meta,
-                                                 total_block_sent_num,
-                                                 volume_size_bytes)
-                # Reset the counter
-                counter = 0
+                        self._backup_chunk(backup, container, segment,
+                                           data_offset + extent_off,
+                                           object_meta, extra_metadata,
+                                           writer_pool=writer_pool)
+
+                # Notifications
+                total_block_sent_num += self.data_block_num
+                counter += 1
+                if counter == self.data_block_num:
+                    # Send the notification to Ceilometer when the chunk
+                    # number reaches the data_block_num.  The backup
+                    # percentage is put in the metadata as the extra
+                    # information.
+                    self._send_progress_notification(self.context, backup,
+                                                     object_meta,
+                                                     total_block_sent_num,
+                                                     volume_size_bytes)
+                    # Reset the counter
+                    counter = 0
+
+            # All the chunks have been read, wait for the last writes.
+            writer_pool.wait()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                writer_pool.abort()
+                timer.stop()
+                if dedup is not None:
+                    self._release_dedup_blocks(dedup.container, dedup.refs)
 
         # Stop the timer.
         timer.stop()
@@ -575,19 +1014,18 @@ class ChunkedBackupDriver(driver.BackupDriver):
                 with excutils.save_and_reraise_exception():
                     LOG.exception(_LE("Backup volume metadata failed: %s."),
                                   err)
+                    if dedup is not None:
+                        self._release_dedup_blocks(dedup.container,
+                                                   dedup.refs)
                     self.delete(backup)
 
-        self._finalize_backup(backup, container, object_meta, object_sha256)
+        self._finalize_backup(backup, container, object_meta, object_sha256,
+                              dedup, holes)
 
-    def _restore_v1(self, backup, volume_id, metadata, volume_file):
-        """Restore a v1 volume backup."""
-        backup_id = backup['id']
-        LOG.debug('v1 volume backup restore of %s started.', backup_id)
-        extra_metadata = metadata.get('extra_metadata')
-        container = backup['container']
-        metadata_objects = metadata['objects']
+    def _check_restore_objects(self, backup, metadata):
+        """Check the backup repository holds the objects in the metadata."""
         metadata_object_names = []
-        for obj in metadata_objects:
+        for obj in metadata['objects']:
             metadata_object_names.extend(obj.keys())
         LOG.debug('metadata_object_names = %s.', metadata_object_names)
         prune_list = [self._metadata_filename(backup),
@@ -600,52 +1038,202 @@ class ChunkedBackupDriver(driver.BackupDriver):
                     'does not match object list stored in metadata.')
             raise exception.InvalidBackup(reason=err)
 
-        for metadata_object in metadata_objects:
-            object_name, obj = list(metadata_object.items())[0]
-            LOG.debug('restoring object. backup: %(backup_id)s, '
-                      'container: %(container)s, object name: '
-                      '%(object_name)s, volume: %(volume_id)s.',
-                      {
-                          'backup_id': backup_id,
-                          'container': container,
-                          'object_name': object_name,
-                          'volume_id': volume_id,
-                      })
-
-            with self.get_object_reader(
-                    container, object_name,
-                    extra_metadata=extra_metadata) as reader:
-                body = reader.read()
-            compression_algorithm = metadata_object[object_name]['compression']
-            decompressor = self._get_compressor(compression_algorithm)
-            volume_file.seek(obj['offset'])
-            if decompressor is not None:
-                LOG.debug('decompressing data using %s algorithm',
-                          compression_algorithm)
-                decompressed = decompressor.decompress(body)
-                volume_file.write(decompressed)
-            else:
-                volume_file.write(body)
-
-            # force flush every write to avoid long blocking write on close
-            volume_file.flush()
+    def _plan_restore(self, backup_chain):
+        """Return the objects of a backup chain that must be restored.
 
-            # Be tolerant to IO implementations that do not support fileno()
-            try:
-                fileno = volume_file.fileno()
-            except IOError:
-                LOG.info(_LI("volume_file does not support "
-                             "fileno() so skipping "
-                             "fsync()"))
-            else:
-                os.fsync(fileno)
-
-            # Restoring a backup to a volume can take some time. Yield so other
-            # threads can run, allowing for among other things the service
-            # status to be updated
-            eventlet.sleep(0)
-        LOG.debug('v1 volume backup restore of %s finished.',
-                  backup_id)
+           backup_chain is a list of (backup, metadata) tuples, newest backup
+           first. Every returned item holds the volume extents the object
+           still provides once the whole chain is applied, objects completely
+           overwritten by later incremental backups are left out. The items
+           of each backup are planned by the method DRIVER_VERSION_MAPPING
+           maps its metadata version to.
+        """
+        restored_extents = _RestoredExtents()
+        restore_items = []
+        for backup, metadata in backup_chain:
+            plan_func = getattr(
+                self, self.DRIVER_VERSION_MAPPING[metadata['version']])
+            restore_items.extend(plan_func(backup, metadata,
+                                           restored_extents))
+        # Extents of different items never overlap, so writing them in
+        # volume order gives sequential I/O without changing the result.
+        restore_items.sort(key=lambda item: item[2]['offset'])
+        return restore_items
+
+    def _plan_restore_v1(self, backup, metadata, restored_extents):
+        """Return the restore items of a v1 volume backup."""
+        self._check_restore_objects(backup, metadata)
+        extra_metadata = metadata.get('extra_metadata')
+        restore_items = []
+        if 'dedup_container' in metadata:
+            restore_items.extend(self._plan_dedup_restore(
+                backup, metadata, restored_extents))
+        for offset, length in metadata.get('holes', []):
+            # Holes have no object, their extents are zeroed.
+            extents = restored_extents.claim(offset, offset + length)
+            if extents:
+                restore_items.append((None, None,
+                                      {'offset': offset, 'length': length},
+                                      None, extents))
+        for metadata_object in metadata['objects']:
+            object_name, obj = list(metadata_object.items())[0]
+            extents = restored_extents.claim(
+                obj['offset'], obj['offset'] + obj['length'])
+            if not extents:
+                LOG.debug('Skipping object %(object_name)s of backup '
+                          '%(backup_id)s, it is overwritten by a later '
+                          'backup.',
+                          {'object_name': object_name,
+                           'backup_id': backup['id']})
+                continue
+            restore_items.append((backup['container'], object_name, obj,
+                                  extra_metadata, extents))
+        return restore_items
+
+    def _plan_dedup_restore(self, backup, metadata, restored_extents):
+        """Return the restore items of a backup using the dedup store."""
+        container = metadata['dedup_container']
+        dedup_blocks = metadata['dedup_blocks']
+        extra_metadata = metadata.get('extra_metadata')
+        sha256file = self._read_sha256file(backup)
+        block_size = sha256file['chunk_size']
+        restore_items = []
+        for key, first, _last in self._dedup_units(metadata, sha256file):
+            if key not in dedup_blocks:
+                # Zero blocks are holes of the backup.
+                continue
+            object_name, compression, length = dedup_blocks[key]
+            obj = {'offset': first * block_size,
+                   'length': length,
+                   'compression': compression}
+            extents = restored_extents.claim(obj['offset'],
+                                             obj['offset'] + length)
+            if extents:
+                restore_items.append((container, object_name, obj,
+                                      extra_metadata, extents))
+        return restore_items
+
+    @staticmethod
+    def _dedup_units(metadata, sha256file):
+        """Return the dedup blocks of a backup using the dedup store."""
+        block_size = sha256file['chunk_size']
+        # Backups without a block size use a dedup block per hash block.
+        unit_blocks = metadata.get('dedup_block_size',
+                                   block_size) // block_size
+        chunk_blocks = metadata.get('dedup_chunk_size',
+                                    block_size) // block_size
+        return _dedup_units(sha256file['sha256s'], unit_blocks, chunk_blocks)
+
+    def _read_restore_object(self, container, object_name, obj,
+                             extra_metadata):
+        """Download a backup object and return its decompressed data."""
+        with self.get_object_reader(
+                container, object_name,
+                extra_metadata=extra_metadata) as reader:
+            body = reader.read()
+        compression_algorithm = obj['compression']
+        decompressor = self._get_compressor(compression_algorithm)
+        if decompressor is not None:
+            LOG.debug('decompressing data using %s algorithm',
+                      compression_algorithm)
+            body = tpool.execute(decompressor.decompress, body)
+        return body
+
+    def _sync_volume_file(self, volume_file):
+        volume_file.flush()
+
+        # Be tolerant to IO implementations that do not support fileno()
+        try:
+            fileno = volume_file.fileno()
+        except IOError:
+            LOG.info(_LI("volume_file does not support "
+                         "fileno() so skipping "
+                         "fsync()"))
+        else:
+            os.fsync(fileno)
+
+    def _restore_objects(self, restore_items, volume_id, volume_file):
+        """Write the objects of a restore plan to the volume.
+
+           Up to backup_restore_prefetch_objects objects are downloaded and
+           decompressed in greenthreads while the current one is written.
+        """
+        prefetched = collections.deque()
+        items = iter(restore_items)
+
+        def _prefetch():
+            # The object about to be written plus the prefetched ones.
+            while len(prefetched) <= self.restore_prefetch_objects:
+                item = next(items, None)
+                if item is None:
+                    break
+                container, object_name, obj, extra_metadata, extents = item
+                reader = None
+                if object_name is not None:
+                    reader = eventlet.spawn(self._read_restore_object,
+                                            container, object_name, obj,
+                                            extra_metadata)
+                prefetched.append((item, reader))
+
+        unsynced = 0
+        reader = None
+        try:
+            while True:
+                _prefetch()
+                if not prefetched:
+                    break
+                item, reader = prefetched.popleft()
+                container, object_name, obj, extra_metadata, extents = item
+                if reader is None:
+                    LOG.debug('restoring hole at %(offset)d of %(length)d '
+                              'bytes, volume: %(volume_id)s.',
+                              {'offset': obj['offset'],
+                               'length': obj['length'],
+                               'volume_id': volume_id})
+                    for start, end in extents:
+                        volume_utils.zero_file_range(volume_file, start,
+                                                     end - start)
+                    eventlet.sleep(0)
+                    continue
+                LOG.debug('restoring object. container: %(container)s, '
+                          'object name: %(object_name)s, volume: '
+                          '%(volume_id)s.',
+                          {
+                              'container': container,
+                              'object_name': object_name,
+                              'volume_id': volume_id,
+                          })
+                data = reader.wait()
+                if extents == [(obj['offset'], obj['offset'] + obj['length'])]:
+                    volume_file.seek(obj['offset'])
+                    volume_file.write(data)
+                else:
+                    for start, end in extents:
+                        volume_file.seek(start)
+                        volume_file.write(data[start - obj['offset']:
+                                               end - obj['offset']])
+
+                unsynced += 1
+                if unsynced == self.restore_fsync_interval:
+                    self._sync_volume_file(volume_file)
+                    unsynced = 0
+
+                # Restoring a backup to a volume can take some time. Yield so
+                # other threads can run, allowing for among other things the
+                # service status to be updated
+                eventlet.sleep(0)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # Stop the download of the object being written and of the
+                # prefetched ones.
+                readers = [reader] + [item_reader
+                                      for _item, item_reader in prefetched]
+                for item_reader in readers:
+                    if item_reader is not None:
+                        item_reader.kill()
+
+        if unsynced or not self.restore_fsync_interval:
+            self._sync_volume_file(volume_file)
 
     def restore(self, backup, volume_id, volume_file):
         """Restore the given volume backup from backup repository."""
@@ -661,37 +1249,36 @@ class ChunkedBackupDriver(driver.BackupDriver):
                       'volume_id': volume_id,
                       'backup_id': backup_id,
                   })
-        metadata = self._read_metadata(backup)
-        metadata_version = metadata['version']
-        LOG.debug('Restoring backup version %s', metadata_version)
-        try:
-            restore_func = getattr(self, self.DRIVER_VERSION_MAPPING.get(
-                metadata_version))
-        except TypeError:
-            err = (_('No support to restore backup version %s')
-                   % metadata_version)
-            raise exception.InvalidBackup(reason=err)
 
         # Build a list of backups based on parent_id. A full backup
         # will be the last one in the list.
-        backup_list = []
-        backup_list.append(backup)
+        backup_chain = []
         current_backup = backup
-        while current_backup.parent_id:
-            prev_backup = objects.Backup.get_by_id(self.context,
-                                                   current_backup.parent_id)
-            backup_list.append(prev_backup)
-            current_backup = prev_backup
-
-        # Do a full restore first, then layer the incremental backups
-        # on top of it in order.
-        index = len(backup_list) - 1
-        while index >= 0:
-            backup1 = backup_list[index]
-            index = index - 1
-            metadata = self._read_metadata(backup1)
-            restore_func(backup1, volume_id, metadata, volume_file)
-
+        while True:
+            metadata = self._read_metadata(current_backup)
+            metadata_version = metadata['version']
+            LOG.debug('Restoring backup version %s', metadata_version)
+            if metadata_version not in self.DRIVER_VERSION_MAPPING:
+                err = (_('No support to restore backup version %s')
+                       % metadata_version)
+                raise exception.InvalidBackup(reason=err)
+            backup_chain.append((current_backup, metadata))
+            if not current_backup.parent_id:
+                break
+            current_backup = objects.Backup.get_by_id(
+                self.context, current_backup.parent_id)
+
+        # The data of the whole chain is merged into a single pass, data a
+        # later incremental backup overwrites is never downloaded.
+        restore_items = self._plan_restore(backup_chain)
+        LOG.debug('Restoring %(objects)d objects of %(backups)d backups.',
+                  {'objects': len(restore_items),
+                   'backups': len(backup_chain)})
+        self._restore_objects(restore_items, volume_id, volume_file)
+
+        # Restore the volume metadata of the full backup first, then layer
+        # the incremental backups on top of it in order.
+        for backup1, metadata in reversed(backup_chain):
             volume_meta = metadata.get('volume_meta', None)
             try:
                 if volume_meta:
@@ -724,6 +1311,29 @@ class ChunkedBackupDriver(driver.BackupDriver):
                 LOG.warning(_LW('Error while listing objects, continuing'
                                 ' with delete.'))
 
+            metadata_filename = self._metadata_filename(backup)
+            metadata = {}
+            if metadata_filename in object_names:
+                try:
+                    metadata = self._read_metadata(backup)
+                except Exception:
+                    LOG.warning(_LW('Error while reading metadata, the '
+                                    'dedup blocks of backup %s may not be '
+                                    'released.'), backup['id'])
+                if 'dedup_container' in metadata:
+                    sha256file = self._read_sha256file(backup)
+                    dedup_blocks = metadata['dedup_blocks']
+                    self._release_dedup_blocks(
+                        metadata['dedup_container'],
+                        collections.Counter(
+                            key for key, _first, _last in
+                            self._dedup_units(metadata, sha256file)
+                            if key in dedup_blocks))
+                    # Without its metadata a retried delete does not drop
+                    # the references a second time.
+                    self.delete_object(container, metadata_filename)
+                    object_names.remove(metadata_filename)
+
             for object_name in object_names:
                 self.delete_object(container, object_name)
                 LOG.debug('deleted object: %(object_name)s'
@@ -139,6 +139,9 @@ class GoogleBackupDriver(chunkeddriver.ChunkedBackupDriver):
                                     http=http_user_agent,
                                     credentials=credentials)
         self.resumable = self.writer_chunk_size != -1
+        # The httplib2 transport of the API client can not be shared by
+        # concurrent greenthreads, so objects are written one at a time.
+        self.object_writers = 1
 
     def check_gcs_options(self):
         required_options = ('backup_gcs_bucket', 'backup_gcs_credential_file',
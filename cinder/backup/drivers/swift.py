@@ -204,7 +204,7 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                               "but %(param)s not set"),
                           {'param': 'backup_swift_user'})
                 raise exception.ParameterNotFound(param='backup_swift_user')
-            self.conn = swift.Connection(
+            self.conn_kwargs = dict(
                 authurl=self.auth_url,
                 auth_version=CONF.backup_swift_auth_version,
                 tenant_name=CONF.backup_swift_tenant,
@@ -215,19 +215,24 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                 insecure=self.backup_swift_auth_insecure,
                 cacert=CONF.backup_swift_ca_cert_file)
         else:
-            self.conn = swift.Connection(retries=self.swift_attempts,
-                                         preauthurl=self.swift_url,
-                                         preauthtoken=self.context.auth_token,
-                                         starting_backoff=self.swift_backoff,
-                                         insecure= (
-                                             self.backup_swift_auth_insecure),
-                                         cacert=CONF.backup_swift_ca_cert_file)
+            self.conn_kwargs = dict(retries=self.swift_attempts,
+                                    preauthurl=self.swift_url,
+                                    preauthtoken=self.context.auth_token,
+                                    starting_backoff=self.swift_backoff,
+                                    insecure=self.backup_swift_auth_insecure,
+                                    cacert=CONF.backup_swift_ca_cert_file)
+        self.conn = swift.Connection(**self.conn_kwargs)
+        # A swift connection can not be shared by concurrent object writers,
+        # so every writer takes an idle connection from this list and puts
+        # it back once the object has been written.
+        self.writer_conns = []
 
     class SwiftObjectWriter(object):
-        def __init__(self, container, object_name, conn):
+        def __init__(self, container, object_name, conn, conn_pool=None):
             self.container = container
             self.object_name = object_name
             self.conn = conn
+            self.conn_pool = conn_pool
             self.data = bytearray()
 
         def __enter__(self):
@@ -247,6 +252,9 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                                             content_length=len(self.data))
             except socket.error as err:
                 raise exception.SwiftConnectionFailed(reason=err)
+            finally:
+                if self.conn_pool is not None:
+                    self.conn_pool.append(self.conn)
             LOG.debug('swift MD5 for %(object_name)s: %(etag)s',
                       {'object_name': self.object_name, 'etag': etag, })
             md5 = hashlib.md5(self.data).hexdigest()
@@ -279,6 +287,10 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                 raise exception.SwiftConnectionFailed(reason=err)
             return body
 
+    def _repository_per_project(self):
+        # In per_user mode every project backs up to its own account.
+        return CONF.backup_swift_auth == 'per_user'
+
     def put_container(self, container):
         """Create the container if needed. No failure if it pre-exists."""
         try:
@@ -304,7 +316,12 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
         Returns a writer object that stores a chunk of volume data in a
         Swift object store.
         """
-        return self.SwiftObjectWriter(container, object_name, self.conn)
+        if self.writer_conns:
+            conn = self.writer_conns.pop()
+        else:
+            conn = swift.Connection(**self.conn_kwargs)
+        return self.SwiftObjectWriter(container, object_name, conn,
+                                      conn_pool=self.writer_conns)
 
     def get_object_reader(self, container, object_name, extra_metadata=None):
         """Return reader object.
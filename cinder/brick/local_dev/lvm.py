@@ -20,11 +20,13 @@ LVM class for performing LVM operations.
 import math
 import os
 import re
+import time
 
 from os_brick import executor
 from oslo_concurrency import processutils as putils
 from oslo_log import log as logging
 from oslo_utils import excutils
+from oslo_utils import units
 from six import moves
 
 from cinder import exception
@@ -41,7 +43,7 @@ class LVM(executor.Executor):
 
     def __init__(self, vg_name, root_helper, create_vg=False,
                  physical_volumes=None, lvm_type='default',
-                 executor=putils.execute, lvm_conf=None):
+                 executor=putils.execute, lvm_conf=None, cache_ttl=0):
 
         """Initialize the LVM object.
 
@@ -55,6 +57,9 @@ class LVM(executor.Executor):
         :param physical_volumes: List of PVs to build VG on
         :param lvm_type: VG and Volume type (default, or thin)
         :param executor: Execute method to use, None uses common/processutils
+        :param cache_ttl: Number of seconds the LVs of the VG listed by a
+                          single lvs command are used to answer the queries,
+                          0 runs a command for each query
 
         """
         super(LVM, self).__init__(execute=executor, root_helper=root_helper)
@@ -70,6 +75,10 @@ class LVM(executor.Executor):
         self._supports_snapshot_lv_activation = None
         self._supports_lvchange_ignoreskipactivation = None
         self.vg_provisioned_capacity = 0.0
+        self._cache_ttl = cache_ttl
+        self._lv_cache = None
+        self._lv_cache_time = 0
+        self._lv_cache_gen = 0
 
         # Ensure LVM_SYSTEM_DIR has been added to LVM.LVM_CMD_PREFIX
         # before the first LVM command is executed, and use the directory
@@ -149,6 +158,76 @@ class LVM(executor.Executor):
         else:
             return []
 
+    def _get_cached_lvs(self):
+        """Return the LVs of the VG by name, None if not cached.
+
+        All the LVs of the VG are listed by a single lvs command, whose
+        result is used for cache_ttl seconds.  The LVs changed by this
+        object are updated in place, and the cache is invalidated when a
+        command fails or when the changes can't be predicted.  A listing
+        that raced with such a change is not cached.
+        """
+        if not self._cache_ttl:
+            return None
+        if (self._lv_cache is None or
+                time.time() - self._lv_cache_time > self._cache_ttl):
+            cmd = LVM.LVM_CMD_PREFIX + ['lvs', '--noheadings', '--unit=g',
+                                        '-o', 'name,size,attr,data_percent',
+                                        '--separator', ':', '--nosuffix',
+                                        self.vg_name]
+            gen = self._lv_cache_gen
+            try:
+                (out, _err) = self._execute(*cmd,
+                                            root_helper=self._root_helper,
+                                            run_as_root=True)
+            except putils.ProcessExecutionError:
+                self.invalidate_cache()
+                raise
+            lvs = {}
+            for line in (out or '').splitlines():
+                fields = line.strip().split(':')
+                if len(fields) < 4:
+                    continue
+                lvs[fields[0]] = {'vg': self.vg_name,
+                                  'name': fields[0],
+                                  'size': fields[1],
+                                  'attr': fields[2],
+                                  'data_percent': fields[3]}
+            if gen != self._lv_cache_gen:
+                # An LV changed while listing, the listing may miss it.
+                return None
+            self._lv_cache = lvs
+            self._lv_cache_time = time.time()
+        return self._lv_cache
+
+    def invalidate_cache(self):
+        """Make the next query list the LVs of the VG again."""
+        self._lv_cache_gen += 1
+        self._lv_cache = None
+
+    def _cache_lv(self, name, size_str, attr, data_percent=''):
+        self._lv_cache_gen += 1
+        if self._lv_cache is None:
+            return
+        size = self._size_in_g(size_str)
+        if size is None:
+            self.invalidate_cache()
+            return
+        self._lv_cache[name] = {'vg': self.vg_name,
+                                'name': name,
+                                'size': '%.2f' % size,
+                                'attr': attr,
+                                'data_percent': data_percent}
+
+    @staticmethod
+    def _size_in_g(size_str):
+        """Convert a size given to lvcreate or lvextend to GB."""
+        factors = {'m': 1.0 / units.Ki, 'g': 1.0, 't': float(units.Ki)}
+        try:
+            return float(size_str[:-1]) * factors[size_str[-1].lower()]
+        except (IndexError, KeyError, ValueError):
+            return None
+
     def _get_thin_pool_free_space(self, vg_name, thin_pool_name):
         """Returns available thin pool free space.
 
@@ -157,6 +236,15 @@ class LVM(executor.Executor):
         :returns: Free space in GB (float), calculated using data_percent
 
         """
+        lvs = self._get_cached_lvs() if vg_name == self.vg_name else None
+        if lvs is not None and thin_pool_name in lvs:
+            try:
+                pool_size = float(lvs[thin_pool_name]['size'])
+                data_percent = float(lvs[thin_pool_name]['data_percent'])
+            except ValueError:
+                return 0.0
+            return round(pool_size - pool_size / 100 * data_percent, 2)
+
         cmd = LVM.LVM_CMD_PREFIX +\
             ['lvs', '--noheadings', '--unit=g',
              '-o', 'size,data_percent', '--separator',
@@ -304,9 +392,25 @@ class LVM(executor.Executor):
         :returns: List of Dictionaries with LV info
 
         """
-        return self.get_lv_info(self._root_helper,
-                                self.vg_name,
-                                lv_name)
+        lvs = self._get_cached_lvs()
+        if lvs is None:
+            return self.get_lv_info(self._root_helper,
+                                    self.vg_name,
+                                    lv_name)
+        if lv_name is not None:
+            if lv_name not in lvs:
+                # The LV may have been created outside of this object
+                # since the listing, only trust the cache for the LVs
+                # it has.
+                lv_list = self.get_lv_info(self._root_helper,
+                                           self.vg_name,
+                                           lv_name)
+                if lv_list:
+                    self.invalidate_cache()
+                return lv_list
+            lvs = {lv_name: lvs[lv_name]}
+        return [{'vg': lv['vg'], 'name': lv['name'], 'size': lv['size']}
+                for lv in lvs.values()]
 
     def get_volume(self, name):
         """Get reference object of volume specified by name.
@@ -439,8 +543,7 @@ class LVM(executor.Executor):
             # We need info on both the thin pool and the volumes,
             # therefore we should provide only self.vg_name, but not
             # self.vg_thin_pool here.
-            for lv in self.get_lv_info(self._root_helper,
-                                       self.vg_name):
+            for lv in self.get_volumes():
                 lvsize = lv['size']
                 # get_lv_info runs "lvs" command with "--nosuffix".
                 # This removes "g" from "1.00g" and only outputs "1.00".
@@ -514,6 +617,7 @@ class LVM(executor.Executor):
                                       'size': size_str,
                                       'free': self.vg_free_space})
 
+        self.invalidate_cache()
         self._execute(*cmd,
                       root_helper=self._root_helper,
                       run_as_root=True)
@@ -554,12 +658,21 @@ class LVM(executor.Executor):
                           root_helper=self._root_helper,
                           run_as_root=True)
         except putils.ProcessExecutionError as err:
+            self.invalidate_cache()
             LOG.exception(_LE('Error creating Volume'))
             LOG.error(_LE('Cmd     :%s'), err.cmd)
             LOG.error(_LE('StdOut  :%s'), err.stdout)
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
 
+        if lv_type == 'thin':
+            self._cache_lv(name, size_str, 'Vwi-a-tz--', '0.00')
+        elif mirror_count > 0:
+            # The attributes and data of mirrored LVs vary.
+            self.invalidate_cache()
+        else:
+            self._cache_lv(name, size_str, '-wi-a-----')
+
     @utils.retry(putils.ProcessExecutionError)
     def create_lv_snapshot(self, name, source_lv_name, lv_type='default'):
         """Creates a snapshot of a logical volume.
@@ -580,6 +693,9 @@ class LVM(executor.Executor):
             size = source_lvref['size']
             cmd.extend(['-L', '%sg' % (size)])
 
+        # The attributes of the origin change along with the snapshot, and
+        # a listing made while the snapshot is created may miss it.
+        self.invalidate_cache()
         try:
             self._execute(*cmd,
                           root_helper=self._root_helper,
@@ -590,6 +706,8 @@ class LVM(executor.Executor):
             LOG.error(_LE('StdOut  :%s'), err.stdout)
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
+        finally:
+            self.invalidate_cache()
 
     def _mangle_lv_name(self, name):
         # Linux LVM reserves name that starts with snapshot, so that
@@ -680,6 +798,7 @@ class LVM(executor.Executor):
                 '%s/%s' % (self.vg_name, name),
                 root_helper=self._root_helper, run_as_root=True)
         except putils.ProcessExecutionError as err:
+            self.invalidate_cache()
             LOG.debug('Error reported running lvremove: CMD: %(command)s, '
                       'RESPONSE: %(response)s',
                       {'command': err.cmd, 'response': err.stderr})
@@ -702,17 +821,33 @@ class LVM(executor.Executor):
             LOG.debug('Successfully deleted volume: %s after '
                       'udev settle.', name)
 
+        self._lv_cache_gen += 1
+        if self._lv_cache is not None:
+            lv = self._lv_cache.pop(name, None)
+            if lv is None or lv['attr'][:1] in ('s', 'S', 'o', 'O'):
+                # Removing a snapshot changes the attributes of its origin.
+                self.invalidate_cache()
+
     def revert(self, snapshot_name):
         """Revert an LV from snapshot.
 
         :param snapshot_name: Name of snapshot to revert
 
         """
-        self._execute('lvconvert', '--merge',
-                      snapshot_name, root_helper=self._root_helper,
-                      run_as_root=True)
+        self.invalidate_cache()
+        try:
+            self._execute('lvconvert', '--merge',
+                          snapshot_name, root_helper=self._root_helper,
+                          run_as_root=True)
+        finally:
+            # A listing made during the merge may still hold the snapshot.
+            self.invalidate_cache()
 
     def lv_has_snapshot(self, name):
+        lvs = self._get_cached_lvs()
+        if lvs is not None and name in lvs:
+            return lvs[name]['attr'][:1] in ('o', 'O')
+
         cmd = LVM.LVM_CMD_PREFIX + ['lvdisplay', '--noheading', '-C', '-o',
                                     'Attr', '%s/%s' % (self.vg_name, name)]
         out, _err = self._execute(*cmd,
@@ -738,12 +873,22 @@ class LVM(executor.Executor):
             self._execute(*cmd, root_helper=self._root_helper,
                           run_as_root=True)
         except putils.ProcessExecutionError as err:
+            self.invalidate_cache()
             LOG.exception(_LE('Error extending Volume'))
             LOG.error(_LE('Cmd     :%s'), err.cmd)
             LOG.error(_LE('StdOut  :%s'), err.stdout)
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
 
+        self._lv_cache_gen += 1
+        if self._lv_cache is not None:
+            lv = self._lv_cache.get(lv_name)
+            if lv is None:
+                self.invalidate_cache()
+            else:
+                self._cache_lv(lv_name, new_size, lv['attr'],
+                               lv['data_percent'])
+
     def vg_mirror_free_space(self, mirror_count):
         free_capacity = 0.0
 
@@ -776,8 +921,18 @@ class LVM(executor.Executor):
                           root_helper=self._root_helper,
                           run_as_root=True)
         except putils.ProcessExecutionError as err:
+            self.invalidate_cache()
             LOG.exception(_LE('Error renaming logical volume'))
             LOG.error(_LE('Cmd     :%s'), err.cmd)
             LOG.error(_LE('StdOut  :%s'), err.stdout)
             LOG.error(_LE('StdErr  :%s'), err.stderr)
             raise
+
+        self._lv_cache_gen += 1
+        if self._lv_cache is not None:
+            lv = self._lv_cache.pop(lv_name, None)
+            if lv is None:
+                self.invalidate_cache()
+            else:
+                lv['name'] = new_name
+                self._lv_cache[new_name] = lv
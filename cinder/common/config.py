@@ -183,6 +183,19 @@ global_opts = [
     cfg.BoolOpt('no_snapshot_gb_quota',
                 default=False,
                 help='Whether snapshots count against gigabyte quota'),
+    cfg.BoolOpt('use_conditional_quota_reserve',
+                default=False,
+                help='Reserve quota with a conditional update of the quota '
+                     'usages instead of locking them, so that concurrent '
+                     'requests of a project do not serialize. The usages '
+                     'are still locked when they need to be created or '
+                     'refreshed.'),
+    cfg.IntOpt('reservation_expire_batch_size',
+               default=1000,
+               min=0,
+               help='Number of expired quota reservations rolled back per '
+                    'database transaction. 0 rolls them all back in a '
+                    'single transaction.'),
     cfg.StrOpt('transfer_api_class',
                default='cinder.transfer.api.API',
                help='The full class name of the volume transfer API class'),
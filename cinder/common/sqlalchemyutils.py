@@ -47,7 +47,8 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
 
     Typically, the id of the last row is used as the client-facing pagination
     marker, then the actual marker object must be fetched from the db and
-    passed in to us as marker.
+    passed in to us as marker.  Only its sort_keys attributes are used, so
+    it may be a row of these columns rather than a whole model object.
 
     :param query: the query object to which we should add paging/sorting
     :param model: the ORM model class
@@ -120,6 +121,17 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
             criteria_list.append(criteria)
 
         f = sqlalchemy.sql.or_(*criteria_list)
+
+        # The rows following the marker can't precede it on the first sort
+        # key.  This redundant condition lets the database scan a range of
+        # an index starting with this key, from the marker on, instead of
+        # evaluating the OR-chain on every row of the table.
+        if marker_values[0] is not None:
+            model_attr = getattr(model, sort_keys[0])
+            if sort_dirs[0] == 'desc':
+                f = sqlalchemy.sql.and_(model_attr <= marker_values[0], f)
+            else:
+                f = sqlalchemy.sql.and_(model_attr >= marker_values[0], f)
         query = query.filter(f)
 
     if limit is not None:
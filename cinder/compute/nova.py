@@ -65,6 +65,10 @@ nova_extensions = [ext for ext in nova_client.discover_extensions(2)
                    if ext.name in ("assisted_volume_snapshots",
                                    "list_extensions")]
 
+# The clients of the privileged user don't depend on the request, they are
+# kept to reuse their authentication token and HTTP connections.
+_privileged_clients = {}
+
 
 def novaclient(context, admin_endpoint=False, privileged_user=False,
                timeout=None):
@@ -101,6 +105,7 @@ def novaclient(context, admin_endpoint=False, privileged_user=False,
     else:
         region_filter = {}
 
+    cache_key = None
     if privileged_user and CONF.os_privileged_user_name:
         context = ctx.RequestContext(
             CONF.os_privileged_user_name, None,
@@ -121,6 +126,14 @@ def novaclient(context, admin_endpoint=False, privileged_user=False,
                              endpoint_type=endpoint_type,
                              **region_filter)
 
+        cache_key = (url, endpoint_type, timeout,
+                     CONF.os_privileged_user_name,
+                     CONF.os_privileged_user_password,
+                     CONF.os_privileged_user_tenant)
+        client = _privileged_clients.get(cache_key)
+        if client is not None:
+            return client
+
         LOG.debug('Creating a Nova client using "%s" user',
                   CONF.os_privileged_user_name)
     else:
@@ -151,6 +164,8 @@ def novaclient(context, admin_endpoint=False, privileged_user=False,
         c.client.auth_token = (context.auth_token or '%s:%s'
                                % (context.user_id, context.project_id))
         c.client.management_url = url
+    if cache_key is not None:
+        _privileged_clients[cache_key] = c
     return c
 
 
@@ -167,6 +167,13 @@ def volume_data_get_for_host(context, host, count_only=False):
                                          count_only)
 
 
+def volume_data_get_by_host(context, host=None, statuses=None,
+                            exclude_statuses=None):
+    """Get {host: (volume_count, gigabytes)} for all or one host."""
+    return IMPL.volume_data_get_by_host(context, host, statuses=statuses,
+                                        exclude_statuses=exclude_statuses)
+
+
 def volume_data_get_for_project(context, project_id):
     """Get (volume_count, gigabytes) for project."""
     return IMPL.volume_data_get_for_project(context, project_id)
@@ -931,6 +938,35 @@ def backup_destroy(context, backup_id):
     return IMPL.backup_destroy(context, backup_id)
 
 
+def backup_dedup_blocks_ref(context, container, sha256_counts):
+    """Add references to the blocks of a backup deduplication store.
+
+    :param sha256_counts: dict mapping block digests to the number of
+                          references to add
+    :returns: dict mapping the digests of the referenced blocks to their
+              store entries, digests without a stored block are left out
+              and not referenced
+    """
+    return IMPL.backup_dedup_blocks_ref(context, container, sha256_counts)
+
+
+def backup_dedup_block_create(context, container, sha256, values):
+    """Create a block of a backup deduplication store.
+
+    Raises BackupDedupBlockExists if the block is already stored.
+    """
+    return IMPL.backup_dedup_block_create(context, container, sha256, values)
+
+
+def backup_dedup_blocks_unref(context, container, sha256_counts):
+    """Drop references to the blocks of a backup deduplication store.
+
+    :returns: the object names of the blocks that are not referenced anymore,
+              these blocks are removed from the store
+    """
+    return IMPL.backup_dedup_blocks_unref(context, container, sha256_counts)
+
+
 ###################
 
 
@@ -41,7 +41,7 @@ import six
 import sqlalchemy
 from sqlalchemy import MetaData
 from sqlalchemy import or_, and_, case
-from sqlalchemy.orm import joinedload, joinedload_all
+from sqlalchemy.orm import joinedload, joinedload_all, subqueryload
 from sqlalchemy.orm import RelationshipProperty
 from sqlalchemy.schema import Table
 from sqlalchemy import sql
@@ -850,11 +850,135 @@ def quota_usage_update_resource(context, old_res, new_res):
             usage.until_refresh = 1
 
 
+def _quota_usage_needs_refresh(usage, max_age):
+    return (usage.in_use < 0 or usage.until_refresh is not None or
+            (max_age and usage.updated_at is not None and
+             (usage.updated_at - timeutils.utcnow()).seconds >= max_age))
+
+
+class _ConditionalReserveFailed(Exception):
+    """Roll the conditional reservation transaction back."""
+
+
+def _quota_reserve_conditional(context, quotas, deltas, expire, max_age,
+                               project_id):
+    """Reserve quota with a conditional update instead of row locks.
+
+    The reserved quantities of all the resources are incremented by a single
+    UPDATE statement that only changes the usages that stay within their
+    limits, so that concurrent reservations in a project don't serialize on
+    SELECT ... FOR UPDATE and take the row locks in the same order.
+
+    Returns None when a usage doesn't exist yet or needs to be refreshed,
+    quota_reserve then reserves with the usages locked.
+    """
+    elevated = context.elevated()
+    session = get_session()
+    try:
+        with session.begin():
+            usages = model_query(context, models.QuotaUsage,
+                                 read_deleted="no", session=session).\
+                filter_by(project_id=project_id).\
+                filter(models.QuotaUsage.resource.in_(list(deltas))).\
+                all()
+            usages = {row.resource: row for row in usages}
+            if (set(deltas) - set(usages) or
+                    any(_quota_usage_needs_refresh(usage, max_age)
+                        for usage in usages.values())):
+                return None
+
+            allocated = quota_allocated_get_all_by_project(context,
+                                                           project_id)
+            allocated.pop('project_id')
+
+            # A null delta doesn't change the usage but can still be over
+            # quota.
+            overs = [r for r, delta in deltas.items()
+                     if delta == 0 and quotas[r] >= 0 and
+                     quotas[r] < usages[r].total + allocated.get(r, 0)]
+            if overs:
+                raise _ConditionalReserveFailed()
+
+            # NOTE: Like quota_reserve, only positive deltas are reserved.
+            increments = {usages[r].id: r for r, delta in deltas.items()
+                          if delta > 0}
+            if increments:
+                usage_id = models.QuotaUsage.id
+                delta_case = case({i: deltas[r]
+                                   for i, r in increments.items()},
+                                  value=usage_id)
+                limit_case = case({i: quotas[r] - allocated.get(r, 0)
+                                   for i, r in increments.items()},
+                                  value=usage_id)
+                fits = (models.QuotaUsage.in_use +
+                        models.QuotaUsage.reserved +
+                        delta_case <= limit_case)
+                unlimited = [i for i, r in increments.items()
+                             if quotas[r] < 0]
+                if unlimited:
+                    fits = or_(usage_id.in_(unlimited), fits)
+
+                updated = model_query(context, models.QuotaUsage,
+                                      read_deleted="no",
+                                      session=session).\
+                    filter(usage_id.in_(list(increments))).\
+                    filter(fits).\
+                    update({'reserved': models.QuotaUsage.reserved +
+                            delta_case},
+                           synchronize_session=False)
+                if updated != len(increments):
+                    raise _ConditionalReserveFailed()
+
+            reservations = []
+            for resource, delta in deltas.items():
+                reservation = models.Reservation(
+                    uuid=str(uuid.uuid4()), usage_id=usages[resource].id,
+                    project_id=project_id, resource=resource, delta=delta,
+                    expire=expire)
+                reservations.append(reservation)
+            session.add_all(reservations)
+
+            unders = [r for r, delta in deltas.items()
+                      if delta < 0 and delta + usages[r].in_use < 0]
+    except _ConditionalReserveFailed:
+        # Find out which resources are over quota, now that the transaction
+        # was rolled back.
+        usages = quota_usage_get_all_by_project(elevated, project_id)
+        usages.pop('project_id')
+        allocated = quota_allocated_get_all_by_project(context, project_id)
+        allocated.pop('project_id')
+        overs = [r for r, delta in deltas.items()
+                 if r in usages and quotas[r] >= 0 and delta >= 0 and
+                 quotas[r] < (delta + usages[r]['in_use'] +
+                              usages[r]['reserved'] + allocated.get(r, 0))]
+        if not overs:
+            # The usages changed in between, check again with the usages
+            # locked.
+            return None
+        for resource, usage in usages.items():
+            usage['allocated'] = allocated.get(resource, 0)
+        raise exception.OverQuota(overs=sorted(overs), quotas=quotas,
+                                  usages=usages)
+
+    if unders:
+        LOG.warning(_LW("Change will make usage less than 0 for the following "
+                        "resources: %s"), unders)
+
+    return [reservation.uuid for reservation in reservations]
+
+
 @require_context
 @_retry_on_deadlock
 def quota_reserve(context, resources, quotas, deltas, expire,
                   until_refresh, max_age, project_id=None,
                   is_allocated_reserve=False):
+    if CONF.use_conditional_quota_reserve and not is_allocated_reserve:
+        reservations = _quota_reserve_conditional(
+            context, quotas, deltas, expire, max_age,
+            project_id or context.project_id)
+        if reservations is not None:
+            return reservations
+
     elevated = context.elevated()
     session = get_session()
     with session.begin():
@@ -1015,10 +1139,17 @@ def quota_reserve(context, resources, quotas, deltas, expire,
 
 
 def _quota_reservations(session, context, reservations):
-    """Return the relevant reservations."""
+    """Return the relevant reservations.
+
+    Only the columns needed to apply their deltas are loaded, the rows are
+    locked.
+    """
 
     # Get the listed reservations
-    return model_query(context, models.Reservation,
+    return model_query(context, models.Reservation.id,
+                       models.Reservation.usage_id,
+                       models.Reservation.allocated_id,
+                       models.Reservation.delta,
                        read_deleted="no",
                        session=session).\
         filter(models.Reservation.uuid.in_(reservations)).\
@@ -1026,8 +1157,59 @@ def _quota_reservations(session, context, reservations):
         all()
 
 
-def _dict_with_usage_id(usages):
-    return {row.id: row for row in usages.values()}
+def _apply_reservation_deltas(context, session, reservations, commit):
+    """Apply the deltas of reservations to the usages and quotas.
+
+    The deltas are summed by usage and by quota, so that each table is
+    updated by a single UPDATE statement whatever the number of
+    reservations.
+    """
+    reserved = collections.defaultdict(int)
+    in_use = collections.defaultdict(int)
+    allocated = collections.defaultdict(int)
+    for reservation in reservations:
+        if reservation.allocated_id:
+            # Allocated reservations will have already been bumped
+            if not commit:
+                allocated[reservation.allocated_id] += reservation.delta
+            continue
+        if reservation.delta >= 0:
+            reserved[reservation.usage_id] += reservation.delta
+        if commit:
+            in_use[reservation.usage_id] += reservation.delta
+
+    usage_id = models.QuotaUsage.id
+    values = {}
+    if any(reserved.values()):
+        values['reserved'] = (models.QuotaUsage.reserved -
+                              case(reserved, value=usage_id, else_=0))
+    if any(in_use.values()):
+        values['in_use'] = (models.QuotaUsage.in_use +
+                            case(in_use, value=usage_id, else_=0))
+    if values:
+        model_query(context, models.QuotaUsage, read_deleted="no",
+                    session=session).\
+            filter(usage_id.in_(list(set(reserved) | set(in_use)))).\
+            update(values, synchronize_session=False)
+
+    if any(allocated.values()):
+        quota_id = models.Quota.id
+        model_query(context, models.Quota, read_deleted="no",
+                    session=session).\
+            filter(quota_id.in_(list(allocated))).\
+            update({'allocated': models.Quota.allocated -
+                    case(allocated, value=quota_id, else_=0)},
+                   synchronize_session=False)
+
+
+def _delete_reservations(context, session, reservations):
+    model_query(context, models.Reservation, read_deleted="no",
+                session=session).\
+        filter(models.Reservation.id.in_([r.id for r in reservations])).\
+        update({'deleted': True,
+                'deleted_at': timeutils.utcnow(),
+                'updated_at': literal_column('updated_at')},
+               synchronize_session=False)
 
 
 @require_context
@@ -1035,18 +1217,10 @@ def _dict_with_usage_id(usages):
 def reservation_commit(context, reservations, project_id=None):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session, project_id)
-        usages = _dict_with_usage_id(usages)
-
-        for reservation in _quota_reservations(session, context, reservations):
-            # Allocated reservations will have already been bumped
-            if not reservation.allocated_id:
-                usage = usages[reservation.usage_id]
-                if reservation.delta >= 0:
-                    usage.reserved -= reservation.delta
-                usage.in_use += reservation.delta
-
-            reservation.delete(session=session)
+        rows = _quota_reservations(session, context, reservations)
+        if rows:
+            _apply_reservation_deltas(context, session, rows, commit=True)
+            _delete_reservations(context, session, rows)
 
 
 @require_context
@@ -1054,17 +1228,10 @@ def reservation_commit(context, reservations, project_id=None):
 def reservation_rollback(context, reservations, project_id=None):
     session = get_session()
     with session.begin():
-        usages = _get_quota_usages(context, session, project_id)
-        usages = _dict_with_usage_id(usages)
-        for reservation in _quota_reservations(session, context, reservations):
-            if reservation.allocated_id:
-                reservation.quota.allocated -= reservation.delta
-            else:
-                usage = usages[reservation.usage_id]
-                if reservation.delta >= 0:
-                    usage.reserved -= reservation.delta
-
-            reservation.delete(session=session)
+        rows = _quota_reservations(session, context, reservations)
+        if rows:
+            _apply_reservation_deltas(context, session, rows, commit=False)
+            _delete_reservations(context, session, rows)
 
 
 def quota_destroy_by_project(*args, **kwargs):
@@ -1118,27 +1285,48 @@ def quota_destroy_all_by_project(context, project_id, only_quotas=False):
 
 
 @require_admin_context
-@_retry_on_deadlock
 def reservation_expire(context):
+    """Roll back the expired reservations.
+
+    They are rolled back in batches of reservation_expire_batch_size, one
+    transaction each, so that a large backlog of expired reservations
+    doesn't hold the locks of a single huge transaction.
+    """
+    current_time = timeutils.utcnow()
+    batch_size = CONF.reservation_expire_batch_size
+    while _reservation_expire_batch(context, current_time, batch_size):
+        pass
+
+
+@_retry_on_deadlock
+def _reservation_expire_batch(context, current_time, batch_size):
+    """Roll back a batch of expired reservations.
+
+    Returns whether there may be more expired reservations.
+    """
     session = get_session()
     with session.begin():
-        current_time = timeutils.utcnow()
-        results = model_query(context, models.Reservation, session=session,
-                              read_deleted="no").\
+        # Uses the reservations_deleted_expire_idx index.
+        query = model_query(context, models.Reservation.id,
+                            models.Reservation.usage_id,
+                            models.Reservation.allocated_id,
+                            models.Reservation.delta,
+                            session=session, read_deleted="no").\
             filter(models.Reservation.expire < current_time).\
-            all()
+            order_by(models.Reservation.expire).\
+            with_lockmode('update')
+        if batch_size:
+            query = query.limit(batch_size)
+        results = query.all()
 
         if results:
-            for reservation in results:
-                if reservation.delta >= 0:
-                    if reservation.allocated_id:
-                        reservation.quota.allocated -= reservation.delta
-                        reservation.quota.save(session=session)
-                    else:
-                        reservation.usage.reserved -= reservation.delta
-                        reservation.usage.save(session=session)
+            # Only the positive deltas were reserved.
+            _apply_reservation_deltas(
+                context, session, [r for r in results if r.delta >= 0],
+                commit=False)
+            _delete_reservations(context, session, results)
 
-                reservation.delete(session=session)
+    return bool(batch_size) and len(results) == batch_size
 
 
 ###################
@@ -1249,6 +1437,34 @@ def volume_data_get_for_host(context, host, count_only=False):
         return (result[0] or 0, result[1] or 0)
 
 
+@require_admin_context
+def volume_data_get_by_host(context, host=None, statuses=None,
+                            exclude_statuses=None):
+    """Return the volume count and size of each value of the host field.
+
+    If host is given, only the volumes of that host and of its pools are
+    counted, if statuses is given, only the volumes in these statuses, and
+    if exclude_statuses is given, only the volumes in other statuses.
+    """
+    query = model_query(context,
+                        models.Volume.host,
+                        func.count(models.Volume.id),
+                        func.sum(models.Volume.size),
+                        read_deleted="no")
+    if host:
+        host_attr = models.Volume.host
+        conditions = [host_attr == host, host_attr.op('LIKE')(host + '#%')]
+        query = query.filter(or_(*conditions))
+    if statuses:
+        query = query.filter(models.Volume.status.in_(statuses))
+    if exclude_statuses:
+        query = query.filter(~models.Volume.status.in_(exclude_statuses))
+    query = query.group_by(models.Volume.host)
+    # NOTE(vish): convert None to 0
+    return {volume_host: (count or 0, size or 0)
+            for volume_host, count, size in query.all()}
+
+
 @require_admin_context
 def _volume_data_get_for_project(context, project_id, volume_type_id=None,
                                  session=None):
@@ -1409,6 +1625,25 @@ def _volume_get_query(context, session=None, project_only=False,
             options(joinedload('consistencygroup'))
 
 
+def _volume_get_all_query(context, session=None, project_only=False):
+    """Get the query to retrieve lists of volumes.
+
+    This loads the same relationships as _volume_get_query, but the
+    collections are loaded by a query each instead of being joined: joining
+    several of them returns the product of their rows for every volume, and
+    the volumes to return have to be sorted and limited in a subquery.
+    """
+    query = model_query(context, models.Volume, session=session,
+                        project_only=project_only).\
+        options(subqueryload('volume_metadata'))
+    if is_admin_context(context):
+        query = query.options(subqueryload('volume_admin_metadata'))
+    return query.\
+        options(joinedload('volume_type')).\
+        options(subqueryload('volume_attachment')).\
+        options(joinedload('consistencygroup'))
+
+
 @require_context
 def _volume_get(context, volume_id, session=None, joined_load=True):
     result = _volume_get_query(context, session=session, project_only=True,
@@ -1645,7 +1880,8 @@ def _generate_paginate_query(context, session, marker, limit, sort_keys,
 
     marker_object = None
     if marker is not None:
-        marker_object = get(context, marker, session)
+        marker_object = _get_marker(context, session, paginate_type, marker,
+                                    sort_keys, get)
 
     return sqlalchemyutils.paginate_query(query, paginate_type, limit,
                                           sort_keys,
@@ -1654,6 +1890,28 @@ def _generate_paginate_query(context, session, marker, limit, sort_keys,
                                           offset=offset)
 
 
+def _get_marker(context, session, model, marker, sort_keys, get):
+    """Return the values of the sort keys of the marker row.
+
+    Only the sort key columns are read when the model belongs to projects
+    and all the sort keys are columns, with the project check done by the
+    get method of these models.  Otherwise, or if the marker isn't found,
+    the get method is used, which raises the NotFound exception of the
+    model.
+    """
+    columns = model.__table__.columns
+    if (hasattr(model, 'project_id') and
+            all(key in columns for key in sort_keys)):
+        row = model_query(context,
+                          *[getattr(model, key) for key in sort_keys],
+                          session=session, project_only=True).\
+            filter_by(id=marker).\
+            first()
+        if row is not None:
+            return row
+    return get(context, marker, session)
+
+
 def _process_volume_filters(query, filters):
     """Common filter processing for Volume queries.
 
@@ -3794,6 +4052,96 @@ def backup_destroy(context, backup_id):
                 'updated_at': literal_column('updated_at')})
 
 
+# Number of digests per IN clause, below the bind parameter limit of SQLite.
+_DEDUP_BLOCKS_BATCH = 500
+
+
+def _dedup_blocks_update_refcounts(session, container, sha256_counts, sign):
+    """Add sign * count to the refcount of every listed block."""
+    digests_by_count = collections.defaultdict(list)
+    for sha256, count in sha256_counts.items():
+        digests_by_count[count].append(sha256)
+    for count, digests in digests_by_count.items():
+        for i in range(0, len(digests), _DEDUP_BLOCKS_BATCH):
+            session.query(models.BackupDedupBlock).\
+                filter_by(container=container).\
+                filter(models.BackupDedupBlock.sha256.in_(
+                    digests[i:i + _DEDUP_BLOCKS_BATCH])).\
+                update({'refcount': models.BackupDedupBlock.refcount +
+                        sign * count},
+                       synchronize_session=False)
+
+
+def _dedup_blocks_get_for_update(session, container, digests):
+    # Locking the rows in digest order avoids deadlocks between concurrent
+    # backups sharing blocks.
+    blocks = []
+    digests = sorted(digests)
+    for i in range(0, len(digests), _DEDUP_BLOCKS_BATCH):
+        blocks.extend(session.query(models.BackupDedupBlock).
+                      filter_by(container=container).
+                      filter(models.BackupDedupBlock.sha256.in_(
+                          digests[i:i + _DEDUP_BLOCKS_BATCH])).
+                      order_by(models.BackupDedupBlock.sha256).
+                      with_lockmode('update').
+                      all())
+    return blocks
+
+
+@require_context
+@_retry_on_deadlock
+def backup_dedup_blocks_ref(context, container, sha256_counts):
+    session = get_session()
+    with session.begin():
+        # Only the blocks locked here are referenced and returned, so the
+        # caller stores the other ones, even if a concurrent backup just did.
+        blocks = _dedup_blocks_get_for_update(session, container,
+                                              sha256_counts.keys())
+        _dedup_blocks_update_refcounts(
+            session, container,
+            {block.sha256: sha256_counts[block.sha256] for block in blocks},
+            1)
+        return {block.sha256: block for block in blocks}
+
+
+@require_context
+def backup_dedup_block_create(context, container, sha256, values):
+    block = models.BackupDedupBlock()
+    block.update(values)
+    block.container = container
+    block.sha256 = sha256
+
+    session = get_session()
+    try:
+        with session.begin():
+            block.save(session)
+    except db_exc.DBDuplicateEntry:
+        raise exception.BackupDedupBlockExists(container=container,
+                                               sha256=sha256)
+    return block
+
+
+@require_context
+@_retry_on_deadlock
+def backup_dedup_blocks_unref(context, container, sha256_counts):
+    session = get_session()
+    with session.begin():
+        blocks = _dedup_blocks_get_for_update(session, container,
+                                              sha256_counts.keys())
+        # Unreferenced blocks are removed in the same transaction so that a
+        # concurrent backup never references a block about to be deleted.
+        unreferenced = [block for block in blocks
+                        if block.refcount <= sha256_counts[block.sha256]]
+        _dedup_blocks_update_refcounts(
+            session, container,
+            {block.sha256: sha256_counts[block.sha256] for block in blocks
+             if block.refcount > sha256_counts[block.sha256]},
+            -1)
+        for block in unreferenced:
+            session.delete(block)
+        return [block.object_name for block in unreferenced]
+
+
 ###############################
 
 
@@ -4318,7 +4666,8 @@ def driver_initiator_data_get(context, initiator, namespace):
 
 
 PAGINATION_HELPERS = {
-    models.Volume: (_volume_get_query, _process_volume_filters, _volume_get),
+    models.Volume: (_volume_get_all_query, _process_volume_filters,
+                    _volume_get),
     models.Snapshot: (_snaps_get_query, _process_snaps_filters, _snapshot_get),
     models.Backup: (_backups_get_query, _process_backups_filters, _backup_get),
     models.QualityOfServiceSpecs: (_qos_specs_get_query,
@@ -0,0 +1,34 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+
+def _get_uuid_index(table):
+    for idx in table.indexes:
+        if idx.columns.keys() == ['uuid']:
+            return idx
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    reservations = Table('reservations', meta, autoload=True)
+    if _get_uuid_index(reservations):
+        return
+
+    # Based on the reservation_commit and reservation_rollback queries
+    # from: cinder/db/sqlalchemy/api.py
+    index = Index('reservations_uuid_idx', reservations.c.uuid)
+
+    index.create(migrate_engine)
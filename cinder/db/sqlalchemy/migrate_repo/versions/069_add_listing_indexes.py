@@ -0,0 +1,38 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+
+# Based on the default sort keys of the volume, snapshot and backup listings
+# from: cinder/db/sqlalchemy/api.py, for the listings of a project and of all
+# the projects.
+INDEXES = [
+    ('%s_project_deleted_created_idx',
+     ('project_id', 'deleted', 'created_at', 'id')),
+    ('%s_deleted_created_idx', ('deleted', 'created_at', 'id')),
+]
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for table_name in ('volumes', 'snapshots', 'backups'):
+        table = Table(table_name, meta, autoload=True)
+        existing = [idx.columns.keys() for idx in table.indexes]
+        for name, columns in INDEXES:
+            if list(columns) in existing:
+                continue
+            index = Index(name % table_name,
+                          *[table.c[column] for column in columns])
+            index.create(migrate_engine)
@@ -547,6 +547,22 @@ class Backup(BASE, CinderBase):
         return fail_reason and fail_reason[:255] or ''
 
 
+class BackupDedupBlock(BASE, models.TimestampMixin, models.ModelBase):
+    """Represents a block of the deduplication store of chunked backups."""
+    __tablename__ = 'backup_dedup_blocks'
+    __table_args__ = (
+        schema.UniqueConstraint("container", "sha256"),
+        {'mysql_engine': 'InnoDB'}
+    )
+    id = Column(Integer, primary_key=True, nullable=False)
+    container = Column(String(255), nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    object_name = Column(String(255), nullable=False)
+    compression = Column(String(36))
+    length = Column(Integer, nullable=False)
+    refcount = Column(Integer, nullable=False)
+
+
 class Encryption(BASE, CinderBase):
     """Represents encryption requirement for a volume type.
 
@@ -632,6 +632,11 @@ class BackupFailedToGetVolumeBackend(NotFound):
     message = _("Failed to identify volume backend.")
 
 
+class BackupDedupBlockExists(Duplicate):
+    message = _("Deduplicated backup block %(sha256)s already exists in "
+                "container %(container)s.")
+
+
 class InvalidBackup(Invalid):
     message = _("Invalid backup: %(reason)s")
 
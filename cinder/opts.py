@@ -46,10 +46,13 @@ from cinder.keymgr import conf_key_mgr as cinder_keymgr_confkeymgr
 from cinder.keymgr import key_mgr as cinder_keymgr_keymgr
 from cinder import quota as cinder_quota
 from cinder.scheduler import driver as cinder_scheduler_driver
+from cinder.scheduler.filters import instance_locality_filter as \
+    cinder_scheduler_filters_instancelocalityfilter
 from cinder.scheduler import host_manager as cinder_scheduler_hostmanager
 from cinder.scheduler import manager as cinder_scheduler_manager
 from cinder.scheduler import scheduler_options as \
     cinder_scheduler_scheduleroptions
+from cinder.scheduler import timings as cinder_scheduler_timings
 from cinder.scheduler.weights import capacity as \
     cinder_scheduler_weights_capacity
 from cinder.scheduler.weights import volume_number as \
@@ -305,6 +308,9 @@ def list_opts():
                 cinder_volume_drivers_blockbridge.blockbridge_opts,
                 [cinder_scheduler_scheduleroptions.
                     scheduler_json_config_location_opt],
+                cinder_scheduler_timings.timing_opts,
+                cinder_scheduler_filters_instancelocalityfilter.
+                instance_locality_opts,
                 cinder_volume_drivers_zfssa_zfssanfs.ZFSSA_OPTS,
                 cinder_volume_drivers_disco_disco.disco_opts,
                 cinder_volume_drivers_hgst.hgst_opts,
@@ -18,8 +18,11 @@ Filter support
 """
 import logging
 
+from oslo_utils import timeutils
+
 from cinder.openstack.common._i18n import _LI
 from cinder.scheduler import base_handler
+from cinder.scheduler import timings
 
 LOG = logging.getLogger(__name__)
 
@@ -82,12 +85,20 @@ class BaseFilterHandler(base_handler.BaseHandler):
             filter_class = filter_cls()
 
             if filter_class.run_filter_for_index(index):
-                objs = filter_class.filter_all(list_objs, filter_properties)
+                with timeutils.StopWatch() as watch:
+                    objs = filter_class.filter_all(list_objs,
+                                                   filter_properties)
+                    if objs is not None:
+                        # filter_all may return a generator, the filtering
+                        # happens while it is consumed.
+                        objs = list(objs)
+                timings.TIMINGS.record('filters', cls_name, watch.elapsed(),
+                                       len(list_objs))
                 if objs is None:
                     LOG.debug("Filter %(cls_name)s says to stop filtering",
                               {'cls_name': cls_name})
                     return
-                list_objs = list(objs)
+                list_objs = objs
                 msg = (_LI("Filter %(cls_name)s returned %(obj_len)d host(s)")
                        % {'cls_name': cls_name, 'obj_len': len(list_objs)})
                 if not list_objs:
@@ -19,9 +19,11 @@ Pluggable Weighing support
 
 import abc
 
+from oslo_utils import timeutils
 import six
 
 from cinder.scheduler import base_handler
+from cinder.scheduler import timings
 
 
 def normalize(weight_list, minval=None, maxval=None):
@@ -131,7 +133,11 @@ class BaseWeightHandler(base_handler.BaseHandler):
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
         for weigher_cls in weigher_classes:
             weigher = weigher_cls()
-            weights = weigher.weigh_objects(weighed_objs, weighing_properties)
+            with timeutils.StopWatch() as watch:
+                weights = weigher.weigh_objects(weighed_objs,
+                                                weighing_properties)
+            timings.TIMINGS.record('weighers', weigher_cls.__name__,
+                                   watch.elapsed(), len(weighed_objs))
 
             # Normalize the weights
             weights = normalize(weights,
@@ -110,6 +110,25 @@ class Scheduler(object):
         """Must override schedule method for scheduler to work."""
         raise NotImplementedError(_("Must implement schedule_create_volume"))
 
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties_list):
+        """Schedule the creation of several volumes.
+
+        Returns the exception that prevented each volume from being
+        scheduled, or None if it was.
+        """
+        errors = []
+        for request_spec, filter_properties in zip(request_spec_list,
+                                                   filter_properties_list):
+            try:
+                self.schedule_create_volume(context, request_spec,
+                                            filter_properties or {})
+            except Exception as ex:
+                errors.append(ex)
+            else:
+                errors.append(None)
+        return errors
+
     def schedule_create_consistencygroup(self, context, group,
                                          request_spec_list,
                                          filter_properties_list):
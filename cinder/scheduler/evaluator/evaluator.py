@@ -223,6 +223,9 @@ class EvalBoolOrOp(object):
 
 _parser = None
 _vars = {}
+# Parsed expressions by text, or the reason they can't be parsed.
+_expressions = {}
+_MAX_EXPRESSIONS = 1024
 
 
 def _def_parser():
@@ -272,6 +275,32 @@ def _def_parser():
     return expr
 
 
+def _parse(expression):
+    """Returns the parsed form of an expression, parsing it only once.
+
+    The parsed form only depends on the text of the expression, the values
+    of the variables are looked up when it is evaluated.
+    """
+    result = _expressions.get(expression)
+    if result is None:
+        global _parser
+        if _parser is None:
+            _parser = _def_parser()
+
+        try:
+            result = _parser.parseString(expression, parseAll=True)[0]
+        except pyparsing.ParseException as e:
+            result = _("ParseException: %s") % six.text_type(e)
+
+        if len(_expressions) >= _MAX_EXPRESSIONS:
+            _expressions.clear()
+        _expressions[expression] = result
+
+    if isinstance(result, six.string_types):
+        raise exception.EvaluatorParseException(result)
+    return result
+
+
 def evaluate(expression, **kwargs):
     """Evaluates an expression.
 
@@ -281,17 +310,9 @@ def evaluate(expression, **kwargs):
     Supports both integer and floating point values, and automatic
     promotion where necessary.
     """
-    global _parser
-    if _parser is None:
-        _parser = _def_parser()
+    result = _parse(expression)
 
     global _vars
     _vars = kwargs
 
-    try:
-        result = _parser.parseString(expression, parseAll=True)[0]
-    except pyparsing.ParseException as e:
-        raise exception.EvaluatorParseException(
-            _("ParseException: %s") % six.text_type(e))
-
     return result.eval()
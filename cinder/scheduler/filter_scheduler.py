@@ -20,8 +20,11 @@ You can customize this scheduler by specifying your own volume Filters and
 Weighing Functions.
 """
 
+import collections
+
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
 from cinder import exception
 from cinder.i18n import _, _LE, _LW
@@ -83,7 +86,64 @@ class FilterScheduler(driver.Scheduler):
     def schedule_create_volume(self, context, request_spec, filter_properties):
         weighed_host = self._schedule(context, request_spec,
                                       filter_properties)
-
+        self._create_volume_on_host(context, request_spec, filter_properties,
+                                    weighed_host)
+
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties_list):
+        """Schedule the creation of several volumes in one pass.
+
+        The volumes are grouped by the properties the filters look at. The
+        pools are only looked up once per group, and each volume of a group
+        is placed on the pools that passed the filters for the previous one,
+        after its resources were virtually consumed. The filters that give
+        the same result for the whole request only run for the first volume
+        of each group.
+
+        Returns the exception that prevented each volume from being
+        scheduled, or None if it was.
+        """
+        groups = collections.OrderedDict()
+        for index, request_spec in enumerate(request_spec_list):
+            filter_properties = filter_properties_list[index] or {}
+            key = self._batch_key(request_spec, filter_properties)
+            groups.setdefault(key, []).append(
+                (index, request_spec, filter_properties))
+
+        errors = [None] * len(request_spec_list)
+        for group in groups.values():
+            hosts = None
+            for index, request_spec, filter_properties in group:
+                try:
+                    weighed_hosts = self._get_weighted_candidates(
+                        context, request_spec, filter_properties,
+                        hosts=hosts, index=0 if hosts is None else 1)
+                    hosts = [weighed_host.obj
+                             for weighed_host in weighed_hosts]
+                    weighed_host = self._choose_weighed_host(
+                        weighed_hosts, request_spec, filter_properties)
+                    self._create_volume_on_host(context, request_spec,
+                                                filter_properties,
+                                                weighed_host)
+                except Exception as ex:
+                    errors[index] = ex
+        return errors
+
+    @staticmethod
+    def _batch_key(request_spec, filter_properties):
+        """Return what the filters look at in a volume creation request."""
+        volume_properties = request_spec.get('volume_properties', {})
+        return jsonutils.dumps(
+            [request_spec.get('volume_type'),
+             request_spec.get('CG_backend'),
+             [volume_properties.get(key) for key in
+              ('size', 'availability_zone', 'multiattach', 'metadata',
+               'qos_specs')],
+             filter_properties.get('scheduler_hints')],
+            sort_keys=True)
+
+    def _create_volume_on_host(self, context, request_spec,
+                               filter_properties, weighed_host):
         if not weighed_host:
             raise exception.NoValidHost(reason=_("No weighed hosts available"))
 
@@ -250,10 +310,12 @@ class FilterScheduler(driver.Scheduler):
                  'volume_id': volume_id})
 
     def _get_weighted_candidates(self, context, request_spec,
-                                 filter_properties=None):
+                                 filter_properties=None, hosts=None,
+                                 index=0):
         """Return a list of hosts that meet required specs.
 
-        Returned list is ordered by their fitness.
+        Returned list is ordered by their fitness. The hosts are taken from
+        the host manager unless given; index is passed to the filters.
         """
         elevated = context.elevated()
 
@@ -303,11 +365,13 @@ class FilterScheduler(driver.Scheduler):
 
         # Note: remember, we are using an iterator here. So only
         # traverse this list once.
-        hosts = self.host_manager.get_all_host_states(elevated)
+        if hosts is None:
+            hosts = self.host_manager.get_all_host_states(elevated)
 
         # Filter local hosts based on requirements ...
         hosts = self.host_manager.get_filtered_hosts(hosts,
-                                                     filter_properties)
+                                                     filter_properties,
+                                                     index=index)
         if not hosts:
             return []
 
@@ -413,6 +477,11 @@ class FilterScheduler(driver.Scheduler):
     def _schedule(self, context, request_spec, filter_properties=None):
         weighed_hosts = self._get_weighted_candidates(context, request_spec,
                                                       filter_properties)
+        return self._choose_weighed_host(weighed_hosts, request_spec,
+                                         filter_properties)
+
+    def _choose_weighed_host(self, weighed_hosts, request_spec,
+                             filter_properties):
         # When we get the weighed_hosts, we clear those hosts whose backend
         # is not same as consistencygroup's backend.
         CG_backend = request_spec.get('CG_backend')
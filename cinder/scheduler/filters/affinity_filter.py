@@ -24,18 +24,26 @@ LOG = logging.getLogger(__name__)
 
 
 class AffinityFilter(filters.BaseHostFilter):
-    def __init__(self):
-        self.volume_api = volume.API()
+    """Base class of the filters using the back-ends of a set of volumes.
 
+    The volumes given in the scheduler hint are looked up once for all the
+    hosts of a request.
+    """
 
-class DifferentBackendFilter(AffinityFilter):
-    """Schedule volume on a different back-end from a set of volumes."""
+    # Scheduler hint with the uuids of the volumes.
+    hint = None
 
-    def host_passes(self, host_state, filter_properties):
-        context = filter_properties['context']
+    # The hinted volumes do not move within a request
+    run_filter_once_per_request = True
+
+    def __init__(self):
+        self.volume_api = volume.API()
+
+    def _get_affinity_uuids(self, filter_properties):
+        """Return the volume uuids of the hint, or None if it's invalid."""
         scheduler_hints = filter_properties.get('scheduler_hints') or {}
 
-        affinity_uuids = scheduler_hints.get('different_host', [])
+        affinity_uuids = scheduler_hints.get(self.hint, [])
 
         # scheduler hint verification: affinity_uuids can be a list of uuids
         # or single uuid.  The checks here is to make sure every single string
@@ -47,56 +55,55 @@ class DifferentBackendFilter(AffinityFilter):
                 if uuidutils.is_uuid_like(uuid):
                     continue
                 else:
-                    return False
+                    return None
         elif uuidutils.is_uuid_like(affinity_uuids):
             affinity_uuids = [affinity_uuids]
         else:
             # Not a list, not a string looks like uuid, don't pass it
             # to DB for query to avoid potential risk.
-            return False
+            return None
 
-        if affinity_uuids:
-            return not self.volume_api.get_all(
-                context, filters={'host': host_state.host,
-                                  'id': affinity_uuids,
-                                  'deleted': False})
+        return affinity_uuids
 
-        # With no different_host key
-        return True
+    def _backend_passes(self, host, backends):
+        """Return whether host passes given the back-ends of the volumes."""
+        raise NotImplementedError()
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        affinity_uuids = self._get_affinity_uuids(filter_properties)
+        if affinity_uuids is None:
+            return []
 
-class SameBackendFilter(AffinityFilter):
-    """Schedule volume on the same back-end as another volume."""
+        # With no affinity key
+        if not affinity_uuids:
+            return filter_obj_list
 
-    def host_passes(self, host_state, filter_properties):
         context = filter_properties['context']
-        scheduler_hints = filter_properties.get('scheduler_hints') or {}
+        volumes = self.volume_api.get_all(
+            context, filters={'id': affinity_uuids,
+                              'deleted': False})
+        backends = set(vol.host for vol in volumes)
 
-        affinity_uuids = scheduler_hints.get('same_host', [])
+        return [host_state for host_state in filter_obj_list
+                if self._backend_passes(host_state.host, backends)]
 
-        # scheduler hint verification: affinity_uuids can be a list of uuids
-        # or single uuid.  The checks here is to make sure every single string
-        # in the list looks like a uuid, otherwise, this filter will fail to
-        # pass.  Note that the filter does *NOT* ignore string doesn't look
-        # like a uuid, it is better to fail the request than serving it wrong.
-        if isinstance(affinity_uuids, list):
-            for uuid in affinity_uuids:
-                if uuidutils.is_uuid_like(uuid):
-                    continue
-                else:
-                    return False
-        elif uuidutils.is_uuid_like(affinity_uuids):
-            affinity_uuids = [affinity_uuids]
-        else:
-            # Not a list, not a string looks like uuid, don't pass it
-            # to DB for query to avoid potential risk.
-            return False
+    def host_passes(self, host_state, filter_properties):
+        return bool(self.filter_all([host_state], filter_properties))
+
+
+class DifferentBackendFilter(AffinityFilter):
+    """Schedule volume on a different back-end from a set of volumes."""
+
+    hint = 'different_host'
+
+    def _backend_passes(self, host, backends):
+        return host not in backends
+
+
+class SameBackendFilter(AffinityFilter):
+    """Schedule volume on the same back-end as another volume."""
 
-        if affinity_uuids:
-            return self.volume_api.get_all(
-                context, filters={'host': host_state.host,
-                                  'id': affinity_uuids,
-                                  'deleted': False})
+    hint = 'same_host'
 
-        # With no same_host key
-        return True
+    def _backend_passes(self, host, backends):
+        return host in backends
@@ -23,19 +23,17 @@ from cinder.scheduler.filters import extra_specs_ops
 LOG = logging.getLogger(__name__)
 
 
-class CapabilitiesFilter(filters.BaseHostFilter):
-    """HostFilter to work with resource (instance & volume) type records."""
+# Matchers of the extra specs seen so far, by extra specs. The filter is
+# instantiated for every request, so they are kept at module level.
+_MATCHERS = {}
+_MAX_MATCHERS = 1024
 
-    def _satisfies_extra_specs(self, capabilities, resource_type):
-        """Check if capabilities satisfy resource type requirements.
 
-        Check that the capabilities provided by the services satisfy
-        the extra specs associated with the resource type.
-        """
-        extra_specs = resource_type.get('extra_specs', [])
-        if not extra_specs:
-            return True
+class _ExtraSpecsMatcher(object):
+    """The extra specs of a resource type, parsed once."""
 
+    def __init__(self, extra_specs):
+        self.specs = []
         for key, req in six.iteritems(extra_specs):
             # Either not scope format, or in capabilities scope
             scope = key.split(':')
@@ -43,24 +41,82 @@ class CapabilitiesFilter(filters.BaseHostFilter):
                 continue
             elif scope[0] == "capabilities":
                 del scope[0]
+            self.specs.append((scope, req, extra_specs_ops.get_matcher(req)))
 
+    def __call__(self, capabilities):
+        for scope, req, match in self.specs:
             cap = capabilities
-            for index in range(len(scope)):
+            for key in scope:
                 try:
-                    cap = cap.get(scope[index])
+                    cap = cap.get(key)
                 except AttributeError:
                     return False
                 if cap is None:
                     LOG.debug("Host doesn't provide capability '%(cap)s' " %
-                              {'cap': scope[index]})
+                              {'cap': key})
                     return False
-            if not extra_specs_ops.match(cap, req):
+            if not match(cap):
                 LOG.debug("extra_spec requirement '%(req)s' "
                           "does not match '%(cap)s'",
                           {'req': req, 'cap': cap})
                 return False
         return True
 
+
+def _get_matcher(extra_specs):
+    """Return the cached matcher of extra_specs, compiling it if needed."""
+    try:
+        key = frozenset(six.iteritems(extra_specs))
+    except TypeError:
+        # Unhashable requirements, don't cache them.
+        return _ExtraSpecsMatcher(extra_specs)
+
+    matcher = _MATCHERS.get(key)
+    if matcher is None:
+        if len(_MATCHERS) >= _MAX_MATCHERS:
+            _MATCHERS.clear()
+        matcher = _MATCHERS[key] = _ExtraSpecsMatcher(extra_specs)
+    return matcher
+
+
+class CapabilitiesFilter(filters.BaseHostFilter):
+    """HostFilter to work with resource (instance & volume) type records."""
+
+    # Resource types and capabilities do not change within a request
+    run_filter_once_per_request = True
+
+    def _satisfies_extra_specs(self, capabilities, resource_type):
+        """Check if capabilities satisfy resource type requirements.
+
+        Check that the capabilities provided by the services satisfy
+        the extra specs associated with the resource type.
+        """
+        extra_specs = resource_type.get('extra_specs', [])
+        if not extra_specs:
+            return True
+
+        return _get_matcher(extra_specs)(capabilities)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts that can create resource_type.
+
+        The extra specs are only looked up and parsed once for all the hosts.
+        """
+        resource_type = filter_properties.get('resource_type')
+        extra_specs = resource_type.get('extra_specs', [])
+        if not extra_specs:
+            for host_state in filter_obj_list:
+                yield host_state
+            return
+
+        matcher = _get_matcher(extra_specs)
+        for host_state in filter_obj_list:
+            if matcher(host_state.capabilities):
+                yield host_state
+            else:
+                LOG.debug("%(host_state)s fails resource_type extra_specs "
+                          "requirements", {'host_state': host_state})
+
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can create resource_type."""
         # Note(zhiteng) Currently only Cinder and Nova are using
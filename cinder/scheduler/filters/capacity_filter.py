@@ -23,6 +23,7 @@ from oslo_log import log as logging
 
 from cinder.i18n import _LE, _LW
 from cinder.scheduler import filters
+from cinder.scheduler import pool_capacity
 
 
 LOG = logging.getLogger(__name__)
@@ -31,6 +32,36 @@ LOG = logging.getLogger(__name__)
 class CapacityFilter(filters.BaseHostFilter):
     """CapacityFilter filters based on volume host's capacity utilization."""
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Filter all the hosts in a single pass over their capacities.
+
+        The hosts that don't report numeric capacities, the host the volume
+        already exists on and the hosts that are rejected go through
+        host_passes, so that they are handled and logged as before.
+        """
+        volume_size = filter_properties.get('size')
+        if not pool_capacity.is_number(volume_size):
+            return list(super(CapacityFilter, self).filter_all(
+                filter_obj_list, filter_properties))
+
+        host_states = list(filter_obj_list)
+        table = pool_capacity.PoolCapacityTable(host_states)
+        passes = [None] * len(host_states)
+        for i, fits in zip(table.rows, table.fits(volume_size)):
+            passes[i] = fits
+
+        vol_exists_on = filter_properties.get('vol_exists_on')
+        result = []
+        for host_state, fits in zip(host_states, passes):
+            if ((fits and host_state.host != vol_exists_on) or
+                    self.host_passes(host_state, filter_properties)):
+                result.append(host_state)
+        LOG.debug("%(passed)d of %(total)d hosts have enough space for a "
+                  "%(size)s GB volume.",
+                  {'passed': len(result), 'total': len(host_states),
+                   'size': volume_size})
+        return result
+
     def host_passes(self, host_state, filter_properties):
         """Return True if host has sufficient capacity."""
 
@@ -38,7 +38,12 @@ _op_methods = {'=': lambda x, y: float(x) >= float(y),
                's>=': operator.ge}
 
 
-def match(value, req):
+def get_matcher(req):
+    """Parse an extra spec requirement once.
+
+    Returns a function of a capability value returning whether the value
+    satisfies req, the same as match(value, req).
+    """
     words = req.split()
 
     op = method = None
@@ -47,26 +52,27 @@ def match(value, req):
         method = _op_methods.get(op)
 
     if op != '<or>' and not method:
-        return value == req
-
-    if value is None:
-        return False
+        return lambda value: value == req
 
     if op == '<or>':  # Ex: <or> v1 <or> v2 <or> v3
-        while True:
-            if words.pop(0) == value:
-                return True
-            if not words:
-                break
-            op = words.pop(0)  # remove a keyword <or>
-            if not words:
-                break
-        return False
+        # Every other word is a value, the others are <or> keywords.
+        choices = words[::2]
+        return lambda value: value is not None and value in choices
+
+    if not words:
+        return lambda value: False
+    arg = words[0]
 
-    try:
-        if words and method(value, words[0]):
-            return True
-    except ValueError:
-        pass
+    def _match(value):
+        if value is None:
+            return False
+        try:
+            return bool(method(value, arg))
+        except ValueError:
+            return False
 
-    return False
+    return _match
+
+
+def match(value, req):
+    return get_matcher(req)(value)
@@ -13,6 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import uuidutils
 
@@ -23,12 +26,57 @@ from cinder.scheduler import filters
 from cinder.volume import utils as volume_utils
 
 
+instance_locality_opts = [
+    cfg.IntOpt('instance_locality_cache_ttl',
+               default=60,
+               min=0,
+               help='Number of seconds the scheduler remembers the host of '
+                    'an instance given in a local_to_instance hint, and '
+                    'whether Nova returns the hosts of instances. 0 '
+                    'disables the cache.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(instance_locality_opts)
+
 LOG = logging.getLogger(__name__)
 
 HINT_KEYWORD = 'local_to_instance'
 INSTANCE_HOST_PROP = 'OS-EXT-SRV-ATTR:host'
 REQUESTS_TIMEOUT = 5
 
+# Nova answers shared by all the requests, with the time they expire at:
+# the hosts of the instances by UUID, and the presence of Nova extensions by
+# name.
+_INSTANCE_HOSTS = {}
+_MAX_INSTANCE_HOSTS = 4096
+_NOVA_EXTENSIONS = {}
+
+
+def _cache_get(cache, key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at <= time.time():
+        cache.pop(key, None)
+        return None
+    return value
+
+
+def _cache_set(cache, key, value, max_size=None):
+    ttl = CONF.instance_locality_cache_ttl
+    if not ttl:
+        return
+    now = time.time()
+    if max_size is not None and len(cache) >= max_size:
+        for cache_key, (_value, expires_at) in list(cache.items()):
+            if expires_at <= now:
+                del cache[cache_key]
+        if len(cache) >= max_size:
+            cache.clear()
+    cache[key] = (value, now + ttl)
+
 
 class InstanceLocalityFilter(filters.BaseHostFilter):
     """Schedule volume on the same host as a given instance.
@@ -47,10 +95,15 @@ class InstanceLocalityFilter(filters.BaseHostFilter):
       'extended_server_attributes' in Nova policy).
     """
 
+    # The instance does not move within a request
+    run_filter_once_per_request = True
+
     def __init__(self):
         # Cache Nova API answers directly into the Filter object.
         # Since a BaseHostFilter instance lives only during the volume's
         # scheduling, the cache is re-created for every new volume creation.
+        # The answers are also kept for instance_locality_cache_ttl seconds
+        # in a cache shared by all the requests.
         self._cache = {}
         super(InstanceLocalityFilter, self).__init__()
 
@@ -62,8 +115,15 @@ class InstanceLocalityFilter(filters.BaseHostFilter):
         """
 
         if not hasattr(self, '_nova_ext_srv_attr'):
-            self._nova_ext_srv_attr = nova.API().has_extension(
-                context, 'ExtendedServerAttributes', timeout=REQUESTS_TIMEOUT)
+            ext_srv_attr = _cache_get(_NOVA_EXTENSIONS,
+                                      'ExtendedServerAttributes')
+            if ext_srv_attr is None:
+                ext_srv_attr = nova.API().has_extension(
+                    context, 'ExtendedServerAttributes',
+                    timeout=REQUESTS_TIMEOUT)
+                _cache_set(_NOVA_EXTENSIONS, 'ExtendedServerAttributes',
+                           ext_srv_attr)
+            self._nova_ext_srv_attr = ext_srv_attr
 
         return self._nova_ext_srv_attr
 
@@ -93,6 +153,12 @@ class InstanceLocalityFilter(filters.BaseHostFilter):
         if instance_uuid in self._cache:
             return self._cache[instance_uuid] == host
 
+        # Then in the cache shared by the requests
+        instance_host = _cache_get(_INSTANCE_HOSTS, instance_uuid)
+        if instance_host is not None:
+            self._cache[instance_uuid] = instance_host
+            return instance_host == host
+
         if not self._nova_has_extended_server_attributes(context):
             LOG.warning(_LW('Hint "%s" dropped because '
                             'ExtendedServerAttributes not active in Nova.'),
@@ -113,6 +179,8 @@ class InstanceLocalityFilter(filters.BaseHostFilter):
                                             HINT_KEYWORD)
 
         self._cache[instance_uuid] = getattr(server, INSTANCE_HOST_PROP)
+        _cache_set(_INSTANCE_HOSTS, instance_uuid, self._cache[instance_uuid],
+                   max_size=_MAX_INSTANCE_HOSTS)
 
         # Match if given instance is hosted on host
         return self._cache[instance_uuid] == host
@@ -18,12 +18,14 @@ Manage hosts in the current zone.
 """
 
 import collections
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
 
 from cinder import context as cinder_context
+from cinder import db
 from cinder import exception
 from cinder import objects
 from cinder import utils
@@ -46,7 +48,16 @@ host_manager_opts = [
                 default=[
                     'CapacityWeigher'
                 ],
-                help='Which weigher class names to use for weighing hosts.')
+                help='Which weigher class names to use for weighing hosts.'),
+    cfg.IntOpt('scheduler_service_refresh_interval',
+               default=10,
+               min=0,
+               help='Number of seconds the scheduler caches the list of '
+                    'enabled and running volume services between database '
+                    'lookups. Capability reports are applied as soon as they '
+                    'are received; this only bounds how long it takes to '
+                    'notice a service going down or being disabled. 0 '
+                    'looks the services up on every scheduling request.'),
 ]
 
 CONF = cfg.CONF
@@ -111,6 +122,9 @@ class HostState(object):
         # Does this backend support attaching a volume to more than
         # once host/instance?
         self.multiattach = False
+        # Number of volumes on the pool, maintained by the HostManager
+        # for pools. None when it is not known.
+        self.volume_count = None
 
         # PoolState for all pools
         self.pools = {}
@@ -277,6 +291,8 @@ class HostState(object):
             pass
         else:
             self.free_capacity_gb -= volume_gb
+        if self.volume_count is not None:
+            self.volume_count += 1
         self.updated = timeutils.utcnow()
 
     def __repr__(self):
@@ -347,6 +363,15 @@ class HostManager(object):
         self.weight_classes = self.weight_handler.get_all_classes()
 
         self._no_capabilities_hosts = set()  # Hosts having no capabilities
+        # Enabled volume services that are up, by host, as of the last
+        # lookup, and the time of that lookup.
+        self._services = {}
+        self._services_refreshed = None
+        # Pools of all the hosts in host_state_map, rebuilt when a host or
+        # one of its pools changes.
+        self._pool_snapshot = None
+        # Number of volumes on each pool, by pool host.
+        self._volume_counts = {}
         self._update_host_state_map(cinder_context.get_admin_context())
 
     def _choose_host_filters(self, filter_cls_names):
@@ -405,12 +430,13 @@ class HostManager(object):
         return good_weighers
 
     def get_filtered_hosts(self, hosts, filter_properties,
-                           filter_class_names=None):
+                           filter_class_names=None, index=0):
         """Filter hosts and return only ones passing all filters."""
         filter_classes = self._choose_host_filters(filter_class_names)
         return self.filter_handler.get_filtered_objects(filter_classes,
                                                         hosts,
-                                                        filter_properties)
+                                                        filter_properties,
+                                                        index)
 
     def get_weighed_hosts(self, hosts, weight_properties,
                           weigher_class_names=None):
@@ -440,9 +466,52 @@ class HostManager(object):
 
         self._no_capabilities_hosts.discard(host)
 
+        # Apply the report right away if the service is known to be up, so
+        # that scheduling requests don't have to parse it.
+        service = self._services.get(host)
+        if service is not None:
+            self._update_host_state(host, capab_copy, service)
+
     def has_all_capabilities(self):
         return len(self._no_capabilities_hosts) == 0
 
+    def _update_host_state(self, host, capabilities, service):
+        host_state = self.host_state_map.get(host)
+        if not host_state:
+            host_state = self.host_state_cls(host,
+                                             capabilities=capabilities,
+                                             service=dict(service))
+            self.host_state_map[host] = host_state
+        # update capabilities and attributes in host_state
+        host_state.update_from_volume_capability(capabilities,
+                                                 service=dict(service))
+        for pool in host_state.pools.values():
+            if pool.volume_count is None:
+                pool.volume_count = self._volume_counts.get(pool.host, 0)
+        self._pool_snapshot = None
+
+    def _update_volume_counts(self):
+        """Count the volumes of every pool with a single query."""
+        volume_data = db.volume_data_get_by_host(
+            cinder_context.get_admin_context())
+        counts = collections.defaultdict(int)
+        for host, (count, _gigabytes) in volume_data.items():
+            if host:
+                # Volumes created on a pool have a host#pool host, like
+                # the pool itself.
+                counts['#'.join(host.split('#', 2)[:2])] += count
+        self._volume_counts = dict(counts)
+
+        for host_state in self.host_state_map.values():
+            for pool in host_state.pools.values():
+                pool.volume_count = self._volume_counts.get(pool.host, 0)
+
+    def _services_expired(self):
+        if self._services_refreshed is None:
+            return True
+        elapsed = time.time() - self._services_refreshed
+        return elapsed >= CONF.scheduler_service_refresh_interval
+
     def _update_host_state_map(self, context):
 
         # Get resource usage across the available volume nodes:
@@ -450,6 +519,7 @@ class HostManager(object):
         volume_services = objects.ServiceList.get_all_by_topic(context,
                                                                topic,
                                                                disabled=False)
+        services = {}
         active_hosts = set()
         no_capabilities_hosts = set()
         for service in volume_services.objects:
@@ -457,24 +527,17 @@ class HostManager(object):
             if not utils.service_is_up(service):
                 LOG.warning(_LW("volume service is down. (host: %s)"), host)
                 continue
+            services[host] = service
             capabilities = self.service_states.get(host, None)
             if capabilities is None:
                 no_capabilities_hosts.add(host)
                 continue
 
-            host_state = self.host_state_map.get(host)
-            if not host_state:
-                host_state = self.host_state_cls(host,
-                                                 capabilities=capabilities,
-                                                 service=
-                                                 dict(service))
-                self.host_state_map[host] = host_state
-            # update capabilities and attributes in host_state
-            host_state.update_from_volume_capability(capabilities,
-                                                     service=
-                                                     dict(service))
+            self._update_host_state(host, capabilities, service)
             active_hosts.add(host)
 
+        self._services = services
+        self._services_refreshed = time.time()
         self._no_capabilities_hosts = no_capabilities_hosts
 
         # remove non-active hosts from host_state_map
@@ -483,6 +546,14 @@ class HostManager(object):
             LOG.info(_LI("Removing non-active host: %(host)s from "
                          "scheduler cache."), {'host': host})
             del self.host_state_map[host]
+            self._pool_snapshot = None
+
+        self._update_volume_counts()
+
+    def _refresh_host_state_map(self, context):
+        """Look the volume services up again if the cached list expired."""
+        if self._services_expired():
+            self._update_host_state_map(context)
 
     def get_all_host_states(self, context):
         """Returns a dict of all the hosts the HostManager knows about.
@@ -494,23 +565,21 @@ class HostManager(object):
           {'192.168.1.100': HostState(), ...}
         """
 
-        self._update_host_state_map(context)
+        self._refresh_host_state_map(context)
 
-        # build a pool_state map and return that map instead of host_state_map
-        all_pools = {}
-        for host, state in self.host_state_map.items():
-            for key in state.pools:
-                pool = state.pools[key]
-                # use host.pool_name to make sure key is unique
-                pool_key = '.'.join([host, pool.pool_name])
-                all_pools[pool_key] = pool
+        # return the pools instead of host_state_map, the list is only
+        # rebuilt when a host or one of its pools changed since last time.
+        if self._pool_snapshot is None:
+            self._pool_snapshot = [pool
+                                   for state in self.host_state_map.values()
+                                   for pool in state.pools.values()]
 
-        return all_pools.values()
+        return list(self._pool_snapshot)
 
     def get_pools(self, context):
         """Returns a dict of all pools on all hosts HostManager knows about."""
 
-        self._update_host_state_map(context)
+        self._refresh_host_state_map(context)
 
         all_pools = []
         for host, state in self.host_state_map.items():
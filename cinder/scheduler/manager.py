@@ -23,8 +23,10 @@ import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_service import periodic_task
 from oslo_utils import excutils
 from oslo_utils import importutils
+from oslo_utils import timeutils
 import six
 
 from cinder import context
@@ -37,6 +39,7 @@ from cinder import objects
 from cinder import quota
 from cinder import rpc
 from cinder.scheduler.flows import create_volume
+from cinder.scheduler import timings
 from cinder.volume import rpcapi as volume_rpcapi
 
 
@@ -56,7 +59,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.11'
+    RPC_API_VERSION = '1.13'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -67,6 +70,8 @@ class SchedulerManager(manager.Manager):
         self.driver = importutils.import_object(scheduler_driver)
         super(SchedulerManager, self).__init__(*args, **kwargs)
         self._startup_delay = True
+        self._timings_notified_at = timeutils.utcnow()
+        self._timings_notified_count = 0
 
     def init_host_with_rpc(self):
         ctxt = context.get_admin_context()
@@ -147,6 +152,28 @@ class SchedulerManager(manager.Manager):
         with flow_utils.DynamicLogListener(flow_engine, logger=LOG):
             flow_engine.run()
 
+    def create_volumes(self, context, topic, request_spec_list,
+                       filter_properties_list):
+        """Schedule the creation of several volumes together.
+
+        The requests don't go through the create_volume scheduler flow:
+        they come with their request spec, and the volumes that can't be
+        scheduled are put in error state and a scheduler.create_volume
+        error is notified, as when the flow fails.
+        """
+
+        self._wait_for_scheduler()
+
+        errors = self.driver.schedule_create_volumes(context,
+                                                     request_spec_list,
+                                                     filter_properties_list)
+        for request_spec, ex in zip(request_spec_list, errors):
+            if ex is not None:
+                volume_state = {'volume_state': {'status': 'error'}}
+                self._set_volume_state_and_notify('create_volume',
+                                                  volume_state,
+                                                  context, ex, request_spec)
+
     def request_service_capabilities(self, context):
         volume_rpcapi.VolumeAPI().publish_service_capabilities(context)
 
@@ -289,6 +316,27 @@ class SchedulerManager(manager.Manager):
         """
         return self.driver.get_pools(context, filters)
 
+    def get_timings(self, context):
+        """Get the time spent by the filters and weighers of this scheduler."""
+        return timings.TIMINGS.report()
+
+    @periodic_task.periodic_task
+    def _notify_timings(self, context):
+        """Send the filter and weigher timings at a periodic interval."""
+        interval = CONF.scheduler_timings_notification_interval
+        if (not interval or
+                timings.TIMINGS.count == self._timings_notified_count or
+                not timeutils.is_older_than(self._timings_notified_at,
+                                            interval)):
+            return
+
+        self._timings_notified_at = timeutils.utcnow()
+        self._timings_notified_count = timings.TIMINGS.count
+        payload = {'host': self.host,
+                   'timings': timings.TIMINGS.report()}
+        rpc.get_notifier("scheduler").info(context, 'scheduler.timings',
+                                           payload)
+
     def _set_volume_state_and_notify(self, method, updates, context, ex,
                                      request_spec, msg=None):
         # TODO(harlowja): move into a task that just does this later.
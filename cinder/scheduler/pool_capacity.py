@@ -0,0 +1,109 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Columnar view of the capacity of a list of pools.
+
+The capacity filter and weigher look at the same handful of fields of every
+pool.  Copying them once into columns lets both compute their results for
+all the pools in a single pass.  The results are the same as the ones
+computed pool by pool.
+"""
+
+import math
+import numbers
+
+
+def is_number(value):
+    return (isinstance(value, numbers.Real) and
+            not isinstance(value, bool))
+
+
+class PoolCapacityTable(object):
+    """Capacity fields of a list of host states, stored by column.
+
+    Only the host states reporting numeric capacities are stored, their
+    indexes in the list are in ``rows``.  The indexes of the others, like
+    the ones reporting 'infinite' or 'unknown' capacities, are in
+    ``others``; the callers handle them one by one as before.
+    """
+
+    def __init__(self, host_states):
+        self.rows = []
+        self.others = []
+        free = []
+        total = []
+        reserved = []
+        provisioned = []
+        ratio = []
+        thin = []
+        for i, host_state in enumerate(host_states):
+            if not (is_number(host_state.free_capacity_gb) and
+                    is_number(host_state.total_capacity_gb) and
+                    is_number(host_state.provisioned_capacity_gb) and
+                    is_number(host_state.max_over_subscription_ratio)):
+                self.others.append(i)
+                continue
+            self.rows.append(i)
+            free.append(host_state.free_capacity_gb)
+            total.append(float(host_state.total_capacity_gb))
+            reserved.append(float(host_state.reserved_percentage) / 100)
+            provisioned.append(host_state.provisioned_capacity_gb)
+            ratio.append(host_state.max_over_subscription_ratio)
+            thin.append(bool(host_state.thin_provisioning_support))
+
+        self.free = free
+        self.total = total
+        self.reserved = reserved
+        self.provisioned = provisioned
+        self.ratio = ratio
+        self.thin = thin
+
+    def __len__(self):
+        return len(self.rows)
+
+    def virtual_free(self):
+        """Return the virtual free capacity of the pools in ``rows``.
+
+        This is utils.calculate_virtual_free_capacity applied to every
+        pool.
+        """
+        values = []
+        for free, total, reserved, provisioned, ratio, thin in zip(
+                self.free, self.total, self.reserved, self.provisioned,
+                self.ratio, self.thin):
+            reserved = math.floor(total * reserved)
+            if thin:
+                values.append(total * ratio - provisioned - reserved)
+            else:
+                values.append(free - reserved)
+        return values
+
+    def fits(self, size):
+        """Return whether a volume of the given size fits in each pool.
+
+        This is the decision CapacityFilter.host_passes makes for the pools
+        in ``rows``.
+        """
+        results = []
+        for free, total, reserved, provisioned, ratio, thin in zip(
+                self.free, self.total, self.reserved, self.provisioned,
+                self.ratio, self.thin):
+            if total <= 0:
+                results.append(False)
+                continue
+            free = free - math.floor(total * reserved)
+            if thin and ratio > 1:
+                results.append((provisioned + size) / total <= ratio and
+                               free * ratio >= size)
+            else:
+                results.append(free >= size)
+        return results
@@ -19,6 +19,8 @@ Client side of the scheduler manager RPC API.
 from oslo_config import cfg
 from oslo_serialization import jsonutils
 
+from cinder import exception
+from cinder.i18n import _
 from cinder import rpc
 
 
@@ -44,9 +46,11 @@ class SchedulerAPI(rpc.RPCAPI):
         1.10 - Adds support for sending objects over RPC in retype()
         1.11 - Adds support for sending objects over RPC in
                migrate_volume_to_host()
+        1.12 - Add create_volumes method
+        1.13 - Add get_timings method
     """
 
-    RPC_API_VERSION = '1.11'
+    RPC_API_VERSION = '1.13'
     TOPIC = CONF.scheduler_topic
     BINARY = 'cinder-scheduler'
 
@@ -84,6 +88,29 @@ class SchedulerAPI(rpc.RPCAPI):
         cctxt = self.client.prepare(version=version)
         return cctxt.cast(ctxt, 'create_volume', **msg_args)
 
+    def create_volumes(self, ctxt, topic, request_spec_list,
+                       filter_properties_list):
+        if not self.client.can_send_version('1.12'):
+            # Older schedulers get one request per volume.
+            for request_spec, filter_properties in zip(
+                    request_spec_list, filter_properties_list):
+                self.create_volume(ctxt, topic, request_spec['volume_id'],
+                                   snapshot_id=request_spec.get(
+                                       'snapshot_id'),
+                                   image_id=request_spec.get('image_id'),
+                                   request_spec=request_spec,
+                                   filter_properties=filter_properties,
+                                   volume=request_spec.get('volume'))
+            return
+
+        cctxt = self.client.prepare(version='1.12')
+        request_spec_p_list = [jsonutils.to_primitive(request_spec)
+                               for request_spec in request_spec_list]
+        return cctxt.cast(ctxt, 'create_volumes',
+                          topic=topic,
+                          request_spec_list=request_spec_p_list,
+                          filter_properties_list=filter_properties_list)
+
     def migrate_volume_to_host(self, ctxt, topic, volume_id, host,
                                force_host_copy=False, request_spec=None,
                                filter_properties=None, volume=None):
@@ -132,6 +159,14 @@ class SchedulerAPI(rpc.RPCAPI):
         return cctxt.call(ctxt, 'get_pools',
                           filters=filters)
 
+    def get_timings(self, ctxt):
+        if not self.client.can_send_version('1.13'):
+            msg = _('One of cinder-scheduler services is too old to report '
+                    'its filter and weigher timings.')
+            raise exception.ServiceTooOld(msg)
+        cctxt = self.client.prepare(version='1.13')
+        return cctxt.call(ctxt, 'get_timings')
+
     def update_service_capabilities(self, ctxt,
                                     service_name, host,
                                     capabilities):
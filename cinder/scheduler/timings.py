@@ -0,0 +1,120 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time spent by the scheduler filters and weighers.
+
+The filter and weight handlers record how long every filter and weigher
+took, and for how many hosts, in the histograms of this scheduler process.
+"""
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from cinder.i18n import _LW
+
+
+timing_opts = [
+    cfg.FloatOpt('scheduler_slow_filter_threshold',
+                 default=1.0,
+                 min=0,
+                 help='Log a warning when a scheduler filter or weigher '
+                      'takes more than this number of seconds to process '
+                      'the hosts of a request. 0 disables the warnings.'),
+    cfg.IntOpt('scheduler_timings_notification_interval',
+               default=600,
+               min=0,
+               help='Interval in seconds between the scheduler.timings '
+                    'notifications reporting the time spent by the '
+                    'scheduler filters and weighers. 0 disables the '
+                    'notifications.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(timing_opts)
+
+LOG = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in seconds.
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+class Histogram(object):
+    """Distribution of the durations of a filter or weigher."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.hosts = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, elapsed, hosts):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.hosts += hosts
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.buckets[i] += 1
+
+    def to_dict(self):
+        buckets = dict(('%g' % bound, count)
+                       for bound, count in zip(BUCKETS, self.buckets))
+        buckets['inf'] = self.buckets[-1]
+        return {'count': self.count,
+                'total': self.total,
+                'max': self.max,
+                'hosts': self.hosts,
+                'buckets': buckets}
+
+
+class Timings(object):
+    """Histograms of the filters and weighers, by class name."""
+
+    KINDS = ('filters', 'weighers')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._histograms = dict((kind, {}) for kind in self.KINDS)
+        self.count = 0
+
+    def record(self, kind, name, elapsed, hosts):
+        """Record that a filter or weigher took elapsed seconds."""
+        histograms = self._histograms[kind]
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(elapsed, hosts)
+        self.count += 1
+
+        threshold = CONF.scheduler_slow_filter_threshold
+        if threshold and elapsed > threshold:
+            LOG.warning(_LW("Scheduler %(kind)s %(name)s took %(elapsed).3f "
+                            "seconds to process %(hosts)d host(s), more "
+                            "than %(threshold)s seconds."),
+                        {'kind': kind[:-1], 'name': name,
+                         'elapsed': elapsed, 'hosts': hosts,
+                         'threshold': threshold})
+
+    def report(self):
+        """Return the histograms as a dictionary."""
+        return dict((kind, dict((name, histogram.to_dict())
+                                for name, histogram in histograms.items()))
+                    for kind, histograms in self._histograms.items())
+
+
+TIMINGS = Timings()
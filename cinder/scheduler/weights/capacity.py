@@ -44,6 +44,7 @@ import math
 
 from oslo_config import cfg
 
+from cinder.scheduler import pool_capacity
 from cinder.scheduler import weights
 from cinder import utils
 
@@ -75,7 +76,7 @@ class CapacityWeigher(weights.BaseHostWeigher):
         """Override the weigh objects.
 
 
-        This override calls the parent to do the weigh objects and then
+        This override weighs all the objects in a single pass and then
         replaces any infinite weights with a value that is a multiple of the
         delta between the min and max values.
 
@@ -84,8 +85,7 @@ class CapacityWeigher(weights.BaseHostWeigher):
         largest weight value is being used a weight of -1 is used instead.
         See _weigh_object method.
         """
-        tmp_weights = super(weights.BaseHostWeigher, self).weigh_objects(
-            weighed_obj_list, weight_properties)
+        tmp_weights = self._weigh_all(weighed_obj_list, weight_properties)
 
         if math.isinf(self.maxval):
             # NOTE(jecarey): if all weights were infinite then parent
@@ -100,6 +100,31 @@ class CapacityWeigher(weights.BaseHostWeigher):
 
         return tmp_weights
 
+    def _weigh_all(self, weighed_obj_list, weight_properties):
+        """Weigh all the hosts in a single pass over their capacities.
+
+        The hosts that don't report numeric capacities are weighed by
+        _weigh_object.  minval and maxval are recorded like the parent
+        weigh_objects method does.
+        """
+        host_states = [obj.obj for obj in weighed_obj_list]
+        table = pool_capacity.PoolCapacityTable(host_states)
+        tmp_weights = [None] * len(host_states)
+        for i, free in zip(table.rows, table.virtual_free()):
+            tmp_weights[i] = free
+        for i in table.others:
+            tmp_weights[i] = self._weigh_object(host_states[i],
+                                                weight_properties)
+
+        if tmp_weights:
+            low = min(tmp_weights)
+            high = max(tmp_weights)
+            self.minval = low if self.minval is None else min(self.minval,
+                                                              low)
+            self.maxval = high if self.maxval is None else max(self.maxval,
+                                                               high)
+        return tmp_weights
+
     def _weigh_object(self, host_state, weight_properties):
         """Higher weights win.  We want spreading to be the default."""
         free_space = host_state.free_capacity_gb
@@ -53,6 +53,11 @@ class VolumeNumberWeigher(weights.BaseHostWeigher):
 
         We want spreading to be the default.
         """
+        # The HostManager keeps the volume count of the pools up to date,
+        # only query it for host states it doesn't manage.
+        if host_state.volume_count is not None:
+            return host_state.volume_count
+
         context = weight_properties['context']
         volume_number = db.volume_data_get_for_host(context=context,
                                                     host=host_state.host,
@@ -15,9 +15,11 @@
 #    under the License.
 
 import mock
+import webob
 
 from cinder.api.contrib import scheduler_stats
 from cinder import context
+from cinder import exception
 from cinder import test
 from cinder.tests.unit.api import fakes
 
@@ -108,3 +110,32 @@ class SchedulerStatsAPITest(test.TestCase):
         }
 
         self.assertDictMatch(expected, res)
+
+    @mock.patch('cinder.scheduler.rpcapi.SchedulerAPI.get_timings')
+    def test_get_timings(self, mock_get_timings):
+        histogram = {'count': 1, 'total': 0.5, 'max': 0.5, 'hosts': 2,
+                     'buckets': {'0.5': 1}}
+        mock_get_timings.return_value = {
+            'filters': {'CapacityFilter': histogram},
+            'weighers': {}}
+        req = fakes.HTTPRequest.blank('/v2/fake/scheduler_stats/get_timings')
+        req.environ['cinder.context'] = self.ctxt
+        res = self.controller.get_timings(req)
+
+        expected = {
+            'timings': {
+                'filters': {'CapacityFilter': histogram},
+                'weighers': {},
+            }
+        }
+        self.assertDictMatch(expected, res)
+        mock_get_timings.assert_called_once_with(self.ctxt)
+
+    @mock.patch('cinder.scheduler.rpcapi.SchedulerAPI.get_timings',
+                side_effect=exception.ServiceTooOld('too old'))
+    def test_get_timings_old_scheduler(self, mock_get_timings):
+        req = fakes.HTTPRequest.blank('/v2/fake/scheduler_stats/get_timings')
+        req.environ['cinder.context'] = self.ctxt
+
+        self.assertRaises(webob.exc.HTTPNotImplemented,
+                          self.controller.get_timings, req)
@@ -0,0 +1,124 @@
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+import mock
+from oslo_serialization import jsonutils
+import webob
+
+from cinder import context
+from cinder import exception
+from cinder import test
+from cinder.tests.unit.api import fakes
+from cinder.tests.unit import fake_volume
+
+
+def app():
+    # no auth, just let environ['cinder.context'] pass through
+    api = fakes.router.APIRouter()
+    mapper = fakes.urlmap.URLMap()
+    mapper['/v2'] = api
+    return mapper
+
+
+fake_vt = {'id': 'aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa',
+           'name': 'good_fakevt'}
+
+
+def vt_get_volume_type_by_name(context, name):
+    if name == fake_vt['name']:
+        return fake_vt
+    raise exception.VolumeTypeNotFoundByName(volume_type_name=name)
+
+
+def api_create_volumes(ctxt, count, *args, **kwargs):
+    """Replacement for cinder.volume.api.API.create_volumes."""
+    return [fake_volume.fake_volume_obj(
+        ctxt, id='ffffffff-0000-ffff-0000-%012d' % i, status='creating')
+        for i in range(count)]
+
+
+@mock.patch('cinder.volume.volume_types.get_volume_type_by_name',
+            vt_get_volume_type_by_name)
+class VolumeBulkCreateTest(test.TestCase):
+    """Test cases for cinder/api/contrib/volume_bulk_create.py"""
+
+    def _get_resp(self, body, is_admin=True):
+        """Helper to execute an os-volume-bulk-create API call."""
+        req = webob.Request.blank('/v2/fake/os-volume-bulk-create')
+        req.method = 'POST'
+        req.headers['Content-Type'] = 'application/json'
+        req.environ['cinder.context'] = context.RequestContext('admin',
+                                                               'fake',
+                                                               is_admin)
+        req.body = jsonutils.dump_as_bytes(body)
+        return req.get_response(app())
+
+    @mock.patch('cinder.volume.api.API.create_volumes',
+                side_effect=api_create_volumes)
+    def test_bulk_create(self, mock_create_volumes):
+        body = {'volume': {'count': 3,
+                           'size': 1,
+                           'name': 'onboarding',
+                           'volume_type': 'good_fakevt',
+                           'scheduler_hints': {'different_host': []}}}
+        res = self._get_resp(body)
+        self.assertEqual(202, res.status_int, res)
+
+        volumes = jsonutils.loads(res.body)['volumes']
+        self.assertEqual(3, len(volumes))
+        mock_create_volumes.assert_called_once_with(
+            mock.ANY, 3, 1, 'onboarding', None, volume_type=fake_vt,
+            metadata=None, availability_zone=None,
+            scheduler_hints={'different_host': []})
+
+    @mock.patch('cinder.volume.api.API.create_volumes')
+    def test_bulk_create_invalid_count(self, mock_create_volumes):
+        for count in (None, 0, 'many'):
+            body = {'volume': {'count': count, 'size': 1}}
+            res = self._get_resp(body)
+            self.assertEqual(400, res.status_int)
+        self.assertFalse(mock_create_volumes.called)
+
+    @mock.patch('cinder.volume.api.API.create_volumes',
+                side_effect=api_create_volumes)
+    def test_bulk_create_max_count(self, mock_create_volumes):
+        self.flags(osapi_max_bulk_create_count=4)
+        body = {'volume': {'count': 5, 'size': 1}}
+        res = self._get_resp(body)
+        self.assertEqual(400, res.status_int)
+        self.assertFalse(mock_create_volumes.called)
+
+        body = {'volume': {'count': 4, 'size': 1}}
+        res = self._get_resp(body)
+        self.assertEqual(202, res.status_int)
+
+    @mock.patch('cinder.volume.api.API.create_volumes')
+    def test_bulk_create_missing_size(self, mock_create_volumes):
+        body = {'volume': {'count': 2}}
+        res = self._get_resp(body)
+        self.assertEqual(400, res.status_int)
+        self.assertFalse(mock_create_volumes.called)
+
+    @mock.patch('cinder.volume.api.API.create_volumes')
+    def test_bulk_create_volume_type_not_found(self, mock_create_volumes):
+        body = {'volume': {'count': 2, 'size': 1,
+                           'volume_type': 'bad_fakevt'}}
+        res = self._get_resp(body)
+        self.assertEqual(404, res.status_int)
+        self.assertFalse(mock_create_volumes.called)
+
+    @mock.patch('cinder.volume.api.API.create_volumes')
+    def test_bulk_create_not_admin(self, mock_create_volumes):
+        body = {'volume': {'count': 2, 'size': 1}}
+        res = self._get_resp(body, is_admin=False)
+        self.assertEqual(403, res.status_int)
+        self.assertFalse(mock_create_volumes.called)
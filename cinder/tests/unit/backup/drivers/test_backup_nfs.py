@@ -24,6 +24,7 @@ import shutil
 import tempfile
 import zlib
 
+import eventlet
 import mock
 from os_brick.remotefs import remotefs as remotefs_brick
 from oslo_config import cfg
@@ -554,6 +555,53 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
             self.assertTrue(filecmp.cmp(self.volume_file.name,
                             restored_file.name))
 
+    def test_restore_concurrent_object_writers(self):
+        volume_id = '7d5f8ec0-3e59-4a8b-9d2c-0000004e2a3c'
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_compression_algorithm='zlib')
+        self.flags(backup_object_writers=4)
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        # Objects are listed in volume order whatever order they were
+        # written in.
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        metadata = service._read_metadata(backup)
+        offsets = [list(obj.values())[0]['offset']
+                   for obj in metadata['objects']]
+        self.assertEqual(list(range(0, 32 * 1024, 3 * 1024)), offsets)
+        self.assertEqual(len(offsets) + 1, backup.object_count)
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            service.restore(backup, volume_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
+    def test_backup_concurrent_object_writer_fail(self):
+        volume_id = 'b1e8a3f1-8b94-4c3b-a4a5-000000c0ffee'
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_object_writers=4)
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        self.mock_object(service, 'get_object_writer',
+                         mock.Mock(side_effect=exception.BackupDriverException(
+                             message=_('fake'))))
+        mock_finalize = self.mock_object(service, '_finalize_backup')
+
+        self.assertRaises(exception.BackupDriverException,
+                          service.backup,
+                          backup, self.volume_file)
+        self.assertFalse(mock_finalize.called)
+
     def test_restore_delta(self):
         volume_id = '486249dc-83c6-4a02-8d65-000000d819e7'
 
@@ -604,6 +652,208 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
             self.assertTrue(filecmp.cmp(self.volume_file.name,
                             restored_file.name))
 
+    def test_restore_delta_skips_overwritten_objects(self):
+        volume_id = '5e2c0b7a-1d44-4f7e-8a51-000000a3b9d1'
+
+        self.flags(backup_file_size=(1024 * 8))
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.flags(backup_restore_prefetch_objects=2)
+        self.flags(backup_restore_fsync_interval=2)
+
+        self._create_backup_db_entry(volume_id=volume_id, backup_id=123)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        # Overwrite the whole second object and part of the third one.
+        self.volume_file.seek(8 * 1024)
+        self.volume_file.write(os.urandom(9 * 1024))
+
+        self._create_backup_db_entry(volume_id=volume_id,
+                                     backup_id=124,
+                                     parent_id=123)
+        self.volume_file.seek(0)
+        deltabackup = objects.Backup.get_by_id(self.ctxt, 124)
+        service.backup(deltabackup, self.volume_file, True)
+
+        mock_read = self.mock_object(
+            service, '_read_restore_object',
+            mock.Mock(side_effect=service._read_restore_object))
+        with tempfile.NamedTemporaryFile() as restored_file:
+            backup = objects.Backup.get_by_id(self.ctxt, 124)
+            service.restore(backup, volume_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
+        # The second object of the full backup is never read, the first,
+        # third and fourth ones are, as are both incremental objects.
+        self.assertEqual(5, mock_read.call_count)
+
+    def test_restore_objects_kills_readers(self):
+        self.flags(backup_restore_prefetch_objects=2)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        restore_items = [('container', 'object%d' % i,
+                          {'offset': i * 4, 'length': 4,
+                           'compression': None},
+                          None, [(i * 4, i * 4 + 4)])
+                         for i in range(5)]
+        volume_file = mock.Mock()
+        volume_file.write.side_effect = IOError
+
+        spawn = mock.patch('cinder.backup.chunkeddriver.eventlet.spawn')
+        with spawn as mock_spawn:
+            mock_spawn.return_value.wait.return_value = b'data'
+            self.assertRaises(IOError, service._restore_objects,
+                              restore_items, 'fake_volume_id', volume_file)
+
+        # The object being written and the two prefetched ones are read,
+        # and their readers killed when the write fails.
+        self.assertEqual(3, mock_spawn.call_count)
+        self.assertEqual(3, mock_spawn.return_value.kill.call_count)
+
+    def test_backup_restore_delete_dedup(self):
+        volume_id = '1d7c2a54-6f0e-4b43-9a38-000000d3d0b5'
+        clone_id = '9e6f1c3b-2a47-4d6e-8f15-000000e4c2a7'
+        self.flags(backup_dedup=True)
+        self.flags(backup_compression_algorithm='zlib')
+        self.flags(backup_file_size=(1024 * 8))
+        self.flags(backup_sha_block_size_bytes=1024)
+        dedup_path = os.path.join(self.temp_dir, 'backup_dedup')
+
+        self._create_backup_db_entry(volume_id=volume_id,
+                                     container='backup-123',
+                                     backup_id=123)
+        self._create_backup_db_entry(volume_id=clone_id,
+                                     container='backup-124',
+                                     backup_id=124)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        # One dedup block per chunk, chunks are smaller than dedup blocks.
+        self.assertEqual(4, len(os.listdir(dedup_path)))
+
+        # A clone of the volume only references the stored blocks.
+        mock_writer = self.mock_object(
+            service, 'get_object_writer',
+            mock.Mock(side_effect=service.get_object_writer))
+        self.volume_file.seek(0)
+        clone_backup = objects.Backup.get_by_id(self.ctxt, 124)
+        service.backup(clone_backup, self.volume_file)
+        self.assertEqual(4, len(os.listdir(dedup_path)))
+        # Only the sha256 file and the metadata are written.
+        self.assertEqual(2, mock_writer.call_count)
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            clone_backup = objects.Backup.get_by_id(self.ctxt, 124)
+            service.restore(clone_backup, clone_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.delete(backup)
+        self.assertEqual(4, len(os.listdir(dedup_path)))
+        service.delete(clone_backup)
+        self.assertEqual([], os.listdir(dedup_path))
+
+    def test_backup_dedup_abort_mid_write(self):
+        volume_id = '5b0e7c2d-3f1a-4e89-b6d4-000000a9f3c1'
+        self.flags(backup_dedup=True)
+        self.flags(backup_object_writers=4)
+        self.flags(backup_file_size=(1024 * 8))
+        self.flags(backup_sha_block_size_bytes=1024)
+        dedup_path = os.path.join(self.temp_dir, 'backup_dedup')
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        get_object_writer = service.get_object_writer
+        calls = []
+
+        class SlowWriter(object):
+            def __init__(self, writer):
+                self.writer = writer
+
+            def __enter__(self):
+                self.writer.__enter__()
+                return self
+
+            def __exit__(self, *args):
+                return self.writer.__exit__(*args)
+
+            def write(self, data):
+                # The other writers are still writing when the backup is
+                # aborted.
+                eventlet.sleep(0.1)
+                self.writer.write(data)
+
+        def fake_get_object_writer(container, object_name,
+                                   extra_metadata=None):
+            calls.append(object_name)
+            if len(calls) == 2:
+                raise exception.BackupDriverException(message=_('fake'))
+            return SlowWriter(get_object_writer(container, object_name,
+                                                extra_metadata))
+
+        self.mock_object(service, 'get_object_writer',
+                         mock.Mock(side_effect=fake_get_object_writer))
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+
+        self.assertRaises(exception.BackupDriverException,
+                          service.backup,
+                          backup, self.volume_file)
+        # The blocks written by the other writers were referenced, then
+        # released with the backup.
+        self.assertEqual([], os.listdir(dedup_path))
+
+    def test_backup_restore_sparse(self):
+        volume_id = '3a9d5e21-7c0b-4f18-9e63-000000f1a2b4'
+        self.flags(backup_sparse=True)
+        self.flags(backup_file_size=(1024 * 8))
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.volume_file.seek(2 * 1024)
+        self.volume_file.write(b'\0' * 10 * 1024)
+        self.volume_file.seek(30 * 1024)
+        self.volume_file.write(b'\0' * 2 * 1024)
+
+        self._create_backup_db_entry(volume_id=volume_id, backup_id=123)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+
+        metadata = service._read_metadata(backup)
+        self.assertEqual('1.1.0', metadata['version'])
+        self.assertEqual([[2 * 1024, 10 * 1024], [30 * 1024, 2 * 1024]],
+                         metadata['holes'])
+        self.assertEqual([0, 12 * 1024, 16 * 1024, 24 * 1024],
+                         [list(obj.values())[0]['offset']
+                          for obj in metadata['objects']])
+
+        # Zero a whole object and fill part of a hole.
+        self.volume_file.seek(4 * 1024)
+        self.volume_file.write(os.urandom(2 * 1024))
+        self.volume_file.seek(16 * 1024)
+        self.volume_file.write(b'\0' * 4 * 1024)
+
+        self._create_backup_db_entry(volume_id=volume_id,
+                                     backup_id=124,
+                                     parent_id=123)
+        self.volume_file.seek(0)
+        deltabackup = objects.Backup.get_by_id(self.ctxt, 124)
+        service.backup(deltabackup, self.volume_file)
+        metadata = service._read_metadata(deltabackup)
+        self.assertEqual([[16 * 1024, 4 * 1024]], metadata['holes'])
+
+        # The holes of both backups are zeroed over existing data.
+        with tempfile.NamedTemporaryFile() as restored_file:
+            restored_file.write(os.urandom(32 * 1024))
+            restored_file.seek(0)
+            service.restore(deltabackup, volume_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name, shallow=False))
+
     def test_delete(self):
         volume_id = '4b5c39f2-4428-473c-b85a-000000477eca'
         self._create_backup_db_entry(volume_id=volume_id)
@@ -621,6 +871,68 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
         self.assertEqual(compressor, bz2)
         self.assertRaises(ValueError, service._get_compressor, 'fake')
 
+    def test_get_compressor_level(self):
+        self.flags(backup_compression_level=1)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        data = b'compressible' * 1024
+        compressor = service._get_compressor('zlib')
+        self.assertEqual(zlib.compress(data, 1), compressor.compress(data))
+        self.assertEqual(data, compressor.decompress(zlib.compress(data)))
+        compressor = service._get_compressor('bz2')
+        self.assertEqual(bz2.compress(data, 1), compressor.compress(data))
+
+    def test_get_compressor_zstd(self):
+        self.flags(backup_compression_level=9)
+        fake_zstd = mock.Mock()
+        with mock.patch.dict('sys.modules', {'zstandard': fake_zstd}):
+            service = nfs.NFSBackupDriver(self.ctxt)
+            compressor = service._get_compressor('zstd')
+        self.assertEqual(fake_zstd.ZstdCompressor.return_value.compress(),
+                         compressor.compress(b'data'))
+        fake_zstd.ZstdCompressor.assert_called_with(level=9)
+        self.assertEqual(
+            fake_zstd.ZstdDecompressor.return_value.decompress(),
+            compressor.decompress(b'data'))
+
+    def test_get_compressor_lz4(self):
+        fake_lz4 = mock.Mock()
+        with mock.patch.dict('sys.modules', {'lz4': fake_lz4,
+                                             'lz4.frame': fake_lz4.frame}):
+            service = nfs.NFSBackupDriver(self.ctxt)
+            compressor = service._get_compressor('lz4')
+        compressor.compress(b'data')
+        fake_lz4.frame.compress.assert_called_once_with(
+            b'data', compression_level=0)
+        self.assertEqual(fake_lz4.frame.decompress, compressor.decompress)
+
+    def test_get_compressor_not_installed(self):
+        service = nfs.NFSBackupDriver(self.ctxt)
+        with mock.patch.dict('sys.modules', {'zstandard': None}):
+            self.assertRaises(ValueError, service._get_compressor, 'zstd')
+
+    def test_restore_other_compression_algorithm(self):
+        volume_id = '7b0e4d2c-93a1-4c5f-b6d8-000000c5e1f3'
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_compression_algorithm='bz2')
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        self.volume_file.write(b'cinder' * 1024)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, 123)
+        service.backup(backup, self.volume_file)
+        metadata = service._read_metadata(backup)
+        self.assertEqual('bz2', list(metadata['objects'][0].values())[0]
+                         ['compression'])
+
+        # Objects are decompressed with the algorithm they were stored with.
+        self.flags(backup_compression_algorithm='none')
+        service = nfs.NFSBackupDriver(self.ctxt)
+        with tempfile.NamedTemporaryFile() as restored_file:
+            backup = objects.Backup.get_by_id(self.ctxt, 123)
+            service.restore(backup, volume_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
     def create_buffer(self, size):
         # Set up buffer of zeroed bytes
         fake_data = bytearray(size)
@@ -370,3 +370,165 @@ class BrickLvmTestCase(test.TestCase):
         self.vg.vg_name = "test-volumes"
         self.vg.extend_volume("test", "2G")
         self.assertFalse(self.vg.deactivate_lv.called)
+
+
+class BrickLvmCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(BrickLvmCacheTestCase, self).setUp()
+        self.lvs = ("  fake-vg-pool:9.50:twi-a-tz--:20.00\n"
+                    "  volume-1:1.00:-wi-a-----:\n"
+                    "  volume-2:2.00:owi-a-----:\n"
+                    "  snapshot-1:2.00:swi-a-s---:0.10\n")
+        self.lv_info = ""
+        self.listing_hook = None
+        self.commands = []
+        self.stubs.Set(processutils, 'execute', self.fake_execute)
+        self.vg = brick.LVM('fake-vg', 'sudo', executor=self.fake_execute,
+                            cache_ttl=60)
+
+    def fake_execute(self, *cmd, **kwargs):
+        self.commands.append(cmd)
+        cmd_string = ', '.join(cmd)
+        if 'vgs, --noheadings, -o, name, fake-vg' in cmd_string:
+            return ("  fake-vg\n", "")
+        elif 'vgs, --noheadings, --unit=g' in cmd_string:
+            return ("  fake-vg:10.00:0.50:4:"
+                    "kVxztV-dKpG-Rz7E-xtKY-jeju-QsYU-SLG6Z1\n", "")
+        elif 'pvs, --noheadings' in cmd_string:
+            return ("  fake-vg|/dev/sda|10.00|0.50\n", "")
+        elif ('lvs, --noheadings, --unit=g, -o, '
+              'name,size,attr,data_percent' in cmd_string):
+            if self.listing_hook:
+                self.listing_hook()
+            return (self.lvs, "")
+        elif ('lvs, --noheadings, --unit=g, -o, vg_name,name,size'
+              in cmd_string):
+            return (self.lv_info, "")
+        elif 'lvcreate, -n, volume-fail' in cmd_string:
+            raise processutils.ProcessExecutionError(stderr="No space")
+        return ("", "")
+
+    def _lvs_count(self):
+        return len([cmd for cmd in self.commands if 'lvs' in cmd])
+
+    def test_queries(self):
+        self.assertEqual(4, len(self.vg.get_volumes()))
+        self.assertEqual({'vg': 'fake-vg', 'name': 'volume-1',
+                          'size': '1.00'},
+                         self.vg.get_volume('volume-1'))
+        self.assertIsNone(self.vg.get_volume('volume-3'))
+        self.assertEqual([], self.vg.get_volumes('volume-3'))
+        self.assertTrue(self.vg.lv_has_snapshot('volume-2'))
+        self.assertFalse(self.vg.lv_has_snapshot('volume-1'))
+
+        # The LVs missing from the cache are looked up.
+        self.assertEqual(3, self._lvs_count())
+
+    def test_miss_created_outside(self):
+        self.vg.get_volumes()
+
+        self.lv_info = "  fake-vg volume-3 3.00\n"
+        self.assertEqual({'vg': 'fake-vg', 'name': 'volume-3',
+                          'size': '3.00'},
+                         self.vg.get_volume('volume-3'))
+        self.assertEqual(2, self._lvs_count())
+
+        # The stale listing was dropped.
+        self.vg.get_volumes()
+        self.assertEqual(3, self._lvs_count())
+
+    def test_listing_races_change(self):
+        def create_volume():
+            self.listing_hook = None
+            self.vg.create_volume('volume-3', '3g')
+
+        self.listing_hook = create_volume
+        self.vg.get_volumes()
+
+        # The listing missing volume-3 wasn't cached.
+        self.lvs += "  volume-3:3.00:-wi-a-----:\n"
+        self.assertEqual('3.00', self.vg.get_volume('volume-3')['size'])
+        self.assertEqual(3, self._lvs_count())
+
+    def test_snapshot_races_listing(self):
+        def execute(*cmd, **kwargs):
+            result = self.fake_execute(*cmd, **kwargs)
+            if 'lvcreate' in cmd:
+                # The LVs are listed while the snapshot is created.
+                self.vg.get_volumes()
+                self.lvs += "  snapshot-2:1.00:swi-a-s---:0.00\n"
+            return result
+
+        self.vg._execute = execute
+        self.vg.create_lv_snapshot('snapshot-2', 'volume-1')
+
+        # The listing missing snapshot-2 was dropped.
+        self.assertEqual('1.00', self.vg.get_volume('snapshot-2')['size'])
+
+    def test_revert_races_listing(self):
+        def execute(*cmd, **kwargs):
+            result = self.fake_execute(*cmd, **kwargs)
+            if 'lvconvert' in cmd:
+                # The LVs are listed while the snapshot is merged.
+                self.vg.get_volumes()
+                self.lvs = self.lvs.replace(
+                    "  snapshot-1:2.00:swi-a-s---:0.10\n", "")
+            return result
+
+        self.vg._execute = execute
+        self.vg.revert('snapshot-1')
+
+        # The listing holding the merged snapshot-1 was dropped.
+        self.assertIsNone(self.vg.get_volume('snapshot-1'))
+
+    @mock.patch.object(brick, 'time')
+    def test_cache_expires(self, mock_time):
+        mock_time.time.return_value = 1000
+        self.vg.get_volumes()
+        mock_time.time.return_value = 1060
+        self.vg.get_volumes()
+        self.assertEqual(1, self._lvs_count())
+
+        mock_time.time.return_value = 1061
+        self.vg.get_volumes()
+        self.assertEqual(2, self._lvs_count())
+
+    def test_updates(self):
+        self.vg.get_volumes()
+
+        self.vg.create_volume('volume-3', '3g')
+        self.assertEqual('3.00', self.vg.get_volume('volume-3')['size'])
+        self.vg.extend_volume('volume-3', '4096m')
+        self.assertEqual('4.00', self.vg.get_volume('volume-3')['size'])
+        self.vg.rename_volume('volume-3', 'volume-4')
+        self.assertIsNone(self.vg.get_volume('volume-3'))
+        self.assertEqual('volume-4', self.vg.get_volume('volume-4')['name'])
+        self.vg.delete('volume-4')
+        self.assertIsNone(self.vg.get_volume('volume-4'))
+
+        # Only the LVs missing from the cache are looked up.
+        self.assertEqual(3, self._lvs_count())
+
+    def test_invalidated(self):
+        self.vg.get_volumes()
+
+        # Removing a snapshot changes its origin.
+        self.vg.delete('snapshot-1')
+        self.lvs = "  volume-1:1.00:-wi-a-----:\n"
+        self.assertFalse(self.vg.lv_has_snapshot('volume-1'))
+        self.assertEqual(2, self._lvs_count())
+
+        self.assertRaises(processutils.ProcessExecutionError,
+                          self.vg.create_volume, 'volume-fail', '1g')
+        self.vg.get_volumes()
+        self.assertEqual(3, self._lvs_count())
+
+    def test_update_volume_group_info(self):
+        self.vg.vg_thin_pool = 'fake-vg-pool'
+
+        self.vg.update_volume_group_info()
+
+        self.assertEqual('9.50', self.vg.vg_thin_pool_size)
+        self.assertEqual(7.6, self.vg.vg_thin_pool_free_space)
+        self.assertEqual(5.0, self.vg.vg_provisioned_capacity)
+        self.assertEqual(1, self._lvs_count())
@@ -37,6 +37,10 @@ class NovaClientTestCase(test.TestCase):
                              'http://novaadmhost:4778/v2/%(project_id)s')
         self.override_config('os_privileged_user_name', 'adminuser')
         self.override_config('os_privileged_user_password', 'strongpassword')
+        privileged_clients = mock.patch.dict(nova._privileged_clients,
+                                             clear=True)
+        privileged_clients.start()
+        self.addCleanup(privileged_clients.stop)
 
     @mock.patch('novaclient.client.Client')
     def test_nova_client_regular(self, p_client):
@@ -68,6 +72,20 @@ class NovaClientTestCase(test.TestCase):
             insecure=False, endpoint_type='publicURL', cacert=None,
             timeout=None, extensions=nova.nova_extensions)
 
+    @mock.patch('novaclient.client.Client')
+    def test_nova_client_privileged_user_reused(self, p_client):
+        client = nova.novaclient(self.ctx, privileged_user=True)
+        self.assertIs(client, nova.novaclient(self.ctx, privileged_user=True))
+        self.assertEqual(1, p_client.call_count)
+
+        nova.novaclient(self.ctx, privileged_user=True, timeout=5)
+        self.assertEqual(2, p_client.call_count)
+
+        # Clients of the request's user are not reused.
+        nova.novaclient(self.ctx)
+        nova.novaclient(self.ctx)
+        self.assertEqual(4, p_client.call_count)
+
     @mock.patch('novaclient.client.Client')
     def test_nova_client_privileged_user_custom_auth_url(self, p_client):
         self.override_config('os_privileged_user_auth_url',
@@ -166,3 +166,15 @@ class TestBaseFilterHandler(test.TestCase):
             result = self._get_filtered_objects(filter_classes, index=2)
             self.assertEqual(filter_objs_expected, result)
             self.assertEqual(1, fake5_filter_all.call_count)
+
+    @mock.patch.object(base_filter.timings, 'TIMINGS')
+    @mock.patch.object(FakeFilter3, 'filter_all', return_value=iter([2, 3]))
+    def test_get_filtered_objects_records_timings(self, fake3_filter_all,
+                                                  mock_timings):
+        filter_classes = [FakeFilter1, FakeFilter3]
+        result = self._get_filtered_objects(filter_classes)
+
+        self.assertEqual([2, 3], result)
+        mock_timings.record.assert_has_calls(
+            [mock.call('filters', 'FakeFilter1', mock.ANY, 4),
+             mock.call('filters', 'FakeFilter3', mock.ANY, 4)])
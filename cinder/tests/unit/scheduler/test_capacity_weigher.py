@@ -23,6 +23,7 @@ from cinder import context
 from cinder.scheduler import weights
 from cinder import test
 from cinder.tests.unit.scheduler import fakes
+from cinder.tests.unit.scheduler import test_pool_capacity
 from cinder.volume import utils
 
 CONF = cfg.CONF
@@ -337,3 +338,17 @@ class CapacityWeigherTestCase(test.TestCase):
         worst_host = weighed_hosts[-1]
         self.assertEqual(-1.0, worst_host.weight)
         self.assertEqual('host5', utils.extract_host(worst_host.obj.host))
+
+    def test_capacity_weight_matches_weigh_object(self):
+        hosts = [host for host in test_pool_capacity.make_host_states()
+                 if host.free_capacity_gb is not None]
+        weighed_hosts = [weights.WeighedHost(host, 0.0) for host in hosts]
+
+        for multiplier in (1.0, -1.0):
+            self.flags(capacity_weight_multiplier=multiplier)
+            weigher = weights.capacity.CapacityWeigher()
+            expected = [weigher._weigh_object(host, {}) for host in hosts]
+
+            self.assertEqual(expected, weigher._weigh_all(weighed_hosts, {}))
+            self.assertEqual(min(expected), weigher.minval)
+            self.assertEqual(max(expected), weigher.maxval)
@@ -223,6 +223,42 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         weighed_host = sched._schedule(fake_context, request_spec, {})
         self.assertEqual('host1#lvm1', weighed_host.obj.host)
 
+    @mock.patch('cinder.scheduler.driver.volume_update_db')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes(self, _mock_service_get_all,
+                                     _mock_volume_update_db):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        sched.volume_rpcapi = mock.Mock()
+        fakes.mock_host_manager_db_calls(_mock_service_get_all)
+        fake_context = context.RequestContext('user', 'project')
+
+        request_specs = [{'volume_id': 'fake_id%s' % i,
+                          'volume_properties': {'project_id': 1,
+                                                'size': 1},
+                          'volume_type': {'name': 'LVM_iSCSI'}}
+                         for i in range(4)]
+        # Doesn't fit anywhere, but doesn't prevent the others from being
+        # scheduled.
+        request_specs[1]['CG_backend'] = 'host@lvmdriver'
+
+        with mock.patch.object(
+                sched.host_manager, 'get_all_host_states',
+                wraps=sched.host_manager.get_all_host_states) as get_hosts:
+            errors = sched.schedule_create_volumes(fake_context,
+                                                   request_specs,
+                                                   [{}, {}, {}, {}])
+            # Once per group of identical requests.
+            self.assertEqual(2, get_hosts.call_count)
+
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], exception.NoValidHost)
+        self.assertEqual([None, None], errors[2:])
+        self.assertEqual(['fake_id0', 'fake_id2', 'fake_id3'],
+                         [args[1] for args, _kwargs in
+                          _mock_volume_update_db.call_args_list])
+        self.assertEqual(3, sched.volume_rpcapi.create_volume.call_count)
+
     def test_max_attempts(self):
         self.flags(scheduler_max_attempts=4)
 
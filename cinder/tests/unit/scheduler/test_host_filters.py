@@ -24,8 +24,10 @@ from cinder import context
 from cinder import db
 from cinder import exception
 from cinder.scheduler import filters
+from cinder.scheduler.filters import instance_locality_filter
 from cinder import test
 from cinder.tests.unit.scheduler import fakes
+from cinder.tests.unit.scheduler import test_pool_capacity
 from cinder.tests.unit import utils
 
 
@@ -485,6 +487,30 @@ class CapacityFilterTestCase(HostFiltersTestCase):
                                     'service': service})
         self.assertTrue(filt_cls.host_passes(host, filter_properties))
 
+    def test_filter_all_matches_host_passes(self):
+        filt_cls = self.class_map['CapacityFilter']()
+        hosts = test_pool_capacity.make_host_states()
+
+        for filter_properties in ({'size': 1},
+                                  {'size': 100},
+                                  {'size': 100, 'vol_exists_on': 'host3'}):
+            expected = [host for host in hosts
+                        if filt_cls.host_passes(host, filter_properties)]
+            self.assertEqual(expected,
+                             list(filt_cls.filter_all(hosts,
+                                                      filter_properties)))
+
+    @mock.patch('cinder.scheduler.pool_capacity.PoolCapacityTable')
+    def test_filter_all_without_size(self, mock_table):
+        filt_cls = self.class_map['CapacityFilter']()
+        host = fakes.FakeHostState('host1',
+                                   {'total_capacity_gb': 500,
+                                    'free_capacity_gb': 'infinite',
+                                    'updated_at': None})
+
+        self.assertEqual([host], list(filt_cls.filter_all([host], {})))
+        self.assertFalse(mock_table.called)
+
 
 class AffinityFilterTestCase(HostFiltersTestCase):
     @mock.patch('cinder.utils.service_is_up')
@@ -700,6 +726,24 @@ class AffinityFilterTestCase(HostFiltersTestCase):
 
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    def test_affinity_filters_filter_all(self):
+        hosts = [fakes.FakeHostState('host%s#pool' % i, {})
+                 for i in range(4)]
+        vol_ids = [utils.create_volume(self.context, host=host).id
+                   for host in ('host1#pool', 'host3#pool', 'host3')]
+
+        for filt_name, hint, expected in (
+                ('SameBackendFilter', 'same_host', [1, 3]),
+                ('DifferentBackendFilter', 'different_host', [0, 2])):
+            filt_cls = self.class_map[filt_name]()
+            filter_properties = {'context': self.context.elevated(),
+                                 'scheduler_hints': {hint: vol_ids}}
+            with mock.patch.object(filt_cls.volume_api, 'get_all',
+                                   wraps=filt_cls.volume_api.get_all) as get:
+                result = filt_cls.filter_all(hosts, filter_properties)
+                self.assertEqual([hosts[i] for i in expected], list(result))
+                self.assertEqual(1, get.call_count)
+
 
 class DriverFilterTestCase(HostFiltersTestCase):
     def test_passing_function(self):
@@ -894,6 +938,12 @@ class DriverFilterTestCase(HostFiltersTestCase):
 class InstanceLocalityFilterTestCase(HostFiltersTestCase):
     def setUp(self):
         super(InstanceLocalityFilterTestCase, self).setUp()
+        for cache in (instance_locality_filter._INSTANCE_HOSTS,
+                      instance_locality_filter._NOVA_EXTENSIONS,
+                      nova._privileged_clients):
+            patcher = mock.patch.dict(cache, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
         self.override_config('nova_endpoint_template',
                              'http://novahost:8774/v2/%(project_id)s')
         self.context.service_catalog = \
@@ -989,6 +1039,51 @@ class InstanceLocalityFilterTestCase(HostFiltersTestCase):
         self.assertRaises(exception.APITimeout,
                           filt_cls.host_passes, host, filter_properties)
 
+    @mock.patch('time.time', return_value=1000)
+    @mock.patch('cinder.compute.nova.novaclient')
+    def test_nova_answers_shared_by_requests(self, _mock_novaclient,
+                                             _mock_time):
+        self.flags(instance_locality_cache_ttl=60)
+        nova_client = fakes.FakeNovaClient()
+        _mock_novaclient.return_value = nova_client
+        uuid = nova_client.servers.create('host1')
+        filter_properties = {'context': self.context,
+                             'scheduler_hints': {'local_to_instance': uuid}}
+        host = fakes.FakeHostState('host1', {})
+
+        filt_cls = self.class_map['InstanceLocalityFilter']()
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+        self.assertEqual(2, _mock_novaclient.call_count)
+
+        # Another request finds the answers in the shared cache.
+        filt_cls = self.class_map['InstanceLocalityFilter']()
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+        self.assertEqual(2, _mock_novaclient.call_count)
+
+        # Until they expire.
+        _mock_time.return_value = 1060
+        filt_cls = self.class_map['InstanceLocalityFilter']()
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+        self.assertEqual(4, _mock_novaclient.call_count)
+
+    @mock.patch('cinder.compute.nova.novaclient')
+    def test_nova_answers_not_shared(self, _mock_novaclient):
+        self.flags(instance_locality_cache_ttl=0)
+        nova_client = fakes.FakeNovaClient()
+        _mock_novaclient.return_value = nova_client
+        uuid = nova_client.servers.create('host1')
+        filter_properties = {'context': self.context,
+                             'scheduler_hints': {'local_to_instance': uuid}}
+
+        for i in range(2):
+            filt_cls = self.class_map['InstanceLocalityFilter']()
+            self.assertTrue(filt_cls.host_passes(
+                fakes.FakeHostState('host1', {}), filter_properties))
+            # The answers are still kept for the request.
+            self.assertFalse(filt_cls.host_passes(
+                fakes.FakeHostState('host2', {}), filter_properties))
+        self.assertEqual(4, _mock_novaclient.call_count)
+
 
 class TestFilter(filters.BaseHostFilter):
     pass
@@ -1214,6 +1309,13 @@ class ExtraSpecsOpsTestCase(test.TestCase):
             req='>= 3',
             matches=False)
 
+    def test_get_matcher(self):
+        matcher = filters.extra_specs_ops.get_matcher('<or> 11 <or> 12')
+        self.assertTrue(matcher('11'))
+        self.assertTrue(matcher('12'))
+        self.assertFalse(matcher('13'))
+        self.assertFalse(matcher(None))
+
 
 class BasicFiltersTestCase(HostFiltersTestCase):
     """Test case for host filters."""
@@ -1300,6 +1402,33 @@ class BasicFiltersTestCase(HostFiltersTestCase):
             especs={'capabilities:scope_lv1:opt1': '>= 2'},
             passes=False)
 
+    @mock.patch.dict('cinder.scheduler.filters.capabilities_filter._MATCHERS',
+                     clear=True)
+    @mock.patch('cinder.scheduler.filters.extra_specs_ops.get_matcher',
+                wraps=filters.extra_specs_ops.get_matcher)
+    def test_capability_filter_all_parses_extra_specs_once(self,
+                                                           mock_matcher):
+        filt_cls = self.class_map['CapabilitiesFilter']()
+        especs = {'capabilities:opt1': '>= 2', 'opt2': '<in> xyz',
+                  'fake_scope:opt3': 'ignored'}
+        filter_properties = {'resource_type': {'name': 'fake_type',
+                                               'extra_specs': especs}}
+        hosts = [fakes.FakeHostState('host%s' % i,
+                                     {'capabilities': {'opt1': i,
+                                                       'opt2': 'axyzb'}})
+                 for i in range(5)]
+
+        for _i in range(3):
+            result = filt_cls.filter_all(hosts, filter_properties)
+            self.assertEqual(hosts[2:], list(result))
+        self.assertEqual(2, mock_matcher.call_count)
+
+        # Changed extra specs are parsed again.
+        especs['opt2'] = '<in> abc'
+        result = filt_cls.filter_all(hosts, filter_properties)
+        self.assertEqual([], list(result))
+        self.assertEqual(4, mock_matcher.call_count)
+
     def test_json_filter_passes(self):
         filt_cls = self.class_map['JsonFilter']()
         filter_properties = {'resource_type': {'memory_mb': 1024,
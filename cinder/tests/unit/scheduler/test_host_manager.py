@@ -306,6 +306,60 @@ class HostManagerTestCase(test.TestCase):
             test_service.TestService._compare(self, volume_node,
                                               host_state_map[host].service)
 
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    @mock.patch('time.time')
+    def test_get_all_host_states_cached_services(
+            self, _mock_time, _mock_service_is_up,
+            _mock_service_get_all_by_topic):
+        self.flags(scheduler_service_refresh_interval=10)
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+            dict(id=2, host='host2', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+        _mock_time.return_value = 100
+        self.host_manager.service_states = {
+            'host1': dict(volume_backend_name='AAA', total_capacity_gb=512,
+                          free_capacity_gb=200, timestamp=None,
+                          reserved_percentage=0),
+        }
+
+        res = self.host_manager.get_all_host_states(context)
+        self.assertEqual(['host1#AAA'], [pool.host for pool in res])
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # Reports are applied without looking the services up again.
+        _mock_time.return_value = 105
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(volume_backend_name='AAA',
+                                    total_capacity_gb=512,
+                                    free_capacity_gb=100,
+                                    reserved_percentage=0))
+        self.host_manager.update_service_capabilities(
+            'volume', 'host2', dict(volume_backend_name='BBB',
+                                    total_capacity_gb=256,
+                                    free_capacity_gb=50,
+                                    reserved_percentage=0))
+        res = self.host_manager.get_all_host_states(context)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+        self.assertEqual(['host1#AAA', 'host2#BBB'],
+                         sorted(pool.host for pool in res))
+        self.assertEqual({100, 50},
+                         set(pool.free_capacity_gb for pool in res))
+
+        # The services are looked up again once the interval expired.
+        _mock_time.return_value = 110
+        _mock_service_is_up.side_effect = [True, False]
+        res = self.host_manager.get_all_host_states(context)
+        self.assertEqual(2, _mock_service_get_all_by_topic.call_count)
+        self.assertEqual(['host1#AAA'], [pool.host for pool in res])
+        self.assertNotIn('host2', self.host_manager.host_state_map)
+
     @mock.patch('cinder.db.service_get_all_by_topic')
     @mock.patch('cinder.utils.service_is_up')
     def test_get_pools(self, _mock_service_is_up,
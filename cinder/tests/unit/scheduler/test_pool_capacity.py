@@ -0,0 +1,94 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the columnar pool capacity table.
+"""
+
+import itertools
+
+from cinder.scheduler.filters import capacity_filter
+from cinder.scheduler import pool_capacity
+from cinder import test
+from cinder.tests.unit.scheduler import fakes
+from cinder import utils
+
+
+def make_host_states():
+    """Return pools covering the cases the capacity filter handles."""
+    host_states = []
+    values = itertools.product(
+        [0, 10, 100, 500, 'unknown', 'infinite', None],   # free
+        [0, 100, 500, 1024, 'unknown', 'infinite'],       # total
+        [0, 10, 50],                                      # reserved
+        [0, 90, 400, 2047],                               # provisioned
+        [0.8, 1.0, 1.5, 20.0],                            # ratio
+        [True, False])                                    # thin
+    for i, (free, total, reserved, provisioned, ratio, thin) in enumerate(
+            values):
+        host_states.append(fakes.FakeHostState(
+            'host%d' % i,
+            {'free_capacity_gb': free,
+             'total_capacity_gb': total,
+             'reserved_percentage': reserved,
+             'provisioned_capacity_gb': provisioned,
+             'max_over_subscription_ratio': ratio,
+             'thin_provisioning_support': thin,
+             'updated_at': None}))
+    return host_states
+
+
+class PoolCapacityTableTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PoolCapacityTableTestCase, self).setUp()
+        self.host_states = make_host_states()
+
+    def test_rows(self):
+        table = pool_capacity.PoolCapacityTable(self.host_states)
+
+        self.assertEqual(len(self.host_states),
+                         len(table.rows) + len(table.others))
+        for i in table.others:
+            state = self.host_states[i]
+            self.assertFalse(
+                pool_capacity.is_number(state.free_capacity_gb) and
+                pool_capacity.is_number(state.total_capacity_gb))
+        self.assertEqual(4 * 4 * 3 * 4 * 4 * 2, len(table))
+
+    def test_virtual_free(self):
+        table = pool_capacity.PoolCapacityTable(self.host_states)
+
+        expected = []
+        for i in table.rows:
+            state = self.host_states[i]
+            expected.append(utils.calculate_virtual_free_capacity(
+                state.total_capacity_gb, state.free_capacity_gb,
+                state.provisioned_capacity_gb,
+                state.thin_provisioning_support,
+                state.max_over_subscription_ratio,
+                state.reserved_percentage))
+        self.assertEqual(expected, table.virtual_free())
+
+    def test_fits(self):
+        table = pool_capacity.PoolCapacityTable(self.host_states)
+        filt = capacity_filter.CapacityFilter()
+
+        for size in (1, 50, 100, 1000):
+            expected = [filt.host_passes(self.host_states[i], {'size': size})
+                        for i in table.rows]
+            self.assertEqual(expected, table.fits(size))
+
+    def test_empty(self):
+        table = pool_capacity.PoolCapacityTable([])
+
+        self.assertEqual([], table.virtual_free())
+        self.assertEqual([], table.fits(1))
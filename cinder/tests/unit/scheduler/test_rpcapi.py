@@ -22,6 +22,7 @@ import copy
 import mock
 
 from cinder import context
+from cinder import exception
 from cinder.scheduler import rpcapi as scheduler_rpcapi
 from cinder import test
 
@@ -114,6 +115,38 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  version='1.2')
         can_send_version.assert_called_once_with('1.9')
 
+    @mock.patch('oslo_messaging.RPCClient.can_send_version',
+                return_value=True)
+    def test_create_volumes(self, can_send_version):
+        self._test_scheduler_api('create_volumes',
+                                 rpc_method='cast',
+                                 topic='topic',
+                                 request_spec_list=['fake_request_spec'],
+                                 filter_properties_list=['filter_properties'],
+                                 version='1.12')
+        can_send_version.assert_called_once_with('1.12')
+
+    @mock.patch('cinder.scheduler.rpcapi.SchedulerAPI.create_volume')
+    @mock.patch('oslo_messaging.RPCClient.can_send_version',
+                return_value=False)
+    def test_create_volumes_old(self, can_send_version, create_volume):
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        rpcapi = scheduler_rpcapi.SchedulerAPI()
+        request_specs = [{'volume_id': 'fake_id%s' % i, 'snapshot_id': None,
+                          'image_id': None, 'volume': 'volume%s' % i}
+                         for i in range(2)]
+        filter_properties = [{}, {'scheduler_hints': {'foo': 'bar'}}]
+
+        rpcapi.create_volumes(ctxt, 'topic', request_specs,
+                              filter_properties)
+        self.assertEqual(
+            [mock.call(ctxt, 'topic', 'fake_id%s' % i, snapshot_id=None,
+                       image_id=None, request_spec=request_specs[i],
+                       filter_properties=filter_properties[i],
+                       volume='volume%s' % i)
+             for i in range(2)],
+            create_volume.call_args_list)
+
     @mock.patch('oslo_messaging.RPCClient.can_send_version',
                 return_value=True)
     def test_migrate_volume_to_host(self, can_send_version):
@@ -184,3 +217,15 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  rpc_method='call',
                                  filters=None,
                                  version='1.7')
+
+    @mock.patch('oslo_messaging.RPCClient.can_send_version',
+                return_value=True)
+    def test_get_timings(self, can_send_version):
+        self._test_scheduler_api('get_timings',
+                                 rpc_method='call',
+                                 version='1.13')
+        can_send_version.assert_called_once_with('1.13')
+
+        can_send_version.return_value = False
+        self.assertRaises(exception.ServiceTooOld, self._test_scheduler_api,
+                          'get_timings', rpc_method='call', version='1.13')
@@ -27,6 +27,7 @@ from cinder.objects import fields
 from cinder.scheduler import driver
 from cinder.scheduler import filter_scheduler
 from cinder.scheduler import manager
+from cinder.scheduler import timings
 from cinder import test
 from cinder.tests.unit import fake_consistencygroup
 from cinder.tests.unit import fake_volume
@@ -131,6 +132,24 @@ class SchedulerManagerTestCase(test.TestCase):
         _mock_sched_create.assert_called_once_with(self.context, request_spec,
                                                    {})
 
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volume')
+    @mock.patch('cinder.db.volume_update')
+    def test_create_volumes_puts_failed_volumes_in_error_state(
+            self, _mock_volume_update, _mock_sched_create):
+        _mock_sched_create.side_effect = [
+            None, exception.NoValidHost(reason=""), None]
+        request_specs = [{'volume_id': 'fake_id%s' % i} for i in range(3)]
+        filter_properties = [{}, {}, {}]
+
+        self.manager.create_volumes(self.context, 'fake_topic',
+                                    request_specs, filter_properties)
+        _mock_volume_update.assert_called_once_with(self.context,
+                                                    'fake_id1',
+                                                    {'status': 'error'})
+        self.assertEqual([mock.call(self.context, spec, {})
+                          for spec in request_specs],
+                         _mock_sched_create.call_args_list)
+
     @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volume')
     @mock.patch('eventlet.sleep')
     def test_create_volume_no_delay(self, _mock_sleep, _mock_sched_create):
@@ -313,6 +332,44 @@ class SchedulerManagerTestCase(test.TestCase):
 
             self.manager.driver = original_driver
 
+    @mock.patch.object(timings, 'TIMINGS')
+    def test_get_timings(self, mock_timings):
+        mock_timings.report.return_value = {'filters': {}, 'weighers': {}}
+
+        self.assertEqual({'filters': {}, 'weighers': {}},
+                         self.manager.get_timings(self.context))
+
+    @mock.patch('cinder.rpc.get_notifier')
+    @mock.patch('oslo_utils.timeutils.is_older_than')
+    @mock.patch.object(timings, 'TIMINGS')
+    def test_notify_timings(self, mock_timings, mock_is_older_than,
+                            mock_get_notifier):
+        mock_timings.report.return_value = {'filters': {}, 'weighers': {}}
+        mock_timings.count = 3
+        mock_is_older_than.return_value = True
+
+        self.manager._notify_timings(self.context)
+
+        mock_get_notifier.return_value.info.assert_called_once_with(
+            self.context, 'scheduler.timings',
+            {'host': self.manager.host,
+             'timings': {'filters': {}, 'weighers': {}}})
+
+        # Nothing was recorded since the last notification.
+        mock_get_notifier.reset_mock()
+        self.manager._notify_timings(self.context)
+        self.assertFalse(mock_get_notifier.called)
+
+        mock_timings.count = 4
+        mock_is_older_than.return_value = False
+        self.manager._notify_timings(self.context)
+        self.assertFalse(mock_get_notifier.called)
+
+        self.flags(scheduler_timings_notification_interval=0)
+        mock_is_older_than.return_value = True
+        self.manager._notify_timings(self.context)
+        self.assertFalse(mock_get_notifier.called)
+
 
 class SchedulerTestCase(test.TestCase):
     """Test case for base scheduler driver class."""
@@ -0,0 +1,70 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler filter and weigher timings.
+"""
+
+import mock
+
+from cinder.scheduler import timings
+from cinder import test
+
+
+class TimingsTestCase(test.TestCase):
+
+    def setUp(self):
+        super(TimingsTestCase, self).setUp()
+        self.timings = timings.Timings()
+
+    def test_report(self):
+        self.timings.record('filters', 'CapacityFilter', 0.0005, 10)
+        self.timings.record('filters', 'CapacityFilter', 0.2, 8)
+        self.timings.record('filters', 'CapacityFilter', 30, 8)
+        self.timings.record('weighers', 'CapacityWeigher', 0.001, 5)
+
+        report = self.timings.report()
+
+        capacity_filter = report['filters']['CapacityFilter']
+        self.assertEqual(3, capacity_filter['count'])
+        self.assertAlmostEqual(30.2005, capacity_filter['total'])
+        self.assertEqual(30, capacity_filter['max'])
+        self.assertEqual(26, capacity_filter['hosts'])
+        self.assertEqual({'0.001': 1, '0.005': 0, '0.01': 0, '0.05': 0,
+                          '0.1': 0, '0.5': 1, '1': 0, '5': 0, '10': 0,
+                          'inf': 1},
+                         capacity_filter['buckets'])
+        capacity_weigher = report['weighers']['CapacityWeigher']
+        self.assertEqual(1, capacity_weigher['count'])
+        self.assertEqual(1, capacity_weigher['buckets']['0.001'])
+        self.assertEqual(4, self.timings.count)
+
+    def test_reset(self):
+        self.timings.record('filters', 'CapacityFilter', 0.1, 10)
+        self.timings.reset()
+
+        self.assertEqual({'filters': {}, 'weighers': {}},
+                         self.timings.report())
+        self.assertEqual(0, self.timings.count)
+
+    @mock.patch.object(timings, 'LOG')
+    def test_slow_filter_warning(self, mock_log):
+        self.flags(scheduler_slow_filter_threshold=0.5)
+
+        self.timings.record('filters', 'CapacityFilter', 0.4, 10)
+        self.assertFalse(mock_log.warning.called)
+
+        self.timings.record('filters', 'CapacityFilter', 0.6, 10)
+        self.assertEqual(1, mock_log.warning.call_count)
+
+        self.flags(scheduler_slow_filter_threshold=0)
+        self.timings.record('filters', 'CapacityFilter', 60, 10)
+        self.assertEqual(1, mock_log.warning.call_count)
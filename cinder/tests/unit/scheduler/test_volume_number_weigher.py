@@ -45,6 +45,18 @@ def fake_volume_data_get_for_host(context, host, count_only=False):
         return 6
 
 
+def fake_volume_data_get_by_host(context, host=None, statuses=None,
+                                 exclude_statuses=None):
+    # One volume on host1, two on host2... a volume without a pool on each
+    # host is not counted.
+    volume_data = {}
+    for i, pool in enumerate(['host1#lvm1', 'host2#lvm2', 'host3#lvm3',
+                              'host4#lvm4', 'host5#_pool0']):
+        volume_data[pool] = (i + 1, i + 1)
+        volume_data[utils.extract_host(pool)] = (10, 10)
+    return volume_data
+
+
 class VolumeNumberWeigherTestCase(test.TestCase):
     def setUp(self):
         super(VolumeNumberWeigherTestCase, self).setUp()
@@ -61,6 +73,8 @@ class VolumeNumberWeigherTestCase(test.TestCase):
             hosts,
             weight_properties)[0]
 
+    @mock.patch('cinder.db.sqlalchemy.api.volume_data_get_by_host',
+                fake_volume_data_get_by_host)
     @mock.patch('cinder.db.sqlalchemy.api.service_get_all_by_topic')
     def _get_all_hosts(self, _mock_service_get_all_by_topic, disabled=False):
         ctxt = context.get_admin_context()
@@ -81,9 +95,9 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         # host4: 4 volumes
         # host5: 5 volumes   Norm=-1.0
         # so, host1 should win:
-        with mock.patch.object(api, 'volume_data_get_for_host',
-                               fake_volume_data_get_for_host):
+        with mock.patch.object(api, 'volume_data_get_for_host') as mock_get:
             weighed_host = self._get_weighed_host(hostinfo_list)
+            self.assertFalse(mock_get.called)
             self.assertEqual(0.0, weighed_host.weight)
             self.assertEqual('host1',
                              utils.extract_host(weighed_host.obj.host))
@@ -98,9 +112,33 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         # host4: 4 volumes
         # host5: 5 volumes     Norm=1
         # so, host5 should win:
-        with mock.patch.object(api, 'volume_data_get_for_host',
-                               fake_volume_data_get_for_host):
+        with mock.patch.object(api, 'volume_data_get_for_host') as mock_get:
             weighed_host = self._get_weighed_host(hostinfo_list)
+            self.assertFalse(mock_get.called)
             self.assertEqual(1.0, weighed_host.weight)
             self.assertEqual('host5',
                              utils.extract_host(weighed_host.obj.host))
+
+    def test_volume_number_weight_consumed(self):
+        self.flags(volume_number_multiplier=-1.0)
+        hostinfo_list = self._get_all_hosts()
+
+        # host1 has 1 volume, 2 once consumed and ties with host2
+        host1 = [host for host in hostinfo_list
+                 if utils.extract_host(host.host) == 'host1'][0]
+        host1.consume_from_volume({'size': 1})
+        host1.consume_from_volume({'size': 1})
+        weighed_host = self._get_weighed_host(hostinfo_list)
+        self.assertEqual('host2', utils.extract_host(weighed_host.obj.host))
+
+    def test_volume_number_weight_unknown_count(self):
+        self.flags(volume_number_multiplier=-1.0)
+        hosts = [fakes.FakeHostState('host%s#pool' % i, {})
+                 for i in range(1, 6)]
+
+        with mock.patch.object(api, 'volume_data_get_for_host',
+                               fake_volume_data_get_for_host):
+            weighed_host = self._get_weighed_host(hosts)
+            self.assertEqual(0.0, weighed_host.weight)
+            self.assertEqual('host1',
+                             utils.extract_host(weighed_host.obj.host))
@@ -17,6 +17,8 @@
 Tests For Scheduler weights.
 """
 
+import mock
+
 from cinder.scheduler import base_weight
 from cinder import test
 
@@ -52,3 +54,19 @@ class TestWeightHandler(test.TestCase):
         for seq, result, minval, maxval in map_:
             ret = base_weight.normalize(seq, minval=minval, maxval=maxval)
             self.assertEqual(result, tuple(ret))
+
+    @mock.patch.object(base_weight.timings, 'TIMINGS')
+    @mock.patch('cinder.scheduler.base_handler.extension.ExtensionManager')
+    def test_get_weighed_objects_records_timings(self, mock_ext_manager,
+                                                 mock_timings):
+        class FakeWeigher(base_weight.BaseWeigher):
+            def _weigh_object(self, obj, weight_properties):
+                return obj
+
+        handler = base_weight.BaseWeightHandler(base_weight.BaseWeigher,
+                                                'fake_weighers')
+        result = handler.get_weighed_objects([FakeWeigher], [1, 2, 3], {})
+
+        self.assertEqual([3, 2, 1], [weighed.obj for weighed in result])
+        mock_timings.record.assert_called_once_with(
+            'weighers', 'FakeWeigher', mock.ANY, 3)
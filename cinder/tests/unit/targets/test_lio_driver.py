@@ -335,3 +335,36 @@ class TestLioAdmDriver(tf.TargetDriverFixture):
             (mock.sentinel.user, mock.sentinel.pwd),
             portals_ips=[self.configuration.iscsi_ip_address],
             portals_port=self.configuration.iscsi_port)
+
+    @mock.patch.object(lio.LioAdm, '_get_targets', return_value='target')
+    @mock.patch.object(lio.LioAdm, '_restore_configuration')
+    def test_ensure_export_batch_window(self, mock_restore,
+                                        mock_get_targets):
+        ctxt = context.get_admin_context()
+        self.target.batch_window = 10
+
+        self.target.ensure_export(ctxt, self.testvol, self.fake_volumes_dir)
+        self.target.ensure_export(ctxt, self.testvol_2,
+                                  self.fake_volumes_dir)
+
+        mock_get_targets.assert_called_once_with()
+        self.assertFalse(mock_restore.called)
+
+    @mock.patch('eventlet.spawn_after')
+    @mock.patch.object(lio.LioAdm, '_execute')
+    def test_persist_configuration_batch_window(self, mock_execute,
+                                                mock_spawn_after):
+        self.target.batch_window = 2
+
+        self.target._persist_configuration('vol1')
+        self.target._persist_configuration('vol2')
+
+        mock_spawn_after.assert_called_once_with(
+            2, self.target._save_unsaved_configuration)
+        self.assertFalse(mock_execute.called)
+
+        self.target._save_unsaved_configuration()
+
+        mock_execute.assert_called_once_with('cinder-rtstool', 'save',
+                                             run_as_root=True)
+        self.assertEqual(set(), self.target._unsaved_volumes)
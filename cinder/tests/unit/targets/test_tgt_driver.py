@@ -380,3 +380,27 @@ class TestTgtAdmDriver(tf.TargetDriverFixture):
             old_name=None,
             portals_ips=[self.configuration.iscsi_ip_address],
             portals_port=self.configuration.iscsi_port)
+
+    @mock.patch.object(tgt.TgtAdm, '_get_target_chap_auth')
+    @mock.patch.object(tgt.TgtAdm, 'create_iscsi_target')
+    @mock.patch('cinder.utils.execute')
+    def test_ensure_export_batch_window(self, mock_execute, mock_create,
+                                        mock_get_chap):
+        ctxt = context.get_admin_context()
+        mock_execute.return_value = (self.fake_iscsi_scan, None)
+        mock_get_chap.return_value = ('foo', 'bar')
+        self.target.batch_window = 10
+        volume = dict(self.testvol, name=self.VOLUME_NAME)
+        utils.robust_file_write(self.fake_volumes_dir, self.VOLUME_NAME, '')
+
+        # The target, its backing lun and its persistence file exist.
+        self.target.ensure_export(ctxt, volume, self.testvol_path)
+        self.target.ensure_export(ctxt, volume, self.testvol_path)
+        self.assertFalse(mock_create.called)
+
+        # The target of testvol is missing from the same listing.
+        self.target.ensure_export(ctxt, self.testvol, self.fake_volumes_dir)
+        self.assertEqual(1, mock_create.call_count)
+
+        mock_execute.assert_called_once_with('tgt-admin', '--show',
+                                             run_as_root=True)
@@ -733,6 +733,33 @@ class BackupSwiftTestCase(test.TestCase):
                           service.delete,
                           backup)
 
+    def test_dedup_per_user(self):
+        self.flags(backup_dedup=True)
+        self.flags(backup_swift_auth='per_user')
+        service = swift_dr.SwiftBackupDriver(self.ctxt)
+        self.assertFalse(service.dedup)
+
+        self.flags(backup_swift_auth='single_user')
+        self.flags(backup_swift_user='fake-user')
+        self.flags(backup_swift_key='fake-key')
+        service = swift_dr.SwiftBackupDriver(self.ctxt)
+        self.assertTrue(service.dedup)
+
+    def test_object_writer_connections(self):
+        service = swift_dr.SwiftBackupDriver(self.ctxt)
+
+        writer1 = service.get_object_writer('container', 'object1')
+        writer2 = service.get_object_writer('container', 'object2')
+        self.assertIsNot(service.conn, writer1.conn)
+        self.assertIsNot(writer1.conn, writer2.conn)
+
+        with writer1:
+            writer1.write(b'data')
+        self.assertEqual([writer1.conn], service.writer_conns)
+        writer3 = service.get_object_writer('container', 'object3')
+        self.assertIs(writer1.conn, writer3.conn)
+        self.assertEqual([], service.writer_conns)
+
     def test_delete_without_object_prefix(self):
         volume_id = 'ee30d649-72a6-49a5-b78d-000000edb6b1'
 
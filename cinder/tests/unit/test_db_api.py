@@ -25,6 +25,7 @@ from cinder.api import common
 from cinder import context
 from cinder import db
 from cinder.db.sqlalchemy import api as sqlalchemy_api
+from cinder.db.sqlalchemy import models
 from cinder import exception
 from cinder import quota
 from cinder import test
@@ -355,6 +356,55 @@ class DBAPIVolumeTestCase(BaseTest):
                              db.volume_data_get_for_host(
                                  self.ctxt, 'h%d@lvmdriver-1' % i))
 
+    def test_volume_data_get_by_host(self):
+        for i in range(THREE):
+            for j in range(i + 1):
+                db.volume_create(self.ctxt, {'host': 'h%d@lvm#pool' % i,
+                                             'size': ONE_HUNDREDS})
+        db.volume_create(self.ctxt, {'host': 'h0@lvm', 'size': 1})
+        volume = db.volume_create(self.ctxt, {'host': 'h0@lvm#pool',
+                                              'size': 1})
+        db.volume_destroy(self.ctxt, volume['id'])
+
+        self.assertEqual({'h0@lvm#pool': (1, ONE_HUNDREDS),
+                          'h1@lvm#pool': (2, 2 * ONE_HUNDREDS),
+                          'h2@lvm#pool': (3, THREE_HUNDREDS),
+                          'h0@lvm': (1, 1)},
+                         db.volume_data_get_by_host(self.ctxt))
+        self.assertEqual({'h0@lvm#pool': (1, ONE_HUNDREDS),
+                          'h0@lvm': (1, 1)},
+                         db.volume_data_get_by_host(self.ctxt, 'h0@lvm'))
+
+    def test_volume_data_get_by_host_statuses(self):
+        for status in ('available', 'in-use', 'creating', 'error'):
+            db.volume_create(self.ctxt, {'host': 'h0@lvm#pool',
+                                         'status': status,
+                                         'size': ONE_HUNDREDS})
+        db.volume_create(self.ctxt, {'host': 'h0@lvm#pool2',
+                                     'status': 'in-use', 'size': 1})
+
+        self.assertEqual({'h0@lvm#pool': (2, 2 * ONE_HUNDREDS),
+                          'h0@lvm#pool2': (1, 1)},
+                         db.volume_data_get_by_host(
+                             self.ctxt, 'h0@lvm',
+                             statuses=['available', 'in-use']))
+
+    def test_volume_data_get_by_host_exclude_statuses(self):
+        for status in ('available', 'backing-up', 'creating', 'error'):
+            db.volume_create(self.ctxt, {'host': 'h0@lvm#pool',
+                                         'status': status,
+                                         'size': ONE_HUNDREDS})
+
+        self.assertEqual({'h0@lvm#pool': (2, 2 * ONE_HUNDREDS)},
+                         db.volume_data_get_by_host(
+                             self.ctxt, 'h0@lvm',
+                             exclude_statuses=['creating', 'error']))
+
+    def test_volume_data_get_by_host_not_admin(self):
+        ctxt = context.RequestContext('user', 'project')
+        self.assertRaises(exception.AdminRequired,
+                          db.volume_data_get_by_host, ctxt)
+
     def test_volume_data_get_for_project(self):
         for i in range(THREE):
             for j in range(THREE):
@@ -431,6 +481,56 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualListsOfObjects(volumes[2:], db.volume_get_all(
                                         self.ctxt, 2, 2, ['id'], ['asc']))
 
+    def test_volume_get_all_pages(self):
+        created_at = datetime.datetime(2016, 1, 1)
+        for i in range(7):
+            # Several volumes are created at the same time, the pages are
+            # then ordered by id.
+            db.volume_create(self.ctxt, {
+                'created_at': created_at + datetime.timedelta(hours=i // 3),
+                'metadata': {'index': str(i)}})
+        expected = [volume.id for volume in
+                    db.volume_get_all(self.ctxt, None, None)]
+
+        ids = []
+        marker = None
+        with mock.patch.object(sqlalchemy_api, '_volume_get') as mock_get:
+            while True:
+                page = db.volume_get_all(self.ctxt, marker, 2)
+                if not page:
+                    break
+                ids.extend(volume.id for volume in page)
+                marker = page[-1].id
+            # Only the sort keys of the markers were read.
+            self.assertFalse(mock_get.called)
+
+        self.assertEqual(expected, ids)
+        self.assertEqual(7, len(ids))
+
+    def test_volume_get_all_marker_not_found(self):
+        db.volume_create(self.ctxt, {})
+        self.assertRaises(exception.VolumeNotFound, db.volume_get_all,
+                          self.ctxt, 'nonexistent', 2)
+
+    def test_volume_get_all_loads_relationships(self):
+        volume = db.volume_create(self.ctxt, {'metadata': {'a': '1',
+                                                           'b': '2'},
+                                              'admin_metadata': {'c': '3'}})
+        values = {'volume_id': volume.id}
+        for i in range(2):
+            db.volume_attach(self.ctxt, values)
+
+        volumes = db.volume_get_all(self.ctxt, None, 1)
+
+        self.assertEqual(1, len(volumes))
+        self.assertEqual({'a': '1', 'b': '2'},
+                         {item.key: item.value
+                          for item in volumes[0].volume_metadata})
+        self.assertEqual({'c': '3'},
+                         {item.key: item.value
+                          for item in volumes[0].volume_admin_metadata})
+        self.assertEqual(2, len(volumes[0].volume_attachment))
+
     def test_volume_get_all_by_host(self):
         volumes = []
         for i in range(3):
@@ -1749,6 +1849,73 @@ class DBAPIReservationTestCase(BaseTest):
                              self.ctxt,
                              'project1'))
 
+    def test_reservation_expire_batches(self):
+        self.flags(reservation_expire_batch_size=1)
+        _quota_reserve(self.ctxt, 'project1')
+
+        with mock.patch.object(
+                sqlalchemy_api, '_reservation_expire_batch',
+                wraps=sqlalchemy_api._reservation_expire_batch) as mock_batch:
+            db.reservation_expire(self.ctxt)
+
+        self.assertEqual(3, mock_batch.call_count)
+        expected = {'project_id': 'project1',
+                    'gigabytes': {'reserved': 0, 'in_use': 0},
+                    'volumes': {'reserved': 0, 'in_use': 0}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt,
+                             'project1'))
+
+    def _reserve(self, deltas):
+        resources = {resource: quota.ReservableResource(resource,
+                                                        '_sync_%s' % resource)
+                     for resource in ('volumes', 'gigabytes')}
+        return db.quota_reserve(
+            self.ctxt, resources, {'volumes': 10, 'gigabytes': 100}, deltas,
+            datetime.datetime.utcnow() + datetime.timedelta(days=1),
+            0, 0, 'project1')
+
+    def test_reservation_commit_several_reservations_of_a_usage(self):
+        first = self._reserve({'volumes': 1, 'gigabytes': 10})
+        second = self._reserve({'volumes': 2, 'gigabytes': 20})
+        third = self._reserve({'volumes': -1, 'gigabytes': -10})
+
+        db.reservation_commit(self.ctxt, first + second + third, 'project1')
+        expected = {'project_id': 'project1',
+                    'volumes': {'reserved': 0, 'in_use': 2},
+                    'gigabytes': {'reserved': 0, 'in_use': 20}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt, 'project1'))
+
+        # The reservations are gone, committing them again does nothing.
+        db.reservation_commit(self.ctxt, first, 'project1')
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt, 'project1'))
+
+    def test_reservation_rollback_several_reservations_of_a_usage(self):
+        first = self._reserve({'volumes': 1, 'gigabytes': 10})
+        second = self._reserve({'volumes': 2, 'gigabytes': 20})
+        third = self._reserve({'volumes': -1, 'gigabytes': -10})
+
+        db.reservation_rollback(self.ctxt, first + third, 'project1')
+        expected = {'project_id': 'project1',
+                    'volumes': {'reserved': 2, 'in_use': 0},
+                    'gigabytes': {'reserved': 20, 'in_use': 0}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt, 'project1'))
+
+        db.reservation_rollback(self.ctxt, second, 'project1')
+        expected = {'project_id': 'project1',
+                    'volumes': {'reserved': 0, 'in_use': 0},
+                    'gigabytes': {'reserved': 0, 'in_use': 0}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt, 'project1'))
+
 
 class DBAPIQuotaClassTestCase(BaseTest):
 
@@ -1869,6 +2036,77 @@ class DBAPIQuotaTestCase(BaseTest):
                           'volumes': {'reserved': 1, 'in_use': 0}},
                          quota_usage)
 
+    def _conditional_reserve(self, deltas, quotas=None):
+        quotas = quotas or {'volumes': 5, 'gigabytes': 10}
+        resources = {resource: quota.ReservableResource(resource,
+                                                        '_sync_%s' % resource)
+                     for resource in quotas}
+        return db.quota_reserve(
+            self.ctxt, resources, quotas, deltas,
+            datetime.datetime.utcnow() + datetime.timedelta(days=1),
+            0, 0, 'project1')
+
+    def test_quota_reserve_conditional(self):
+        self.flags(use_conditional_quota_reserve=True)
+        # The usages don't exist yet, they are created with the usages
+        # locked.
+        self._conditional_reserve({'volumes': 1, 'gigabytes': 2})
+
+        with mock.patch.object(sqlalchemy_api,
+                               '_get_quota_usages') as mock_get_usages:
+            reservations = self._conditional_reserve({'volumes': 2,
+                                                      'gigabytes': 4})
+            self.assertFalse(mock_get_usages.called)
+
+        self.assertEqual(2, len(reservations))
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': 3, 'in_use': 0},
+                          'gigabytes': {'reserved': 6, 'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+        db.reservation_rollback(self.ctxt, reservations, 'project1')
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': 1, 'in_use': 0},
+                          'gigabytes': {'reserved': 2, 'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+    def test_quota_reserve_conditional_over_quota(self):
+        self.flags(use_conditional_quota_reserve=True)
+        self._conditional_reserve({'volumes': 1, 'gigabytes': 6})
+
+        exc = self.assertRaises(exception.OverQuota,
+                                self._conditional_reserve,
+                                {'volumes': 1, 'gigabytes': 5})
+
+        self.assertEqual(['gigabytes'], exc.kwargs['overs'])
+        self.assertEqual({'reserved': 6, 'in_use': 0, 'allocated': 0},
+                         exc.kwargs['usages']['gigabytes'])
+        # Nothing was reserved, not even the volume that fits.
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': 1, 'in_use': 0},
+                          'gigabytes': {'reserved': 6, 'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+    def test_quota_reserve_conditional_unlimited_and_negative(self):
+        self.flags(use_conditional_quota_reserve=True)
+        quotas = {'volumes': -1, 'gigabytes': 10}
+        self._conditional_reserve({'volumes': 1, 'gigabytes': 2}, quotas)
+
+        reservations = self._conditional_reserve(
+            {'volumes': 100, 'gigabytes': -2}, quotas)
+
+        self.assertEqual(2, len(reservations))
+        # Negative deltas are only applied when the reservation is
+        # committed.
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': 101, 'in_use': 0},
+                          'gigabytes': {'reserved': 2, 'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
     def test_quota_destroy(self):
         db.quota_create(self.ctxt, 'project1', 'resource1', 41)
         self.assertIsNone(db.quota_destroy(self.ctxt, 'project1',
@@ -2092,6 +2330,67 @@ class DBAPIBackupTestCase(BaseTest):
                           'notinbase')
 
 
+class DBAPIBackupDedupBlockTestCase(BaseTest):
+
+    """Tests for db.api.backup_dedup_block* methods."""
+
+    container = 'dedup'
+
+    def _create_block(self, sha256, refcount=1):
+        return db.backup_dedup_block_create(
+            self.ctxt, self.container, sha256,
+            {'object_name': '%s-object' % sha256,
+             'compression': 'zlib',
+             'length': 1024,
+             'refcount': refcount})
+
+    def _get_refcount(self, sha256):
+        return sqlalchemy_api.get_session().query(
+            models.BackupDedupBlock).filter_by(container=self.container,
+                                               sha256=sha256).one().refcount
+
+    def test_backup_dedup_block_create_exists(self):
+        self._create_block('sha1')
+        self.assertRaises(exception.BackupDedupBlockExists,
+                          self._create_block, 'sha1')
+
+    def test_backup_dedup_blocks_ref(self):
+        self._create_block('sha1')
+        self._create_block('sha2', refcount=3)
+
+        blocks = db.backup_dedup_blocks_ref(
+            self.ctxt, self.container, {'sha1': 2, 'sha2': 1, 'sha3': 4})
+
+        self.assertEqual({'sha1', 'sha2'}, set(blocks))
+        self.assertEqual('sha1-object', blocks['sha1'].object_name)
+        self.assertEqual('zlib', blocks['sha1'].compression)
+        self.assertEqual(1024, blocks['sha1'].length)
+        self.assertEqual(3, self._get_refcount('sha1'))
+        self.assertEqual(4, self._get_refcount('sha2'))
+
+    def test_backup_dedup_blocks_ref_other_container(self):
+        self._create_block('sha1')
+
+        blocks = db.backup_dedup_blocks_ref(self.ctxt, 'other', {'sha1': 1})
+
+        self.assertEqual({}, blocks)
+        self.assertEqual(1, self._get_refcount('sha1'))
+
+    def test_backup_dedup_blocks_unref(self):
+        self._create_block('sha1', refcount=2)
+        self._create_block('sha2', refcount=3)
+        self._create_block('sha3')
+
+        object_names = db.backup_dedup_blocks_unref(
+            self.ctxt, self.container, {'sha1': 2, 'sha2': 1, 'sha4': 1})
+
+        self.assertEqual(['sha1-object'], object_names)
+        self.assertEqual(2, self._get_refcount('sha2'))
+        self.assertEqual(1, self._get_refcount('sha3'))
+        self.assertEqual({}, db.backup_dedup_blocks_ref(
+            self.ctxt, self.container, {'sha1': 1}))
+
+
 class DBAPIProcessSortParamTestCase(test.TestCase):
 
     def test_process_sort_params_defaults(self):
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
+
 from cinder import exception
 from cinder.scheduler.evaluator import evaluator
 from cinder import test
@@ -137,3 +139,17 @@ class EvaluatorTestCase(test.TestCase):
         self.assertRaises(exception.EvaluatorParseException,
                           evaluator.evaluate,
                           "7 / 0")
+
+    @mock.patch.object(evaluator, '_expressions', {})
+    def test_expression_parsed_once(self):
+        evaluator.evaluate("1")
+        with mock.patch.object(evaluator._parser, 'parseString',
+                               wraps=evaluator._parser.parseString) as parse:
+            for iops in (100, 200):
+                self.assertEqual(iops + 1,
+                                 evaluator.evaluate("stats.iops + 1",
+                                                    stats={'iops': iops}))
+            for _i in range(2):
+                self.assertRaises(exception.EvaluatorParseException,
+                                  evaluator.evaluate, "1/*1")
+        self.assertEqual(2, parse.call_count)
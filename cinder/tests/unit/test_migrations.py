@@ -744,6 +744,52 @@ class MigrationsMixin(test_migrations.WalkVersionsMixin):
         self.assertIsInstance(reservations.c.allocated_id.type,
                               self.INTEGER_TYPE)
 
+    def _check_067(self, engine, data):
+        """Test adding backup_dedup_blocks table."""
+        has_table = engine.dialect.has_table(engine.connect(),
+                                             "backup_dedup_blocks")
+        self.assertTrue(has_table)
+
+        dedup_blocks = db_utils.get_table(engine, 'backup_dedup_blocks')
+
+        self.assertIsInstance(dedup_blocks.c.id.type,
+                              self.INTEGER_TYPE)
+        self.assertIsInstance(dedup_blocks.c.container.type,
+                              self.VARCHAR_TYPE)
+        self.assertIsInstance(dedup_blocks.c.sha256.type,
+                              self.VARCHAR_TYPE)
+        self.assertIsInstance(dedup_blocks.c.object_name.type,
+                              self.VARCHAR_TYPE)
+        self.assertIsInstance(dedup_blocks.c.compression.type,
+                              self.VARCHAR_TYPE)
+        self.assertIsInstance(dedup_blocks.c.length.type,
+                              self.INTEGER_TYPE)
+        self.assertIsInstance(dedup_blocks.c.refcount.type,
+                              self.INTEGER_TYPE)
+
+    def _check_068(self, engine, data):
+        """Test adding the reservations uuid index."""
+        reservations = db_utils.get_table(engine, 'reservations')
+        index_columns = []
+        for idx in reservations.indexes:
+            if idx.name == 'reservations_uuid_idx':
+                index_columns = idx.columns.keys()
+                break
+
+        self.assertEqual(['uuid'], index_columns)
+
+    def _check_069(self, engine, data):
+        """Test adding the volume, snapshot and backup listing indexes."""
+        for table_name in ('volumes', 'snapshots', 'backups'):
+            table = db_utils.get_table(engine, table_name)
+            indexes = {idx.name: idx.columns.keys() for idx in table.indexes}
+            self.assertEqual(
+                ['project_id', 'deleted', 'created_at', 'id'],
+                indexes.get('%s_project_deleted_created_idx' % table_name))
+            self.assertEqual(
+                ['deleted', 'created_at', 'id'],
+                indexes.get('%s_deleted_created_idx' % table_name))
+
     def test_walk_versions(self):
         self.walk_versions(False, False)
 
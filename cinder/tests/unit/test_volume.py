@@ -356,6 +356,141 @@ class VolumeTestCase(BaseVolumeTestCase):
         self.volume.delete_volume(self.context, vol3['id'])
         self.volume.delete_volume(self.context, vol4['id'])
 
+    def test_reconcile_allocated_capacity(self):
+        self.flags(allocated_capacity_reconcile_interval=60)
+        tests_utils.create_volume(
+            self.context, size=128,
+            host=volutils.append_host(CONF.host, 'pool0'))
+        tests_utils.create_volume(
+            self.context, size=256,
+            host=volutils.append_host(CONF.host, 'pool1'))
+        self.volume.init_host()
+        self.volume.stats['pools']['pool0']['allocated_capacity_gb'] = 100
+        del self.volume.stats['pools']['pool1']
+        self.volume.stats['allocated_capacity_gb'] = 100
+
+        # Within the interval nothing is recounted.
+        self.volume._reconcile_allocated_capacity(self.context)
+        self.assertEqual({}, self.volume._capacity_drift)
+
+        # The first recount only records the drift...
+        self.volume._last_capacity_reconcile = 0
+        self.volume._reconcile_allocated_capacity(self.context)
+        self.assertEqual({'pool0': 128, 'pool1': 256},
+                         self.volume._capacity_drift)
+        self.assertEqual(100, self.volume.stats['allocated_capacity_gb'])
+
+        # ...that the second one corrects.
+        self.volume._last_capacity_reconcile = 0
+        self.volume._reconcile_allocated_capacity(self.context)
+        self.assertEqual({}, self.volume._capacity_drift)
+        self.assertEqual(384, self.volume.stats['allocated_capacity_gb'])
+        self.assertEqual(
+            128, self.volume.stats['pools']['pool0']['allocated_capacity_gb'])
+        self.assertEqual(
+            256, self.volume.stats['pools']['pool1']['allocated_capacity_gb'])
+
+    def test_reconcile_allocated_capacity_statuses(self):
+        self.flags(allocated_capacity_reconcile_interval=60)
+        self.volume.init_host()
+        host = volutils.append_host(CONF.host, 'pool0')
+        for status, size in (('available', 1), ('in-use', 2),
+                             ('backing-up', 4), ('deleting', 8),
+                             ('creating', 16), ('downloading', 32),
+                             ('error', 64)):
+            tests_utils.create_volume(self.context, status=status,
+                                      size=size, host=host)
+
+        # The volumes being backed up or deleted are still allocated, the
+        # volumes not created yet or that failed to be are not.
+        for _i in range(2):
+            self.volume._last_capacity_reconcile = 0
+            self.volume._reconcile_allocated_capacity(self.context)
+        self.assertEqual(
+            15, self.volume.stats['pools']['pool0']['allocated_capacity_gb'])
+
+    def test_init_host_ensure_exports(self):
+        self.flags(volume_service_inithost_export_workers=2)
+        volumes = [tests_utils.create_volume(self.context, status='in-use',
+                                             size=0, host=CONF.host)
+                   for _i in range(3)]
+        available = tests_utils.create_volume(self.context, size=0,
+                                              host=CONF.host)
+
+        def ensure_export(ctxt, volume):
+            if volume.id == volumes[1].id:
+                raise exception.VolumeBackendAPIException(data='fake')
+
+        with mock.patch.object(self.volume.driver, 'ensure_export',
+                               side_effect=ensure_export) as mock_ensure:
+            self.volume.init_host()
+
+        self.assertEqual(set(volume.id for volume in volumes),
+                         set(call[0][1].id
+                             for call in mock_ensure.call_args_list))
+        statuses = [db.volume_get(self.context, volume.id)['status']
+                    for volume in volumes + [available]]
+        self.assertEqual(['in-use', 'error', 'in-use', 'available'],
+                         statuses)
+
+    @mock.patch.object(vol_manager.VolumeManager,
+                       'publish_service_capabilities')
+    def test_init_host_background_export(self, mock_publish):
+        self.flags(volume_service_inithost_background_export=True)
+        volume = tests_utils.create_volume(self.context, status='in-use',
+                                           size=0, host=CONF.host)
+
+        with mock.patch.object(self.volume.driver,
+                               'ensure_export') as mock_ensure,\
+                mock.patch.object(self.volume,
+                                  '_add_to_threadpool') as mock_add:
+            self.volume.init_host()
+
+            self.assertFalse(mock_ensure.called)
+            self.assertTrue(self.volume._recovering)
+            self.assertTrue(mock_publish.called)
+            mock_add.assert_called_once_with(self.volume._recover_exports,
+                                             mock.ANY, mock.ANY)
+            exports = mock_add.call_args[0][2]
+            self.assertEqual([volume.id], [vol.id for vol in exports])
+
+            mock_publish.reset_mock()
+            self.volume._recover_exports(self.context, exports)
+
+            self.assertEqual(1, mock_ensure.call_count)
+            self.assertFalse(self.volume._recovering)
+            mock_publish.assert_called_once_with(self.context)
+
+    @mock.patch.object(vol_manager.VolumeManager,
+                       'publish_service_capabilities')
+    def test_recover_exports_status_changed(self, mock_publish):
+        volumes = [objects.Volume.get_by_id(
+            self.context,
+            tests_utils.create_volume(self.context, status='in-use',
+                                      size=0, host=CONF.host).id)
+            for _i in range(3)]
+        # The first volume is detached and the second one deleted before
+        # they are re-exported, the third one detached while it is.
+        db.volume_update(self.context, volumes[0].id,
+                         {'status': 'available'})
+        db.volume_destroy(self.context, volumes[1].id)
+
+        def ensure_export(ctxt, volume):
+            db.volume_update(ctxt, volume.id, {'status': 'available'})
+            raise exception.VolumeBackendAPIException(data='fake')
+
+        with mock.patch.object(self.volume.driver, 'ensure_export',
+                               side_effect=ensure_export) as mock_ensure:
+            self.volume._recover_exports(self.context, volumes)
+
+        self.assertEqual([volumes[2].id],
+                         [call[0][1].id
+                          for call in mock_ensure.call_args_list])
+        self.assertEqual('available',
+                         db.volume_get(self.context, volumes[0].id).status)
+        self.assertEqual('available',
+                         db.volume_get(self.context, volumes[2].id).status)
+
     @mock.patch('cinder.rpc.LAST_RPC_VERSIONS', {'cinder-scheduler': '1.3'})
     @mock.patch('cinder.rpc.LAST_OBJ_VERSIONS', {'cinder-scheduler': '1.5'})
     def test_reset(self):
@@ -874,6 +1009,78 @@ class VolumeTestCase(BaseVolumeTestCase):
                                    'description')
         self.assertEqual('default-az', volume['availability_zone'])
 
+    @mock.patch('cinder.quota.QUOTAS.rollback', new=mock.MagicMock())
+    @mock.patch('cinder.quota.QUOTAS.commit', new=mock.MagicMock())
+    @mock.patch('cinder.quota.QUOTAS.reserve', return_value=["RESERVATION"])
+    def test_create_volumes(self, _mock_reserve):
+        """Test several volumes are sent to the scheduler at once."""
+        volume_api = cinder.volume.api.API()
+
+        with mock.patch.object(volume_api.scheduler_rpcapi,
+                               'create_volumes') as create_volumes, \
+                mock.patch.object(volume_api.scheduler_rpcapi,
+                                  'create_volume') as create_volume:
+            volumes = volume_api.create_volumes(
+                self.context, 3, 1, 'name', 'description',
+                scheduler_hints={'different_host': []})
+
+        self.assertEqual(3, len(volumes))
+        self.assertFalse(create_volume.called)
+        create_volumes.assert_called_once_with(self.context,
+                                               CONF.volume_topic,
+                                               mock.ANY, mock.ANY)
+        request_specs, filter_properties = create_volumes.call_args[0][2:]
+        self.assertEqual([volume.id for volume in volumes],
+                         [spec['volume_id'] for spec in request_specs])
+        self.assertEqual([{'scheduler_hints': {'different_host': []}}] * 3,
+                         filter_properties)
+        # The quota of the whole batch is checked first.
+        batch_quota = _mock_reserve.call_args_list[0][1]
+        self.assertEqual(3, batch_quota['volumes'])
+        self.assertEqual(3, batch_quota['gigabytes'])
+
+    @mock.patch('cinder.quota.QUOTAS.reserve')
+    def test_create_volumes_over_quota(self, _mock_reserve):
+        _mock_reserve.side_effect = exception.OverQuota(
+            overs=['volumes'], quotas={'volumes': 2},
+            usages={'volumes': {'reserved': 0, 'in_use': 0}})
+        volume_api = cinder.volume.api.API()
+
+        with mock.patch.object(volume_api, 'create') as create:
+            self.assertRaises(exception.VolumeLimitExceeded,
+                              volume_api.create_volumes,
+                              self.context, 3, 1, 'name', 'description')
+        self.assertFalse(create.called)
+
+    @mock.patch('cinder.quota.QUOTAS.rollback', new=mock.MagicMock())
+    @mock.patch('cinder.quota.QUOTAS.commit', new=mock.MagicMock())
+    @mock.patch('cinder.quota.QUOTAS.reserve', return_value=["RESERVATION"])
+    def test_create_volumes_fails(self, _mock_reserve):
+        """Test the volumes of a failed batch are deleted, not scheduled."""
+        volume_api = cinder.volume.api.API()
+        create = volume_api.create
+        volumes = []
+
+        def fake_create(*args, **kwargs):
+            if len(volumes) == 2:
+                raise exception.VolumeLimitExceeded(allowed=2,
+                                                    name='volumes')
+            volumes.append(create(*args, **kwargs))
+            return volumes[-1]
+
+        with mock.patch.object(volume_api.scheduler_rpcapi,
+                               'create_volumes') as create_volumes, \
+                mock.patch.object(volume_api, 'create',
+                                  side_effect=fake_create):
+            self.assertRaises(exception.VolumeLimitExceeded,
+                              volume_api.create_volumes,
+                              self.context, 3, 1, 'name', 'description')
+
+        self.assertFalse(create_volumes.called)
+        for volume in volumes:
+            self.assertRaises(exception.VolumeNotFound, db.volume_get,
+                              self.context, volume.id)
+
     @mock.patch('cinder.quota.QUOTAS.rollback', new=mock.MagicMock())
     @mock.patch('cinder.quota.QUOTAS.commit', new=mock.MagicMock())
     @mock.patch('cinder.quota.QUOTAS.reserve', return_value=["RESERVATION"])
@@ -4414,13 +4621,40 @@ class VolumeMigrationTestCase(VolumeTestCase):
                 mock_copy_volume:
             self.volume._migrate_volume_generic(self.context, volume,
                                                 host_obj, None)
-            mock_copy_volume.assert_called_with(self.context, volume,
-                                                new_volume_obj,
-                                                remote='dest')
+            mock_copy_volume.assert_called_with(
+                self.context, volume, new_volume_obj, remote='dest',
+                progress_callback=None)
             migrate_volume_completion.assert_called_with(
                 self.context, volume.id, new_volume_obj.id, error=False)
             self.assertFalse(update_server_volume.called)
 
+    @mock.patch('cinder.compute.API')
+    @mock.patch('cinder.volume.manager.VolumeManager.'
+                'migrate_volume_completion')
+    @mock.patch('cinder.db.sqlalchemy.api.volume_get')
+    def test_migrate_volume_generic_progress(self, volume_get,
+                                             migrate_volume_completion,
+                                             nova_api):
+        self.flags(volume_copy_streams=4)
+        fake_db_new_volume = {'status': 'available', 'id': 'fake_volume_id'}
+        fake_new_volume = fake_volume.fake_db_volume(**fake_db_new_volume)
+        host_obj = {'host': 'newhost', 'capabilities': {}}
+        volume_get.return_value = fake_new_volume
+        volume = tests_utils.create_volume(self.context, size=1,
+                                           host=CONF.host)
+
+        def copy_volume_data(ctxt, src_vol, dest_vol, remote=None,
+                             progress_callback=None):
+            progress_callback(42)
+            self.assertEqual('migrating:42%', volume.migration_status)
+
+        with mock.patch.object(self.volume, '_copy_volume_data',
+                               side_effect=copy_volume_data) as \
+                mock_copy_volume:
+            self.volume._migrate_volume_generic(self.context, volume,
+                                                host_obj, None)
+            self.assertTrue(mock_copy_volume.called)
+
     @mock.patch('cinder.compute.API')
     @mock.patch('cinder.volume.manager.VolumeManager.'
                 'migrate_volume_completion')
@@ -6561,7 +6795,7 @@ class GenericVolumeDriverTestCase(DriverTestCase):
         mock_copy.assert_called_with(
             'foo', 'bar', 1024, '1M',
             throttle=self.volume.driver._throttle,
-            sparse=False)
+            sparse=False, streams=1, bps_limit=0)
         self.assertEqual(detach_expected, mock_detach.mock_calls)
 
         #  Test case for sparse_copy_volume = True
@@ -6577,7 +6811,7 @@ class GenericVolumeDriverTestCase(DriverTestCase):
         mock_copy.assert_called_with(
             'foo', 'bar', 1024, '1M',
             throttle=self.volume.driver._throttle,
-            sparse=True)
+            sparse=True, streams=1, bps_limit=0)
         self.assertEqual(detach_expected, mock_detach.mock_calls)
 
         # cleanup resource
@@ -6627,7 +6861,9 @@ class GenericVolumeDriverTestCase(DriverTestCase):
                                       dest_vol)
 
         self.assertEqual(attach_expected, mock_attach.mock_calls)
-        mock_copy.assert_called_with('foo', 'bar', 1024, '1M', sparse=False)
+        mock_copy.assert_called_with('foo', 'bar', 1024, '1M', sparse=False,
+                                     streams=1, bps_limit=0,
+                                     progress_callback=None)
         self.assertEqual(detach_expected, mock_detach.mock_calls)
 
         #  Test case for sparse_copy_volume = True
@@ -6640,7 +6876,9 @@ class GenericVolumeDriverTestCase(DriverTestCase):
                                       dest_vol)
 
         self.assertEqual(attach_expected, mock_attach.mock_calls)
-        mock_copy.assert_called_with('foo', 'bar', 1024, '1M', sparse=True)
+        mock_copy.assert_called_with('foo', 'bar', 1024, '1M', sparse=True,
+                                     streams=1, bps_limit=0,
+                                     progress_callback=None)
         self.assertEqual(detach_expected, mock_detach.mock_calls)
 
         # cleanup resource
@@ -6712,6 +6950,66 @@ class LVMVolumeDriverTestCase(DriverTestCase):
 
         lvm_driver._delete_volume(fake_snapshot, is_snapshot=True)
 
+    @mock.patch.object(eventlet, 'spawn_n')
+    @mock.patch.object(volutils, 'clear_volume')
+    def test_delete_volume_deferred_clear(self, mock_clear, mock_spawn_n):
+        self.configuration.volume_clear = 'zero'
+        self.configuration.lvm_deferred_clear = True
+        self.configuration.lvm_deferred_clear_workers = 2
+        vg_obj = mock.Mock()
+        lvm_driver = lvm.LVMVolumeDriver(configuration=self.configuration,
+                                         vg_obj=vg_obj, db=db)
+
+        lvm_driver._delete_volume(dict(self.FAKE_VOLUME, size=1))
+        lvm_driver._delete_volume({'name': 'test2', 'id': 'test2',
+                                   'size': 1})
+
+        vg_obj.rename_volume.assert_has_calls(
+            [mock.call('test1', 'reclaim-test1'),
+             mock.call('test2', 'reclaim-test2')])
+        self.assertFalse(vg_obj.delete.called)
+        self.assertFalse(mock_clear.called)
+        self.assertEqual(2, mock_spawn_n.call_count)
+        self.assertEqual({'reclaim-test1', 'reclaim-test2'},
+                         lvm_driver._reclaim_pending)
+        self.assertEqual('reclaim-test1', lvm_driver._reclaim_queue.get())
+
+    @mock.patch.object(os.path, 'exists', return_value=True)
+    @mock.patch.object(volutils, 'clear_volume')
+    def test_reclaim_volume(self, mock_clear, _mock_exists):
+        self.configuration.volume_clear = 'zero'
+        self.configuration.volume_clear_size = 0
+        vg_obj = mock.Mock()
+        vg_obj.get_volume.return_value = {'vg': 'cinder-volumes',
+                                          'name': 'reclaim-test1',
+                                          'size': '2.00'}
+        lvm_driver = lvm.LVMVolumeDriver(configuration=self.configuration,
+                                         vg_obj=vg_obj, db=db)
+
+        lvm_driver._reclaim_volume('reclaim-test1')
+
+        mock_clear.assert_called_once_with(
+            2048, '/dev/mapper/cinder--volumes-reclaim--test1',
+            volume_clear='zero', volume_clear_size=0)
+        vg_obj.delete.assert_called_once_with('reclaim-test1')
+
+    @mock.patch.object(eventlet, 'spawn_n')
+    def test_check_for_setup_error_resumes_reclaim(self, _mock_spawn_n):
+        self.stubs.Set(volutils, 'get_all_volume_groups',
+                       lambda vg: [{'name': 'cinder-volumes'}])
+        self.configuration.lvm_deferred_clear = True
+        vg_obj = mock.Mock(vg_name='cinder-volumes')
+        vg_obj.get_volumes.return_value = [
+            {'vg': 'cinder-volumes', 'name': 'volume-1', 'size': '1.00'},
+            {'vg': 'cinder-volumes', 'name': 'reclaim-volume-2',
+             'size': '2.00'}]
+        lvm_driver = lvm.LVMVolumeDriver(configuration=self.configuration,
+                                         vg_obj=vg_obj, db=db)
+
+        lvm_driver.check_for_setup_error()
+
+        self.assertEqual({'reclaim-volume-2'}, lvm_driver._reclaim_pending)
+
     def test_check_for_setup_error(self):
 
         def get_all_volume_groups(vg):
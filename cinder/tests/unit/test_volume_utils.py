@@ -17,9 +17,12 @@
 
 
 import datetime
+import filecmp
 import io
 import mock
+import os
 import six
+import tempfile
 
 from oslo_concurrency import processutils
 from oslo_config import cfg
@@ -600,6 +603,154 @@ class CopyVolumeTestCase(test.TestCase):
                                               1073741824, mock.ANY)
 
 
+class CopyVolumeInProcessTestCase(test.TestCase):
+    def setUp(self):
+        super(CopyVolumeInProcessTestCase, self).setUp()
+        self.flags(volume_copy_engine='native')
+        self.src = tempfile.NamedTemporaryFile()
+        self.addCleanup(self.src.close)
+        self.dest = tempfile.NamedTemporaryFile()
+        self.addCleanup(self.dest.close)
+
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_native(self, mock_exec):
+        self.src.write(os.urandom(1024 * 1024))
+        self.src.flush()
+        self.dest.write(b'x' * 2 * 1024 * 1024)
+        self.dest.flush()
+        volume_utils.copy_volume(self.src.name, self.dest.name, 1, '1M',
+                                 sync=True)
+        self.assertTrue(filecmp.cmp(self.src.name, self.dest.name,
+                                    shallow=False))
+        self.assertFalse(mock_exec.called)
+
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_native_sparse(self, mock_exec):
+        self.src.write(b'\0' * 512 * 1024)
+        self.src.write(os.urandom(512 * 1024))
+        self.src.write(b'\0' * 1024 * 1024)
+        self.src.flush()
+        volume_utils.copy_volume(self.src.name, self.dest.name, 2, '1M',
+                                 sparse=True)
+        self.assertTrue(filecmp.cmp(self.src.name, self.dest.name,
+                                    shallow=False))
+        self.assertFalse(mock_exec.called)
+
+    def test_copy_fds_sparse_trailing_hole(self):
+        self.src.write(os.urandom(1024 * 1024))
+        self.src.flush()
+        os.ftruncate(self.src.fileno(), 4 * 1024 * 1024)
+
+        copied = volume_utils._copy_fds(self.src.fileno(),
+                                        self.dest.fileno(), 0,
+                                        4 * 1024 * 1024, False, True, False)
+
+        self.assertEqual(4 * 1024 * 1024, copied)
+        self.assertEqual(4 * 1024 * 1024,
+                         os.fstat(self.dest.fileno()).st_size)
+        self.assertTrue(filecmp.cmp(self.src.name, self.dest.name,
+                                    shallow=False))
+
+    def test_copy_range_with_bytearray_buffer(self):
+        # Python 2 copies through a bytearray, maps have no buffer
+        # interface there.
+        data = b'\0' * 512 * 1024 + os.urandom(512 * 1024)
+        self.src.write(data)
+        self.src.flush()
+
+        end = volume_utils._copy_range_with_buffer(
+            self.src.fileno(), self.dest.fileno(), 0, len(data),
+            bytearray(256 * 1024), True)
+
+        self.assertEqual(len(data), end)
+        self.dest.seek(512 * 1024)
+        self.assertEqual(data[512 * 1024:], self.dest.read())
+
+    @mock.patch.object(volume_utils, 'os', wraps=os)
+    def test_copy_buffer_without_readv(self, mock_os):
+        del mock_os.readv
+        self.assertIsInstance(volume_utils._copy_buffer(), bytearray)
+
+    @mock.patch('cinder.volume.utils._copy_volume_with_path')
+    @mock.patch('cinder.volume.utils._copy_volume_in_process')
+    def test_copy_volume_native_throttled(self, mock_native, mock_dd):
+        fake_throttle = throttling.Throttle(['fake_throttle'])
+        volume_utils.copy_volume(self.src.name, self.dest.name, 1, '1M',
+                                 throttle=fake_throttle)
+        volume_utils.copy_volume(self.src.name, self.dest.name, 1, '1M',
+                                 ionice='-c3')
+        volume_utils.copy_volume('/dev/zero', self.dest.name, 1, '1M')
+        self.assertFalse(mock_native.called)
+        self.assertEqual(3, mock_dd.call_count)
+
+    @mock.patch.dict('cinder.volume.utils._ODIRECT_SUPPORT', clear=True)
+    @mock.patch('cinder.volume.utils._block_device_number', return_value=42)
+    @mock.patch('cinder.volume.utils.check_for_odirect_support',
+                return_value=True)
+    def test_check_for_odirect_support_cached(self, mock_support,
+                                              mock_device):
+        for _i in range(2):
+            self.assertTrue(volume_utils._check_for_odirect_support_cached(
+                '/dev/abc', '/dev/def', 'iflag=direct'))
+            self.assertTrue(volume_utils._check_for_odirect_support_cached(
+                '/dev/abc', '/dev/def', 'oflag=direct'))
+        self.assertEqual(2, mock_support.call_count)
+        mock_device.assert_has_calls([mock.call('/dev/abc'),
+                                      mock.call('/dev/def')])
+
+
+class CopyVolumeParallelTestCase(test.TestCase):
+    @mock.patch('cinder.volume.utils._check_for_odirect_support_cached',
+                return_value=False)
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_parallel_dd(self, mock_exec, mock_support):
+        progress = []
+        volume_utils.copy_volume('/dev/zero', '/dev/null', 256, '1M',
+                                 streams=2, progress_callback=progress.append)
+        self.assertEqual(4, mock_exec.call_count)
+        for offset in range(0, 256, 64):
+            mock_exec.assert_any_call(
+                'dd', 'if=/dev/zero', 'of=/dev/null', 'count=67108864',
+                'skip=%d' % (offset * 1024 * 1024),
+                'seek=%d' % (offset * 1024 * 1024), 'bs=1M',
+                'iflag=count_bytes,skip_bytes', 'oflag=seek_bytes',
+                'conv=notrunc', run_as_root=True)
+        self.assertEqual([25, 50, 75, 100], progress)
+
+    @mock.patch('cinder.volume.utils._check_for_odirect_support_cached',
+                return_value=False)
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_parallel_error(self, mock_exec, mock_support):
+        mock_exec.side_effect = [None, processutils.ProcessExecutionError,
+                                 None, None]
+        self.assertRaises(processutils.ProcessExecutionError,
+                          volume_utils.copy_volume, '/dev/zero', '/dev/null',
+                          256, '1M', streams=2)
+
+    @mock.patch('eventlet.sleep')
+    @mock.patch('cinder.volume.utils._copy_volume_range')
+    def test_copy_volume_parallel_bps_limit(self, mock_copy, mock_sleep):
+        volume_utils.copy_volume('/dev/zero', '/dev/null', 256, '1M',
+                                 bps_limit=64 * 1024 * 1024)
+        self.assertEqual(4, mock_copy.call_count)
+        # Every range waits for the previous ones to be copied at 64 MB/s.
+        delays = [call[0][0] for call in mock_sleep.call_args_list]
+        self.assertEqual([1, 2, 3], [round(delay) for delay in delays])
+
+    @mock.patch.object(volume_utils, '_PARALLEL_COPY_MIN_RANGE_MB', 1)
+    def test_copy_volume_parallel_native(self):
+        self.flags(volume_copy_engine='native')
+        with tempfile.NamedTemporaryFile() as src, \
+                tempfile.NamedTemporaryFile() as dest:
+            src.write(os.urandom(3 * 1024 * 1024))
+            src.flush()
+            progress = []
+            volume_utils.copy_volume(src.name, dest.name, 3, '1M', streams=2,
+                                     progress_callback=progress.append)
+            self.assertTrue(filecmp.cmp(src.name, dest.name, shallow=False))
+            self.assertEqual([33, 66, 100], progress)
+
+
 class VolumeUtilsTestCase(test.TestCase):
     def test_null_safe_str(self):
         self.assertEqual('', volume_utils.null_safe_str(None))
@@ -211,7 +211,8 @@ class API(base.Base):
                availability_zone=None, source_volume=None,
                scheduler_hints=None,
                source_replica=None, consistencygroup=None,
-               cgsnapshot=None, multiattach=False, source_cg=None):
+               cgsnapshot=None, multiattach=False, source_cg=None,
+               scheduler_batch=None):
 
         check_policy(context, 'create')
 
@@ -314,7 +315,8 @@ class API(base.Base):
                                                  availability_zones,
                                                  create_what,
                                                  sched_rpcapi,
-                                                 volume_rpcapi)
+                                                 volume_rpcapi,
+                                                 scheduler_batch)
         except Exception:
             msg = _('Failed to create api volume flow.')
             LOG.exception(msg)
@@ -329,6 +331,81 @@ class API(base.Base):
             LOG.info(_LI("Volume created successfully."), resource=vref)
             return vref
 
+    def create_volumes(self, context, count, size, name, description,
+                       **kwargs):
+        """Create count volumes with the same properties.
+
+        The quota of the whole batch is checked first. The volumes that need
+        to be scheduled are sent to the scheduler in a single request once
+        they are all created, so that it can place them in one pass. If a
+        volume can't be created, the volumes already created are deleted
+        without being scheduled. Returns the created volumes.
+        """
+        self._check_batch_quota(context, count, size,
+                                kwargs.get('volume_type'))
+        batch = []
+        volumes = []
+        try:
+            for _i in range(count):
+                volumes.append(self.create(context, size, name, description,
+                                           scheduler_batch=batch, **kwargs))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for volume in volumes:
+                    try:
+                        self.delete(context, volume)
+                    except Exception:
+                        LOG.exception(_LE("Failed to delete volume %s of "
+                                          "a failed batch."), volume.id)
+        if batch:
+            self._cast_create_volumes(context, batch)
+        return volumes
+
+    def _check_batch_quota(self, context, count, size, volume_type):
+        """Check the quota allows creating count volumes of size GB."""
+        if volume_type is None:
+            volume_type = volume_types.get_default_volume_type()
+        reserve_opts = {'volumes': count, 'gigabytes': count * int(size)}
+        QUOTAS.add_volume_type_opts(context, reserve_opts,
+                                    volume_type.get('id')
+                                    if volume_type else None)
+        try:
+            reservations = QUOTAS.reserve(context, **reserve_opts)
+        except exception.OverQuota as e:
+            overs = e.kwargs['overs']
+            quotas = e.kwargs['quotas']
+            usages = e.kwargs['usages']
+            over_name = next((over for over in overs if 'gigabytes' in over),
+                             None)
+            if over_name:
+                usage = usages[over_name]
+                raise exception.VolumeSizeExceedsAvailableQuota(
+                    name=over_name,
+                    requested=count * int(size),
+                    consumed=usage['reserved'] + usage['in_use'],
+                    quota=quotas[over_name])
+            over_name = next((over for over in overs if 'volumes' in over),
+                             None)
+            if over_name:
+                raise exception.VolumeLimitExceeded(
+                    allowed=quotas[over_name], name=over_name)
+            raise
+        # Each volume reserves its own quota as it is created.
+        QUOTAS.rollback(context, reservations)
+
+    def _cast_create_volumes(self, context, batch):
+        try:
+            self.scheduler_rpcapi.create_volumes(
+                context, CONF.volume_topic,
+                [request_spec for request_spec, _props in batch],
+                [filter_properties for _spec, filter_properties in batch])
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for request_spec, _props in batch:
+                    self.db.volume_update(context,
+                                          request_spec['volume_id'],
+                                          {'status': 'error'})
+
     @wrap_check_policy
     def delete(self, context, volume,
                force=False,
@@ -117,6 +117,28 @@ volume_opts = [
                default='1M',
                help='The default block size used when copying/clearing '
                     'volumes'),
+    cfg.StrOpt('volume_copy_engine',
+               default='dd',
+               choices=['dd', 'native'],
+               help='How volumes are copied between local block devices and '
+                    'files. dd runs the dd command, native copies them in '
+                    'the volume service with copy_file_range, sendfile or '
+                    'O_DIRECT I/O and skips the holes of sparse copies. '
+                    'Throttled copies and copies using ionice always use '
+                    'dd.'),
+    cfg.IntOpt('volume_copy_streams',
+               default=1,
+               min=1,
+               help='Number of concurrent streams copying the data of a '
+                    'volume to another volume, when volumes are migrated '
+                    'or copied by the volume service. Each stream copies '
+                    'its own ranges of the volume.'),
+    cfg.IntOpt('volume_copy_operation_bps_limit',
+               default=0,
+               min=0,
+               help='The upper limit of the average bandwidth of a single '
+                    'copy of a volume to another volume, whatever its number '
+                    'of streams, in bytes per second. 0 => unlimited'),
     cfg.StrOpt('volume_copy_blkio_cgroup_name',
                default='cinder-volume-copy',
                help='The blkio cgroup name to be used to limit bandwidth '
@@ -138,6 +160,16 @@ volume_opts = [
                     'Only used for tgtadm to specify backing device flags '
                     'using bsoflags option. The specified string is passed '
                     'as is to the underlying tool.'),
+    cfg.FloatOpt('iscsi_target_batch_window',
+                 default=0,
+                 min=0,
+                 help='Number of seconds during which the tgtadm and lioadm '
+                      'helpers reuse a single listing of the iSCSI targets '
+                      'to recreate the exports of the in-use volumes when '
+                      'the service starts, and during which lioadm saves '
+                      'its configuration changes together. 0 lists the '
+                      'targets and saves the LIO configuration for every '
+                      'volume.'),
     cfg.StrOpt('iscsi_protocol',
                default='iscsi',
                choices=['iscsi', 'iser'],
@@ -793,7 +825,9 @@ class BaseVD(object):
                 size_in_mb,
                 self.configuration.volume_dd_blocksize,
                 throttle=self._throttle,
-                sparse=sparse_copy_volume)
+                sparse=sparse_copy_volume,
+                streams=self.configuration.volume_copy_streams,
+                bps_limit=self.configuration.volume_copy_operation_bps_limit)
             copy_error = False
         except Exception:
             with excutils.save_and_reraise_exception():
@@ -19,6 +19,8 @@ import math
 import os
 import socket
 
+import eventlet
+from eventlet import queue
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -68,12 +70,38 @@ volume_opts = [
                  help='max_over_subscription_ratio setting for the LVM '
                       'driver.  If set, this takes precedence over the '
                       'general max_over_subscription_ratio option.  If '
-                      'None, the general option is used.')
+                      'None, the general option is used.'),
+    cfg.IntOpt('lvm_metadata_cache_ttl',
+               default=0,
+               min=0,
+               help='Number of seconds the logical volumes of the volume '
+                    'group, listed by a single lvs command, are used to '
+                    'answer the queries of the LVM driver. The logical '
+                    'volumes created, extended, renamed or deleted by the '
+                    'driver are updated in place. 0 runs an LVM command '
+                    'for each query.'),
+    cfg.BoolOpt('lvm_deferred_clear',
+                default=False,
+                help='Rename the deleted volumes and clear them with the '
+                     'volume_clear method in the background, instead of '
+                     'clearing them before the delete request completes. '
+                     'The volumes waiting to be cleared are reported as '
+                     'reclaiming_capacity_gb and are queued again when the '
+                     'service restarts. Snapshots are still cleared when '
+                     'they are deleted and thin volumes are not cleared.'),
+    cfg.IntOpt('lvm_deferred_clear_workers',
+               default=1,
+               min=1,
+               help='Number of deleted volumes cleared at the same time '
+                    'when lvm_deferred_clear is enabled.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(volume_opts)
 
+# Prefix of the LVs of the deleted volumes waiting to be cleared.
+RECLAIM_PREFIX = 'reclaim-'
+
 
 class LVMVolumeDriver(driver.VolumeDriver):
     """Executes commands relating to Volumes."""
@@ -108,6 +136,9 @@ class LVMVolumeDriver(driver.VolumeDriver):
             executor=self._execute)
         self.protocol = self.target_driver.protocol
         self._sparse_copy_volume = False
+        self._reclaim_queue = queue.LightQueue()
+        self._reclaim_pending = set()
+        self._reclaim_workers = 0
 
         if self.configuration.lvm_max_over_subscription_ratio is not None:
             self.configuration.max_over_subscription_ratio = \
@@ -123,6 +154,11 @@ class LVMVolumeDriver(driver.VolumeDriver):
         """Deletes a logical volume."""
         if self.configuration.volume_clear != 'none' and \
                 self.configuration.lvm_type != 'thin':
+            if self.configuration.lvm_deferred_clear and not is_snapshot:
+                reclaim_name = RECLAIM_PREFIX + volume['name']
+                self.vg.rename_volume(volume['name'], reclaim_name)
+                self._queue_reclaim(reclaim_name)
+                return
             self._clear_volume(volume, is_snapshot)
 
         name = volume['name']
@@ -169,6 +205,41 @@ class LVMVolumeDriver(driver.VolumeDriver):
             volume_clear=self.configuration.volume_clear,
             volume_clear_size=self.configuration.volume_clear_size)
 
+    def _queue_reclaim(self, name):
+        """Queues a renamed LV to be cleared and deleted in background."""
+        if name in self._reclaim_pending:
+            return
+        self._reclaim_pending.add(name)
+        self._reclaim_queue.put(name)
+        while (self._reclaim_workers <
+               self.configuration.lvm_deferred_clear_workers):
+            self._reclaim_workers += 1
+            eventlet.spawn_n(self._reclaim_worker)
+
+    def _reclaim_worker(self):
+        while True:
+            name = self._reclaim_queue.get()
+            try:
+                self._reclaim_volume(name)
+            except Exception:
+                LOG.exception(_LE('Failed to clear the logical volume %s, '
+                                  'it will be cleared again when the '
+                                  'service restarts.'), name)
+            finally:
+                self._reclaim_pending.discard(name)
+
+    def _reclaim_volume(self, name):
+        """Clears and deletes the LV of a deleted volume."""
+        lv = self.vg.get_volume(name)
+        if lv is None:
+            return
+
+        # The LVs of the volumes have a whole number of GB.
+        self._clear_volume({'name': name, 'id': name,
+                            'size': int(round(float(lv['size'])))})
+        self.vg.delete(name)
+        LOG.info(_LI('Cleared and deleted the logical volume: %s'), name)
+
     def _escape_snapshot(self, snapshot_name):
         # Linux LVM reserves name that starts with snapshot, so that
         # such volume name can't be created. Mangle it.
@@ -236,8 +307,14 @@ class LVMVolumeDriver(driver.VolumeDriver):
         thin_enabled = self.configuration.lvm_type == 'thin'
 
         # Calculate the total volumes used by the VG group.
-        # This includes volumes and snapshots.
-        total_volumes = len(self.vg.get_volumes())
+        # This includes volumes and snapshots, but not the deleted
+        # volumes waiting to be cleared.
+        lvs = self.vg.get_volumes()
+        reclaiming = [lv for lv in lvs
+                      if lv['name'].startswith(RECLAIM_PREFIX)]
+        total_volumes = len(lvs) - len(reclaiming)
+        reclaiming_capacity = round(
+            sum(float(lv['size']) for lv in reclaiming), 2)
 
         # Skip enabled_pools setting, treat the whole backend as one pool
         # XXX FIXME if multipool support is added to LVM driver.
@@ -250,6 +327,7 @@ class LVMVolumeDriver(driver.VolumeDriver):
             location_info=location_info,
             QoS_support=False,
             provisioned_capacity_gb=provisioned_capacity,
+            reclaiming_capacity_gb=reclaiming_capacity,
             max_over_subscription_ratio=(
                 self.configuration.max_over_subscription_ratio),
             thin_provisioning_support=thin_enabled,
@@ -276,11 +354,13 @@ class LVMVolumeDriver(driver.VolumeDriver):
                 lvm_conf_file = None
 
             try:
-                self.vg = lvm.LVM(self.configuration.volume_group,
-                                  root_helper,
-                                  lvm_type=self.configuration.lvm_type,
-                                  executor=self._execute,
-                                  lvm_conf=lvm_conf_file)
+                self.vg = lvm.LVM(
+                    self.configuration.volume_group,
+                    root_helper,
+                    lvm_type=self.configuration.lvm_type,
+                    executor=self._execute,
+                    lvm_conf=lvm_conf_file,
+                    cache_ttl=self.configuration.lvm_metadata_cache_ttl)
 
             except exception.VolumeGroupNotFound:
                 message = (_("Volume Group %s does not exist") %
@@ -336,6 +416,12 @@ class LVMVolumeDriver(driver.VolumeDriver):
             # Enable sparse copy since lvm_type is 'thin'
             self._sparse_copy_volume = True
 
+        if self.configuration.lvm_deferred_clear:
+            # Resume the clearing of the volumes deleted before a restart.
+            for lv in self.vg.get_volumes():
+                if lv['name'].startswith(RECLAIM_PREFIX):
+                    self._queue_reclaim(lv['name'])
+
     def create_volume(self, volume):
         """Creates a logical volume."""
         mirror_count = 0
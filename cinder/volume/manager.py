@@ -39,6 +39,7 @@ intact.
 
 import time
 
+from eventlet import greenpool
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
@@ -94,6 +95,25 @@ volume_manager_opts = [
                 default=False,
                 help='Offload pending volume delete during '
                      'volume service startup'),
+    cfg.IntOpt('volume_service_inithost_export_workers',
+               default=1,
+               min=1,
+               help='Number of in-use volumes re-exported at the same time '
+                    'during volume service startup'),
+    cfg.BoolOpt('volume_service_inithost_background_export',
+                default=False,
+                help='Re-export the in-use volumes in background once the '
+                     'volume service has started, instead of before it '
+                     'starts. The backend reports recovering in its '
+                     'capabilities until all the volumes are re-exported.'),
+    cfg.IntOpt('allocated_capacity_reconcile_interval',
+               default=0,
+               min=0,
+               help='Interval in seconds between the recounts of the '
+                    'capacity allocated in each pool from the database. '
+                    'A pool whose reported allocated capacity differs '
+                    'from the count of two recounts in a row is '
+                    'corrected. 0 disables the recounts.'),
     cfg.StrOpt('zoning_mode',
                help='FC Zoning mode configured'),
     cfg.StrOpt('extra_capabilities',
@@ -226,6 +246,9 @@ class VolumeManager(manager.SchedulerDependentManager):
         self.configuration = config.Configuration(volume_manager_opts,
                                                   config_group=service_name)
         self.stats = {}
+        self._recovering = False
+        self._last_capacity_reconcile = time.time()
+        self._capacity_drift = {}
 
         if not volume_driver:
             # Get from configuration, which will get the default
@@ -300,45 +323,130 @@ class VolumeManager(manager.SchedulerDependentManager):
     def _add_to_threadpool(self, func, *args, **kwargs):
         self._tp.spawn_n(func, *args, **kwargs)
 
-    def _count_allocated_capacity(self, ctxt, volume):
-        pool = vol_utils.extract_host(volume['host'], 'pool')
-        if pool is None:
-            # No pool name encoded in host, so this is a legacy
-            # volume created before pool is introduced, ask
-            # driver to provide pool info if it has such
-            # knowledge and update the DB.
-            try:
-                pool = self.driver.get_pool(volume)
-            except Exception:
-                LOG.exception(_LE('Fetch volume pool name failed.'),
-                              resource=volume)
-                return
+    def _ensure_export(self, ctxt, volume):
+        # The exports may be recovered in the background while the volume
+        # is detached or deleted, so the volume is only re-exported, and
+        # set to error, if it is still in use.
+        try:
+            volume.refresh()
+        except exception.VolumeNotFound:
+            LOG.info(_LI("Volume deleted, skipping re-export."),
+                     resource=volume)
+            return
+        if volume.status != 'in-use':
+            LOG.info(_LI("Volume is %(status)s, skipping re-export."),
+                     {'status': volume.status}, resource=volume)
+            return
 
-            if pool:
-                new_host = vol_utils.append_host(volume['host'],
-                                                 pool)
-                self.db.volume_update(ctxt, volume['id'],
-                                      {'host': new_host})
-            else:
+        try:
+            self.driver.ensure_export(ctxt, volume)
+        except Exception:
+            LOG.exception(_LE("Failed to re-export volume, "
+                              "setting to ERROR."),
+                          resource=volume)
+            volume.conditional_update({'status': 'error'},
+                                      {'status': 'in-use'})
+
+    def _ensure_exports(self, ctxt, volumes):
+        """Re-exports the volumes on a bounded pool of greenthreads."""
+        pool = greenpool.GreenPool(
+            CONF.volume_service_inithost_export_workers)
+        for volume in volumes:
+            pool.spawn_n(self._ensure_export, ctxt, volume)
+        pool.waitall()
+
+    def _recover_exports(self, ctxt, volumes):
+        try:
+            self._ensure_exports(ctxt, volumes)
+        finally:
+            self._recovering = False
+        LOG.info(_LI("Re-exported %d volume(s) in background."),
+                 len(volumes))
+        self.publish_service_capabilities(ctxt)
+
+    def _set_volume_pool(self, ctxt, volume):
+        """Adds the pool of a volume created before pools to its host."""
+        # No pool name encoded in host, so this is a legacy volume created
+        # before pool is introduced, ask driver to provide pool info if it
+        # has such knowledge and update the DB.
+        try:
+            pool = self.driver.get_pool(volume)
+        except Exception:
+            LOG.exception(_LE('Fetch volume pool name failed.'),
+                          resource=volume)
+            return
+
+        if pool:
+            new_host = vol_utils.append_host(volume['host'], pool)
+            self.db.volume_update(ctxt, volume['id'], {'host': new_host})
+
+    def _count_allocated_capacity(self, ctxt):
+        """Returns the capacity allocated in each pool of this host.
+
+        The volumes are summed by host and pool in the database. Every
+        volume is counted but those that have not been created yet or
+        failed to be, like the allocated capacity is only increased once a
+        volume is created and decreased once it is deleted.
+        """
+        volume_data = self.db.volume_data_get_by_host(
+            ctxt, self.host,
+            exclude_statuses=['creating', 'downloading', 'error'])
+        pools = {}
+        for volume_host, (_count, gigabytes) in volume_data.items():
+            pool = vol_utils.extract_host(volume_host, 'pool')
+            if pool is None:
                 # Otherwise, put them into a special fixed pool with
                 # volume_backend_name being the pool name, if
                 # volume_backend_name is None, use default pool name.
                 # This is only for counting purpose, doesn't update DB.
                 pool = (self.driver.configuration.safe_get(
                     'volume_backend_name') or vol_utils.extract_host(
-                    volume['host'], 'pool', True))
-        try:
-            pool_stat = self.stats['pools'][pool]
-        except KeyError:
-            # First volume in the pool
-            self.stats['pools'][pool] = dict(
-                allocated_capacity_gb=0)
-            pool_stat = self.stats['pools'][pool]
-        pool_sum = pool_stat['allocated_capacity_gb']
-        pool_sum += volume['size']
+                    volume_host, 'pool', True))
+            pool_stats = pools.setdefault(pool,
+                                          dict(allocated_capacity_gb=0))
+            pool_stats['allocated_capacity_gb'] += gigabytes
+        return pools
 
-        self.stats['pools'][pool]['allocated_capacity_gb'] = pool_sum
-        self.stats['allocated_capacity_gb'] += volume['size']
+    @periodic_task.periodic_task
+    def _reconcile_allocated_capacity(self, context):
+        """Corrects the allocated capacity of the pools from the database.
+
+        The pools are only corrected when two recounts in a row disagree
+        with the stats in the same way, so that the volumes being created,
+        deleted or changed during a recount don't make them flap.
+        """
+        interval = CONF.allocated_capacity_reconcile_interval
+        if not interval or not self.driver.initialized:
+            return
+        if time.time() - self._last_capacity_reconcile < interval:
+            return
+        self._last_capacity_reconcile = time.time()
+
+        pools = self._count_allocated_capacity(context)
+        drift = {}
+        for pool in set(pools) | set(self.stats['pools']):
+            counted = pools.get(pool, {}).get('allocated_capacity_gb', 0)
+            pool_stats = self.stats['pools'].get(pool, {})
+            if counted != pool_stats.get('allocated_capacity_gb', 0):
+                drift[pool] = counted
+
+        previous_drift = self._capacity_drift
+        self._capacity_drift = {}
+        for pool, counted in drift.items():
+            if previous_drift.get(pool) != counted:
+                self._capacity_drift[pool] = counted
+                continue
+            pool_stats = self.stats['pools'].setdefault(
+                pool, dict(allocated_capacity_gb=0))
+            LOG.warning(_LW("Correcting the allocated capacity of pool "
+                            "%(pool)s from %(reported)s GB to %(counted)s "
+                            "GB."),
+                        {'pool': pool,
+                         'reported': pool_stats['allocated_capacity_gb'],
+                         'counted': counted})
+            self.stats['allocated_capacity_gb'] += (
+                counted - pool_stats['allocated_capacity_gb'])
+            pool_stats['allocated_capacity_gb'] = counted
 
     def _set_voldb_empty_at_startup_indicator(self, ctxt):
         """Determine if the Cinder volume DB is empty.
@@ -421,24 +529,17 @@ class VolumeManager(manager.SchedulerDependentManager):
         self._sync_provider_info(ctxt, volumes, snapshots)
         # FIXME volume count for exporting is wrong
 
+        exports = []
         try:
-            self.stats['pools'] = {}
-            self.stats.update({'allocated_capacity_gb': 0})
             for volume in volumes:
                 # available volume should also be counted into allocated
                 if volume['status'] in ['in-use', 'available']:
-                    # calculate allocated capacity for driver
-                    self._count_allocated_capacity(ctxt, volume)
+                    if vol_utils.extract_host(volume['host'],
+                                              'pool') is None:
+                        self._set_volume_pool(ctxt, volume)
 
-                    try:
-                        if volume['status'] in ['in-use']:
-                            self.driver.ensure_export(ctxt, volume)
-                    except Exception:
-                        LOG.exception(_LE("Failed to re-export volume, "
-                                          "setting to ERROR."),
-                                      resource=volume)
-                        volume.status = 'error'
-                        volume.save()
+                    if volume['status'] in ['in-use']:
+                        exports.append(volume)
                 elif volume['status'] in ('downloading', 'creating'):
                     LOG.warning(_LW("Detected volume stuck "
                                     "in %(curr_status)s "
@@ -456,6 +557,14 @@ class VolumeManager(manager.SchedulerDependentManager):
                             ctxt, volume.id)
                 else:
                     pass
+            # calculate allocated capacity for driver
+            self.stats['pools'] = self._count_allocated_capacity(ctxt)
+            self.stats['allocated_capacity_gb'] = sum(
+                pool['allocated_capacity_gb']
+                for pool in self.stats['pools'].values())
+
+            if not CONF.volume_service_inithost_background_export:
+                self._ensure_exports(ctxt, exports)
             snapshots = objects.SnapshotList.get_by_host(
                 ctxt, self.host, {'status': 'creating'})
             for snapshot in snapshots:
@@ -487,6 +596,11 @@ class VolumeManager(manager.SchedulerDependentManager):
                 LOG.info(_LI("Resume volume delete completed successfully."),
                          resource=volume)
 
+        if CONF.volume_service_inithost_background_export and exports:
+            # The backend can be used while the volumes are re-exported.
+            self._recovering = True
+            self._add_to_threadpool(self._recover_exports, ctxt, exports)
+
         # collect and publish service capabilities
         self.publish_service_capabilities(ctxt)
 
@@ -1639,8 +1753,12 @@ class VolumeManager(manager.SchedulerDependentManager):
                     LOG.error(_LE('Unable to terminate volume connection: '
                                   '%(err)s.') % {'err': err})
 
-    def _copy_volume_data(self, ctxt, src_vol, dest_vol, remote=None):
-        """Copy data from src_vol to dest_vol."""
+    def _copy_volume_data(self, ctxt, src_vol, dest_vol, remote=None,
+                          progress_callback=None):
+        """Copy data from src_vol to dest_vol.
+
+        progress_callback is called with the percentage of the data copied.
+        """
 
         LOG.debug('copy_data_between_volumes %(src)s -> %(dest)s.',
                   {'src': src_vol['name'], 'dest': dest_vol['name']})
@@ -1672,11 +1790,15 @@ class VolumeManager(manager.SchedulerDependentManager):
         copy_error = True
         try:
             size_in_mb = int(src_vol['size']) * units.Ki    # vol size is in GB
-            vol_utils.copy_volume(src_attach_info['device']['path'],
-                                  dest_attach_info['device']['path'],
-                                  size_in_mb,
-                                  self.configuration.volume_dd_blocksize,
-                                  sparse=sparse_copy_volume)
+            vol_utils.copy_volume(
+                src_attach_info['device']['path'],
+                dest_attach_info['device']['path'],
+                size_in_mb,
+                self.configuration.volume_dd_blocksize,
+                sparse=sparse_copy_volume,
+                streams=self.configuration.volume_copy_streams,
+                bps_limit=self.configuration.volume_copy_operation_bps_limit,
+                progress_callback=progress_callback)
             copy_error = False
         except Exception:
             with excutils.save_and_reraise_exception():
@@ -1743,7 +1865,25 @@ class VolumeManager(manager.SchedulerDependentManager):
         try:
             attachments = volume.volume_attachment
             if not attachments:
-                self._copy_volume_data(ctxt, volume, new_volume, remote='dest')
+                def _update_progress(percent):
+                    # Progress is informative, failing to save it must not
+                    # fail the copy.
+                    try:
+                        volume.migration_status = 'migrating:%d%%' % percent
+                        volume.save()
+                    except Exception:
+                        LOG.warning(_LW("Failed to save the migration "
+                                        "progress of volume %s."), volume.id)
+
+                # The progress is only known when the volume is copied by
+                # ranges, a single stream copy keeps the 'migrating' status.
+                if self.configuration.volume_copy_streams > 1:
+                    progress_callback = _update_progress
+                else:
+                    progress_callback = None
+                self._copy_volume_data(ctxt, volume, new_volume,
+                                       remote='dest',
+                                       progress_callback=progress_callback)
                 # The above call is synchronous so we complete the migration
                 self.migrate_volume_completion(ctxt, volume.id,
                                                new_volume.id,
@@ -1768,7 +1908,7 @@ class VolumeManager(manager.SchedulerDependentManager):
                                 clean_db_only=False):
         # If we're in the migrating phase, we need to cleanup
         # destination volume because source volume is remaining
-        if volume.migration_status == 'migrating':
+        if (volume.migration_status or '').startswith('migrating'):
             try:
                 if clean_db_only:
                     # The temporary volume is not created, only DB data
@@ -1984,6 +2124,9 @@ class VolumeManager(manager.SchedulerDependentManager):
                 volume_stats = (
                     self._append_filter_goodness_functions(volume_stats))
 
+                if self._recovering:
+                    volume_stats['recovering'] = True
+
                 # queue it to be sent to the Schedulers.
                 self.update_service_capabilities(volume_stats)
 
@@ -2143,8 +2286,9 @@ class VolumeManager(manager.SchedulerDependentManager):
                 volume.update(status_update)
                 volume.save()
             finally:
-                QUOTAS.rollback(context, old_reservations)
-                QUOTAS.rollback(context, new_reservations)
+                # Roll both back in a single transaction.
+                QUOTAS.rollback(context, (old_reservations or []) +
+                                (new_reservations or []))
 
         context = ctxt.elevated()
 
@@ -2291,10 +2435,11 @@ class VolumeManager(manager.SchedulerDependentManager):
             volume.update(model_update)
             volume.save()
 
-        if old_reservations:
-            QUOTAS.commit(context, old_reservations, project_id=project_id)
-        if new_reservations:
-            QUOTAS.commit(context, new_reservations, project_id=project_id)
+        # Commit the reservations of both volume types in a single
+        # transaction.
+        reservations = (old_reservations or []) + (new_reservations or [])
+        if reservations:
+            QUOTAS.commit(context, reservations, project_id=project_id)
         self.publish_service_capabilities(context)
         LOG.info(_LI("Retype volume completed successfully."),
                  resource=volume)
@@ -41,6 +41,8 @@ class ISCSITarget(driver.Target):
             self.configuration.safe_get('iscsi_protocol')
         self.protocol = 'iSCSI'
         self.volumes_dir = self.configuration.safe_get('volumes_dir')
+        self.batch_window = (
+            self.configuration.safe_get('iscsi_target_batch_window') or 0)
 
     def _get_iscsi_properties(self, volume, multipath=False):
         """Gets iscsi configuration
@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
+import eventlet
 from oslo_concurrency import processutils as putils
 from oslo_log import log as logging
 
@@ -30,6 +33,9 @@ class LioAdm(iscsi.ISCSITarget):
         # FIXME(jdg): modify executor to use the cinder-rtstool
         self.iscsi_target_prefix =\
             self.configuration.safe_get('iscsi_target_prefix')
+        self._targets = None
+        self._targets_time = 0
+        self._unsaved_volumes = set()
 
         self._verify_rtstool()
 
@@ -76,7 +82,31 @@ class LioAdm(iscsi.ISCSITarget):
         iscsi_target = 0  # NOTE: Not used by lio.
         return iscsi_target, lun
 
+    def _get_cached_targets(self):
+        """Returns the targets, listed at most once per batch_window."""
+        if (self._targets is None or
+                time.time() - self._targets_time > self.batch_window):
+            self._targets = self._get_targets()
+            self._targets_time = time.time()
+        return self._targets
+
     def _persist_configuration(self, vol_id):
+        if self.batch_window:
+            # Save the changes made within the window together.
+            if not self._unsaved_volumes:
+                eventlet.spawn_after(self.batch_window,
+                                     self._save_unsaved_configuration)
+            self._unsaved_volumes.add(vol_id)
+            return
+
+        self._save_configuration(vol_id)
+
+    def _save_unsaved_configuration(self):
+        vol_ids = ', '.join(sorted(self._unsaved_volumes))
+        self._unsaved_volumes = set()
+        self._save_configuration(vol_ids)
+
+    def _save_configuration(self, vol_id):
         try:
             self._execute('cinder-rtstool', 'save', run_as_root=True)
 
@@ -208,9 +238,12 @@ class LioAdm(iscsi.ISCSITarget):
         """Recreate exports for logical volumes."""
 
         # Restore saved configuration file if no target exists.
-        if not self._get_targets():
+        targets = (self._get_cached_targets() if self.batch_window
+                   else self._get_targets())
+        if not targets:
             LOG.info(_LI('Restoring iSCSI target from configuration file'))
             self._restore_configuration()
+            self._targets = None
             return
 
         LOG.info(_LI("Skipping ensure_export. Found existing iSCSI target."))
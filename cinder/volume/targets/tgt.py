@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import logging as py_logging
 import os
 import textwrap
 import time
@@ -47,9 +48,15 @@ class TgtAdm(iscsi.ISCSITarget):
 
     def __init__(self, *args, **kwargs):
         super(TgtAdm, self).__init__(*args, **kwargs)
+        self._targets = None
+        self._targets_time = 0
 
     def _get_target(self, iqn):
         (out, err) = utils.execute('tgt-admin', '--show', run_as_root=True)
+        return self._parse_target(out, iqn)
+
+    @staticmethod
+    def _parse_target(out, iqn):
         lines = out.split('\n')
         for line in lines:
             if iqn in line:
@@ -60,11 +67,15 @@ class TgtAdm(iscsi.ISCSITarget):
         return None
 
     def _verify_backing_lun(self, iqn, tid):
+        (out, err) = utils.execute('tgt-admin', '--show', run_as_root=True)
+        return self._parse_backing_lun(out, iqn, tid)
+
+    @staticmethod
+    def _parse_backing_lun(out, iqn, tid):
         backing_lun = True
         capture = False
         target_info = []
 
-        (out, err) = utils.execute('tgt-admin', '--show', run_as_root=True)
         lines = out.split('\n')
 
         for line in lines:
@@ -106,6 +117,15 @@ class TgtAdm(iscsi.ISCSITarget):
             LOG.debug('StdOut from recreate backing lun: %s', out)
             LOG.debug('StdErr from recreate backing lun: %s', err)
 
+    def _get_targets(self):
+        """Returns the tgt-admin --show output, reused for batch_window."""
+        if (self._targets is None or
+                time.time() - self._targets_time > self.batch_window):
+            (self._targets, err) = utils.execute('tgt-admin', '--show',
+                                                 run_as_root=True)
+            self._targets_time = time.time()
+        return self._targets
+
     def _get_iscsi_target(self, context, vol_id):
         return 0
 
@@ -130,15 +150,17 @@ class TgtAdm(iscsi.ISCSITarget):
         # NOTE(jdg): Remove this when we get to the bottom of bug: #1398078
         # for now, since we intermittently hit target already exists we're
         # adding some debug info to try and pinpoint what's going on
-        (out, err) = utils.execute('tgtadm',
-                                   '--lld',
-                                   'iscsi',
-                                   '--op',
-                                   'show',
-                                   '--mode',
-                                   'target',
-                                   run_as_root=True)
-        LOG.debug("Targets prior to update: %s", out)
+        debug = LOG.isEnabledFor(py_logging.DEBUG)
+        if debug:
+            (out, err) = utils.execute('tgtadm',
+                                       '--lld',
+                                       'iscsi',
+                                       '--op',
+                                       'show',
+                                       '--mode',
+                                       'target',
+                                       run_as_root=True)
+            LOG.debug("Targets prior to update: %s", out)
         fileutils.ensure_tree(self.volumes_dir)
 
         vol_id = name.split(':')[1]
@@ -205,15 +227,16 @@ class TgtAdm(iscsi.ISCSITarget):
         # Grab targets list for debug
         # Consider adding a check for lun 0 and 1 for tgtadm
         # before considering this as valid
-        (out, err) = utils.execute('tgtadm',
-                                   '--lld',
-                                   'iscsi',
-                                   '--op',
-                                   'show',
-                                   '--mode',
-                                   'target',
-                                   run_as_root=True)
-        LOG.debug("Targets after update: %s", out)
+        if debug:
+            (out, err) = utils.execute('tgtadm',
+                                       '--lld',
+                                       'iscsi',
+                                       '--op',
+                                       'show',
+                                       '--mode',
+                                       'target',
+                                       run_as_root=True)
+            LOG.debug("Targets after update: %s", out)
 
         iqn = '%s%s' % (self.iscsi_target_prefix, vol_id)
         tid = self._get_target(iqn)
@@ -247,8 +270,30 @@ class TgtAdm(iscsi.ISCSITarget):
 
         return tid
 
+    def ensure_export(self, context, volume, volume_path):
+        """Recreates an export for a logical volume.
+
+        When batch_window is set, the targets are listed once for all the
+        volumes exported within the window, and the targets found with
+        their backing lun and persistence file are left as they are.
+        """
+        if self.batch_window:
+            iqn = '%s%s' % (self.iscsi_target_prefix, volume['name'])
+            out = self._get_targets()
+            tid = self._parse_target(out, iqn)
+            if (tid is not None and
+                    self._parse_backing_lun(out, iqn, tid) and
+                    os.path.exists(os.path.join(self.volumes_dir,
+                                                volume['name']))):
+                LOG.debug('Skipping ensure_export, found the target %s.',
+                          iqn)
+                return
+
+        super(TgtAdm, self).ensure_export(context, volume, volume_path)
+
     def remove_iscsi_target(self, tid, lun, vol_id, vol_name, **kwargs):
         LOG.info(_LI('Removing iscsi_target for Volume ID: %s'), vol_id)
+        self._targets = None
         vol_uuid_file = vol_name
         volume_path = os.path.join(self.volumes_dir, vol_uuid_file)
         if not os.path.exists(volume_path):
@@ -16,8 +16,18 @@
 
 
 import ast
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import fcntl
 import math
+import mmap
+import os
 import re
+import stat
+import struct
+import sys
 import time
 import uuid
 
@@ -47,6 +57,23 @@ CONF = cfg.CONF
 
 LOG = logging.getLogger(__name__)
 
+# Linux ioctl and fallocate(2) flags used to zero byte ranges without
+# writing zeroes.
+_BLKZEROOUT = 0x127f
+_FALLOC_FL_KEEP_SIZE = 0x01
+_FALLOC_FL_PUNCH_HOLE = 0x02
+_SEEK_DATA = getattr(os, 'SEEK_DATA', 3)
+_SEEK_HOLE = getattr(os, 'SEEK_HOLE', 4)
+_LIBC = None
+
+# Size of the buffers of in-process volume copies.
+_COPY_BUFFER_SIZE = 4 * units.Mi
+# Largest and smallest ranges copied by a stream of parallel volume copies.
+_PARALLEL_COPY_RANGE_MB = units.Ki
+_PARALLEL_COPY_MIN_RANGE_MB = 64
+# O_DIRECT support of block devices, by device number and direction.
+_ODIRECT_SUPPORT = {}
+
 
 def null_safe_str(s):
     return str(s) if s else ''
@@ -312,34 +339,72 @@ def check_for_odirect_support(src, dest, flag='oflag=direct'):
         return False
 
 
+def _block_device_number(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if stat.S_ISBLK(st.st_mode):
+        return st.st_rdev
+    return None
+
+
+def _check_for_odirect_support_cached(src, dest, flag):
+    """check_for_odirect_support, probing every block device only once."""
+    device = _block_device_number(src if flag.startswith('iflag') else dest)
+    if device is None:
+        return check_for_odirect_support(src, dest, flag)
+    key = (device, flag.split('=')[0])
+    if key not in _ODIRECT_SUPPORT:
+        _ODIRECT_SUPPORT[key] = check_for_odirect_support(src, dest, flag)
+    return _ODIRECT_SUPPORT[key]
+
+
 def _copy_volume_with_path(prefix, srcstr, deststr, size_in_m, blocksize,
                            sync=False, execute=utils.execute, ionice=None,
-                           sparse=False):
+                           sparse=False, offset_in_m=None):
+    """Copy a volume with dd.
+
+    When offset_in_m is given, only the size_in_m MB at this offset are
+    copied and the rest of the destination is left untouched.
+    """
     # Use O_DIRECT to avoid thrashing the system buffer cache
-    extra_flags = []
-    if check_for_odirect_support(srcstr, deststr, 'iflag=direct'):
-        extra_flags.append('iflag=direct')
+    iflags = []
+    oflags = []
+    if _check_for_odirect_support_cached(srcstr, deststr, 'iflag=direct'):
+        iflags.append('direct')
 
-    if check_for_odirect_support(srcstr, deststr, 'oflag=direct'):
-        extra_flags.append('oflag=direct')
+    if _check_for_odirect_support_cached(srcstr, deststr, 'oflag=direct'):
+        oflags.append('direct')
 
     # If the volume is being unprovisioned then
     # request the data is persisted before returning,
     # so that it's not discarded from the cache.
     conv = []
-    if sync and not extra_flags:
+    if sync and not iflags and not oflags:
         conv.append('fdatasync')
     if sparse:
         conv.append('sparse')
-    if conv:
-        conv_options = 'conv=' + ",".join(conv)
-        extra_flags.append(conv_options)
 
     blocksize, count = _calculate_count(size_in_m, blocksize)
-
-    cmd = ['dd', 'if=%s' % srcstr, 'of=%s' % deststr,
-           'count=%d' % count, 'bs=%s' % blocksize]
-    cmd.extend(extra_flags)
+    cmd = ['dd', 'if=%s' % srcstr, 'of=%s' % deststr]
+    if offset_in_m is None:
+        cmd.append('count=%d' % count)
+    else:
+        offset = int(offset_in_m * units.Mi)
+        cmd.extend(['count=%d' % int(size_in_m * units.Mi),
+                    'skip=%d' % offset, 'seek=%d' % offset])
+        iflags.extend(['count_bytes', 'skip_bytes'])
+        oflags.append('seek_bytes')
+        conv.append('notrunc')
+    cmd.append('bs=%s' % blocksize)
+
+    if iflags:
+        cmd.append('iflag=' + ",".join(iflags))
+    if oflags:
+        cmd.append('oflag=' + ",".join(oflags))
+    if conv:
+        cmd.append('conv=' + ",".join(conv))
 
     if ionice is not None:
         cmd = ['ionice', ionice] + cmd
@@ -366,6 +431,251 @@ def _copy_volume_with_path(prefix, srcstr, deststr, size_in_m, blocksize,
              {'size_in_m': size_in_m, 'mbps': mbps})
 
 
+def _native_copy_supported(src, dest):
+    """Whether both paths are block devices or regular files."""
+    for path in (src, dest):
+        try:
+            mode = os.stat(path).st_mode
+        except OSError:
+            return False
+        if not (stat.S_ISBLK(mode) or stat.S_ISREG(mode)):
+            return False
+    return True
+
+
+def _open_for_copy(path, flags, direction):
+    """Open a path with O_DIRECT when it supports it.
+
+    Returns the file descriptor and whether O_DIRECT is used.
+    """
+    device = _block_device_number(path)
+    key = (device, direction)
+    # Without readv data can not be read into aligned buffers.
+    if (hasattr(os, 'O_DIRECT') and hasattr(os, 'readv') and
+            _ODIRECT_SUPPORT.get(key) is not False):
+        try:
+            fd = os.open(path, flags | os.O_DIRECT)
+        except OSError as err:
+            if err.errno != errno.EINVAL:
+                raise
+            if device is not None:
+                _ODIRECT_SUPPORT[key] = False
+        else:
+            if device is not None:
+                _ODIRECT_SUPPORT[key] = True
+            return fd, True
+    return os.open(path, flags), False
+
+
+def _data_extents(fd, start, end):
+    """Yield the (start, end) ranges of a file holding data.
+
+    Files and devices without SEEK_DATA/SEEK_HOLE support are all data.
+    """
+    offset = start
+    while offset < end:
+        try:
+            data = os.lseek(fd, offset, _SEEK_DATA)
+            hole = os.lseek(fd, data, _SEEK_HOLE)
+        except OSError as err:
+            if err.errno == errno.ENXIO:
+                # Only a hole is left.
+                return
+            yield offset, end
+            return
+        if data >= end:
+            return
+        yield data, min(hole, end)
+        offset = hole
+
+
+def _copy_file_range(src_fd, dest_fd, offset, count):
+    if hasattr(os, 'copy_file_range'):
+        return os.copy_file_range(src_fd, dest_fd, count, offset, offset)
+    libc = _libc()
+    src_off = ctypes.c_int64(offset)
+    dest_off = ctypes.c_int64(offset)
+    copied = libc.copy_file_range(src_fd, ctypes.byref(src_off), dest_fd,
+                                  ctypes.byref(dest_off),
+                                  ctypes.c_size_t(count), 0)
+    if copied < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return copied
+
+
+def _sendfile(src_fd, dest_fd, offset, count):
+    os.lseek(dest_fd, offset, os.SEEK_SET)
+    return os.sendfile(dest_fd, src_fd, offset, count)
+
+
+def _copy_range_in_kernel(src_fd, dest_fd, start, end, methods):
+    """Copy a range without copying it to user space.
+
+    methods is the list of the kernel copy functions to try, the ones that
+    are not supported between the two files are removed from it. Returns
+    the offset the copy stopped at.
+    """
+    offset = start
+    while offset < end and methods:
+        try:
+            copied = methods[0](src_fd, dest_fd, offset,
+                                min(_COPY_BUFFER_SIZE * 16, end - offset))
+        except (AttributeError, OSError) as err:
+            if isinstance(err, OSError) and err.errno not in (
+                    errno.ENOSYS, errno.EXDEV, errno.EINVAL,
+                    errno.EOPNOTSUPP, errno.EBADF):
+                raise
+            methods.pop(0)
+            continue
+        if copied == 0:
+            # End of the source.
+            return end
+        offset += copied
+    return offset
+
+
+def _without_odirect(func, fd, *args):
+    """Call func(fd, *args), without O_DIRECT if it rejects the request.
+
+    O_DIRECT I/O sizes must be aligned, which the end of a file may not be.
+    """
+    try:
+        return func(fd, *args)
+    except OSError as err:
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        if err.errno != errno.EINVAL or not flags & os.O_DIRECT:
+            raise
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+    return func(fd, *args)
+
+
+def _read_into(fd, view):
+    if hasattr(os, 'readv'):
+        return os.readv(fd, [view])
+    data = os.read(fd, len(view))
+    view[:len(data)] = data
+    return len(data)
+
+
+def _copy_buffer():
+    """Return the buffer the ranges are copied through.
+
+    Python 2 maps have no buffer interface, so memoryviews can't be made
+    of them. O_DIRECT, which needs aligned buffers, is only used with
+    os.readv, which Python 2 doesn't have either.
+    """
+    if hasattr(os, 'readv'):
+        # Anonymous maps are page aligned, as O_DIRECT requires.
+        return mmap.mmap(-1, _COPY_BUFFER_SIZE)
+    return bytearray(_COPY_BUFFER_SIZE)
+
+
+def _copy_range_with_buffer(src_fd, dest_fd, start, end, buf, skip_zeroes):
+    """Copy a range through an aligned buffer, returning the end offset."""
+    view = memoryview(buf)
+    zeroes = b'\0' * len(buf)
+    offset = start
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    while offset < end:
+        count = _without_odirect(_read_into, src_fd,
+                                 view[:min(len(buf), end - offset)])
+        if count == 0:
+            return end
+        if skip_zeroes and buf[:count] == zeroes[:count]:
+            offset += count
+            continue
+        os.lseek(dest_fd, offset, os.SEEK_SET)
+        written = 0
+        while written < count:
+            written += _without_odirect(os.write, dest_fd,
+                                        view[written:count])
+        offset += count
+    return offset
+
+
+def _copy_fds(src_fd, dest_fd, offset, length, direct, sparse, sync):
+    """Copy length bytes at offset between two file descriptors.
+
+    Runs in a native thread: it must not log or yield to eventlet.
+    """
+    end = offset + length
+    src_size = os.lseek(src_fd, 0, os.SEEK_END)
+    if src_size:
+        end = min(end, src_size)
+    if sparse:
+        extents = _data_extents(src_fd, offset, end)
+    else:
+        extents = [(offset, end)]
+    buf = None
+    methods = [_copy_file_range]
+    if hasattr(os, 'sendfile'):
+        methods.append(_sendfile)
+    for ext_start, ext_end in extents:
+        if not direct and not sparse:
+            ext_start = _copy_range_in_kernel(src_fd, dest_fd, ext_start,
+                                              ext_end, methods)
+        if ext_start < ext_end:
+            if buf is None:
+                buf = _copy_buffer()
+            _copy_range_with_buffer(src_fd, dest_fd, ext_start, ext_end,
+                                    buf, sparse)
+
+    if stat.S_ISREG(os.fstat(dest_fd).st_mode):
+        # Skipped holes and zeroes at the end do not extend the file.
+        if os.fstat(dest_fd).st_size < end:
+            os.ftruncate(dest_fd, end)
+    if sync and not direct:
+        os.fdatasync(dest_fd)
+    return max(0, end - offset)
+
+
+def _copy_volume_in_process(srcstr, deststr, size_in_m, sync=False,
+                            sparse=False, offset_in_m=None):
+    """Copy a volume in the volume service instead of running dd.
+
+    Data is copied in the kernel with copy_file_range or sendfile when
+    possible, and through a reused aligned buffer with O_DIRECT when the
+    paths support it. Sparse copies skip the holes of the source and do
+    not write zero blocks. When offset_in_m is given, only the size_in_m MB
+    at this offset are copied.
+    """
+    dest_flags = os.O_WRONLY
+    if offset_in_m is None:
+        # Like dd, truncate regular files.
+        dest_flags |= os.O_TRUNC
+    with utils.temporary_chown(srcstr):
+        src_fd, src_direct = _open_for_copy(srcstr, os.O_RDONLY, 'iflag')
+    try:
+        with utils.temporary_chown(deststr):
+            dest_fd, dest_direct = _open_for_copy(deststr, dest_flags,
+                                                  'oflag')
+        try:
+            start_time = timeutils.utcnow()
+            copied = tpool.execute(_copy_fds, src_fd, dest_fd,
+                                   int((offset_in_m or 0) * units.Mi),
+                                   int(size_in_m * units.Mi),
+                                   src_direct or dest_direct, sparse, sync)
+            duration = max(1, timeutils.delta_seconds(start_time,
+                                                      timeutils.utcnow()))
+        finally:
+            os.close(dest_fd)
+    finally:
+        os.close(src_fd)
+
+    mbps = (copied / float(units.Mi) / duration)
+    LOG.debug("Volume copy details: src %(src)s, dest %(dest)s, "
+              "size %(sz).2f MB, duration %(duration).2f sec, O_DIRECT "
+              "%(direct)s",
+              {"src": srcstr,
+               "dest": deststr,
+               "sz": size_in_m,
+               "duration": duration,
+               "direct": src_direct or dest_direct})
+    LOG.info(_LI("Volume copy %(size_in_m).2f MB at %(mbps).2f MB/s"),
+             {'size_in_m': size_in_m, 'mbps': mbps})
+
+
 def _open_volume_with_path(path, mode):
     try:
         with utils.temporary_chown(path):
@@ -375,6 +685,13 @@ def _open_volume_with_path(path, mode):
         LOG.error(_LE("Failed to open volume from %(path)s."), {'path': path})
 
 
+def _transfer_chunk(src, dest, size):
+    data = src.read(size)
+    if data:
+        dest.write(data)
+    return len(data)
+
+
 def _transfer_data(src, dest, length, chunk_size):
     """Transfer data between files (Python IO objects)."""
 
@@ -386,15 +703,16 @@ def _transfer_data(src, dest, length, chunk_size):
 
     for chunk in range(0, chunks):
         before = time.time()
-        data = tpool.execute(src.read, min(chunk_size, remaining_length))
+        # Read and write in a single round trip to the native thread.
+        transferred = tpool.execute(_transfer_chunk, src, dest,
+                                    min(chunk_size, remaining_length))
 
         # If we have reached end of source, discard any extraneous bytes from
         # destination volume if trim is enabled and stop writing.
-        if data == b'':
+        if not transferred:
             break
 
-        tpool.execute(dest.write, data)
-        remaining_length -= len(data)
+        remaining_length -= transferred
         delta = (time.time() - before)
         rate = (chunk_size / delta) / units.Ki
         LOG.debug("Transferred chunk %(chunk)s of %(chunks)s (%(rate)dK/s).",
@@ -406,6 +724,80 @@ def _transfer_data(src, dest, length, chunk_size):
     tpool.execute(dest.flush)
 
 
+def _libc():
+    global _LIBC
+    if _LIBC is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.fallocate64.argtypes = [ctypes.c_int, ctypes.c_int,
+                                     ctypes.c_int64, ctypes.c_int64]
+        _LIBC = libc
+    return _LIBC
+
+
+def _fallocate(fd, mode, offset, length):
+    if _libc().fallocate64(fd, mode, offset, length) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def _zero_file_range_in_place(fd, offset, length):
+    """Zero a range of a block device or of a regular file.
+
+    Returns False if the file is neither, so zeroes have to be written.
+    """
+    st = os.fstat(fd)
+    if stat.S_ISBLK(st.st_mode):
+        # Thin provisioned devices implement BLKZEROOUT without allocating
+        # the range.
+        tpool.execute(fcntl.ioctl, fd, _BLKZEROOUT,
+                      struct.pack('QQ', offset, length))
+        return True
+    if stat.S_ISREG(st.st_mode):
+        size = st.st_size
+        if offset < size:
+            tpool.execute(_fallocate, fd,
+                          _FALLOC_FL_PUNCH_HOLE | _FALLOC_FL_KEEP_SIZE,
+                          offset, min(length, size - offset))
+        if offset + length > size:
+            os.ftruncate(fd, offset + length)
+        return True
+    return False
+
+
+def zero_file_range(volume_file, offset, length, chunk_size=units.Mi):
+    """Zero length bytes of a volume file (Python IO object) at offset.
+
+    Holes are punched in regular files and block devices are zeroed with
+    BLKZEROOUT, so the range is not allocated on sparse files and thin
+    provisioned devices. Zeroes are written when neither is supported.
+    """
+    volume_file.flush()
+    try:
+        fd = volume_file.fileno()
+    except IOError:
+        fd = None
+
+    if fd is not None:
+        try:
+            if _zero_file_range_in_place(fd, offset, length):
+                return
+        except (IOError, OSError) as err:
+            LOG.debug("Unable to zero %(length)d bytes at %(offset)d in "
+                      "place, writing zeroes instead: %(err)s",
+                      {'length': length, 'offset': offset, 'err': err})
+
+    zeroes = b'\0' * min(chunk_size, length)
+    volume_file.seek(offset)
+    remaining_length = length
+    while remaining_length > 0:
+        data = zeroes[:min(chunk_size, remaining_length)]
+        tpool.execute(volume_file.write, data)
+        remaining_length -= len(data)
+        # yield to any other pending operations
+        eventlet.sleep(0)
+    tpool.execute(volume_file.flush)
+
+
 def _copy_volume_with_file(src, dest, size_in_m):
     src_handle = src
     if isinstance(src, six.string_types):
@@ -440,9 +832,99 @@ def _copy_volume_with_file(src, dest, size_in_m):
              {'size_in_m': size_in_m, 'mbps': mbps})
 
 
+def _copy_volume_range(throttle, src, dest, size_in_m, blocksize, sync,
+                       execute, ionice, sparse, offset_in_m=None):
+    with throttle.subcommand(src, dest) as throttle_cmd:
+        # Throttling and ionice only apply to the dd command.
+        if (CONF.volume_copy_engine == 'native' and
+                not throttle_cmd['prefix'] and ionice is None and
+                _native_copy_supported(src, dest)):
+            _copy_volume_in_process(src, dest, size_in_m, sync=sync,
+                                    sparse=sparse, offset_in_m=offset_in_m)
+        else:
+            _copy_volume_with_path(throttle_cmd['prefix'], src, dest,
+                                   size_in_m, blocksize, sync=sync,
+                                   execute=execute, ionice=ionice,
+                                   sparse=sparse, offset_in_m=offset_in_m)
+
+
+@contextlib.contextmanager
+def _chown_for_copy(src, dest):
+    """Own both paths for the whole of a copy done by several streams.
+
+    Concurrent streams opening the paths in the volume service would
+    otherwise restore the owner of a path while another one opens it.
+    """
+    if (CONF.volume_copy_engine == 'native' and
+            _native_copy_supported(src, dest)):
+        with utils.temporary_chown(src), utils.temporary_chown(dest):
+            yield
+    else:
+        yield
+
+
+def _copy_volume_parallel(src, dest, size_in_m, blocksize, streams, sync,
+                          execute, ionice, throttle, sparse, bps_limit,
+                          progress_callback):
+    """Copy a volume as ranges copied concurrently by several streams."""
+    range_m = int(min(_PARALLEL_COPY_RANGE_MB,
+                      max(_PARALLEL_COPY_MIN_RANGE_MB,
+                          math.ceil(size_in_m / float(streams * 4)))))
+    ranges = []
+    offset = 0
+    while offset < size_in_m:
+        ranges.append((offset, min(range_m, size_in_m - offset)))
+        offset += range_m
+
+    start_time = time.time()
+    state = {'started': 0, 'copied': 0, 'percent': 0}
+    errors = []
+
+    def _copy_range(offset, count):
+        if errors:
+            return
+        if bps_limit:
+            # Pace the start of the ranges to keep the average bandwidth of
+            # the whole copy under bps_limit.
+            delay = (state['started'] * units.Mi / float(bps_limit) -
+                     (time.time() - start_time))
+            state['started'] += count
+            if delay > 0:
+                eventlet.sleep(delay)
+        try:
+            _copy_volume_range(throttle, src, dest, count, blocksize, sync,
+                               execute, ionice, sparse, offset_in_m=offset)
+        except Exception:
+            errors.append(sys.exc_info())
+            return
+        state['copied'] += count
+        percent = int(state['copied'] * 100 / size_in_m)
+        if progress_callback and percent != state['percent']:
+            state['percent'] = percent
+            progress_callback(percent)
+
+    pool = eventlet.GreenPool(streams)
+    with _chown_for_copy(src, dest):
+        for offset, count in ranges:
+            if errors:
+                break
+            pool.spawn_n(_copy_range, offset, count)
+        pool.waitall()
+    if errors:
+        LOG.error(_LE("Volume copy from %(src)s to %(dest)s failed."),
+                  {'src': src, 'dest': dest})
+        six.reraise(*errors[0])
+
+    duration = max(1, time.time() - start_time)
+    LOG.info(_LI("Volume copy %(size_in_m).2f MB with %(streams)d streams "
+                 "at %(mbps).2f MB/s"),
+             {'size_in_m': size_in_m, 'streams': streams,
+              'mbps': size_in_m / duration})
+
+
 def copy_volume(src, dest, size_in_m, blocksize, sync=False,
                 execute=utils.execute, ionice=None, throttle=None,
-                sparse=False):
+                sparse=False, streams=1, bps_limit=0, progress_callback=None):
     """Copy data from the source volume to the destination volume.
 
     The parameters 'src' and 'dest' are both typically of type str, which
@@ -454,17 +936,24 @@ def copy_volume(src, dest, size_in_m, blocksize, sync=False,
     of type RawIOBase or any derivative that supports file operations such as
     read and write.  In this case, the handles are treated as file handles
     instead of file paths and, at present moment, throttling is unavailable.
+
+    Paths can be copied by several concurrent streams, each copying its own
+    ranges of the volume. bps_limit caps the average bandwidth of the whole
+    copy and progress_callback is called with the percentage copied, as
+    ranges complete.
     """
 
     if (isinstance(src, six.string_types) and
             isinstance(dest, six.string_types)):
         if not throttle:
             throttle = throttling.Throttle.get_default()
-        with throttle.subcommand(src, dest) as throttle_cmd:
-            _copy_volume_with_path(throttle_cmd['prefix'], src, dest,
-                                   size_in_m, blocksize, sync=sync,
-                                   execute=execute, ionice=ionice,
-                                   sparse=sparse)
+        if streams > 1 or bps_limit or progress_callback:
+            _copy_volume_parallel(src, dest, size_in_m, blocksize, streams,
+                                  sync, execute, ionice, throttle, sparse,
+                                  bps_limit, progress_callback)
+        else:
+            _copy_volume_range(throttle, src, dest, size_in_m, blocksize,
+                               sync, execute, ionice, sparse)
     else:
         _copy_volume_with_file(src, dest, size_in_m)
 
@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the backup compression algorithms on synthetic volume images.
+
+The image is made of chunks of random data (already compressed files),
+repetitive text-like data (logs, configuration, binaries) and zeroes (free
+space), in the given proportions. Every chunk is compressed and decompressed
+by a pool of threads, like the backup object writers do. The 'none'
+algorithm measures a plain copy of the chunks, as a baseline.
+
+    python tools/backup_compression_benchmark.py --size 512 --threads 4 \\
+        --algorithms zlib,bz2,zstd,lz4 --level zstd=3 --level lz4=0
+"""
+
+from __future__ import print_function
+
+import argparse
+import binascii
+import os
+import random
+import threading
+import time
+
+from six.moves import queue
+
+from cinder.backup import chunkeddriver
+
+
+def _text_chunk(size, rand):
+    words = [binascii.hexlify(os.urandom(rand.randint(2, 12)))
+             for _i in range(256)]
+    data = bytearray()
+    while len(data) < size:
+        data += b' '.join(rand.choice(words) for _i in range(16)) + b'\n'
+    return bytes(data[:size])
+
+
+def make_image(size_mib, chunk_size, random_pct, zero_pct, seed):
+    """Return the chunks of a synthetic volume image."""
+    rand = random.Random(seed)
+    text = _text_chunk(chunk_size, rand)
+    zeroes = b'\0' * chunk_size
+    chunks = []
+    for _i in range(size_mib * 1024 * 1024 // chunk_size):
+        kind = rand.uniform(0, 100)
+        if kind < random_pct:
+            chunks.append(os.urandom(chunk_size))
+        elif kind < random_pct + zero_pct:
+            chunks.append(zeroes)
+        else:
+            # Vary the text chunks so they are not all identical.
+            offset = rand.randint(0, chunk_size - 1)
+            chunks.append(text[offset:] + text[:offset])
+    return chunks
+
+
+def _run(func, items, threads):
+    """Apply func to every item with a pool of threads, return the time."""
+    work = queue.Queue()
+    for item in items:
+        work.put(item)
+    results = [None] * len(items)
+
+    def _worker():
+        while True:
+            try:
+                idx, data = work.get_nowait()
+            except queue.Empty:
+                return
+            results[idx] = func(data)
+
+    start = time.time()
+    workers = [threading.Thread(target=_worker) for _i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.time() - start, results
+
+
+class _Copier(object):
+    """Stands for the 'none' algorithm, which only copies the chunks."""
+
+    @staticmethod
+    def compress(data):
+        return bytearray(data)
+
+    decompress = compress
+
+
+def benchmark(algorithm, level, chunks, threads):
+    compressor = chunkeddriver.get_compressor(algorithm, level)
+    if compressor is None:
+        compressor = _Copier()
+    total = sum(len(chunk) for chunk in chunks)
+    comp_time, compressed = _run(compressor.compress,
+                                 list(enumerate(chunks)), threads)
+    decomp_time, _results = _run(compressor.decompress,
+                                 list(enumerate(compressed)), threads)
+    comp_total = sum(len(data) for data in compressed)
+    mib = total / float(1024 * 1024)
+    return {'algorithm': algorithm,
+            'level': 'default' if level is None else level,
+            'ratio': total / float(comp_total),
+            'compress': mib / comp_time,
+            'decompress': mib / decomp_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=256,
+                        help='Size of the image in MiB.')
+    parser.add_argument('--chunk-size', type=int, default=32 * 1024 * 1024,
+                        help='Size of the backup objects in bytes.')
+    parser.add_argument('--random', type=float, default=30,
+                        help='Percentage of incompressible chunks.')
+    parser.add_argument('--zero', type=float, default=40,
+                        help='Percentage of zero chunks.')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Number of chunks compressed concurrently.')
+    parser.add_argument('--algorithms', default='zlib,bz2,zstd,lz4',
+                        help='Comma separated algorithms to compare.')
+    parser.add_argument('--level', action='append', default=[],
+                        metavar='ALGORITHM=LEVEL',
+                        help='Compression level of an algorithm.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    levels = dict((algorithm, int(level)) for algorithm, level in
+                  (item.split('=', 1) for item in args.level))
+    chunks = make_image(args.size, args.chunk_size, args.random, args.zero,
+                        args.seed)
+
+    print('%-6s %-8s %8s %14s %14s' % ('algo', 'level', 'ratio',
+                                       'compress MiB/s', 'decomp MiB/s'))
+    for algorithm in args.algorithms.split(','):
+        try:
+            result = benchmark(algorithm, levels.get(algorithm), chunks,
+                               args.threads)
+        except ValueError as err:
+            print('%-6s skipped: %s' % (algorithm, err))
+            continue
+        print('%(algorithm)-6s %(level)-8s %(ratio)8.2f %(compress)14.1f '
+              '%(decompress)14.1f' % result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the filter scheduler on a synthetic fleet of volume backends.
+
+Capability reports are generated for the given number of hosts and pools
+per host and fed through HostManager.update_service_capabilities, then
+volume creations, retypes and pool listings are scheduled against them.
+The database and the volume RPC API are replaced by mocks, so only the
+scheduler itself is measured. The time spent in each filter and weigher is
+reported along with the latency of each operation, as JSON:
+
+    python tools/scheduler_benchmark.py --hosts 200 --pools 10 \\
+        --requests 500 --filters AvailabilityZoneFilter,CapacityFilter \\
+        --weighers CapacityWeigher --output results.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import random
+import sys
+import time
+import uuid
+
+import mock
+from oslo_config import cfg
+from oslo_utils import timeutils
+
+from cinder import context
+from cinder import exception
+from cinder import objects
+from cinder.scheduler import filter_scheduler
+
+
+CONF = cfg.CONF
+CONF.import_opt('scheduler_default_filters', 'cinder.scheduler.host_manager')
+CONF.import_opt('scheduler_default_weighers', 'cinder.scheduler.host_manager')
+
+
+def make_capabilities(host_index, pools, rand):
+    """Return a capability report like the volume drivers send."""
+    pool_reports = []
+    for pool_index in range(pools):
+        total = rand.choice([1024, 10240, 102400])
+        allocated = rand.randint(0, total)
+        thin = rand.random() < 0.5
+        pool_reports.append({
+            'pool_name': 'pool%d' % pool_index,
+            'total_capacity_gb': total,
+            'free_capacity_gb': total - allocated,
+            'allocated_capacity_gb': allocated,
+            'provisioned_capacity_gb': allocated,
+            'reserved_percentage': rand.choice([0, 5, 10]),
+            'max_over_subscription_ratio': 20.0 if thin else 1.0,
+            'thin_provisioning_support': thin,
+            'thick_provisioning_support': not thin,
+            'QoS_support': rand.random() < 0.5,
+            'multiattach': True,
+        })
+    return {'volume_backend_name': 'backend%d' % (host_index % 4),
+            'vendor_name': 'Open Source',
+            'driver_version': '1.0',
+            'storage_protocol': 'iSCSI',
+            'pools': pool_reports}
+
+
+def make_services(hosts, zones):
+    return [dict(id=i + 1, host=host, topic=CONF.volume_topic,
+                 disabled=False, availability_zone='zone%d' % (i % zones),
+                 updated_at=timeutils.utcnow())
+            for i, host in enumerate(hosts)]
+
+
+def make_request_spec(size, extra_specs, host=None):
+    volume_id = str(uuid.uuid4())
+    volume_properties = {'size': size, 'project_id': 'benchmark',
+                         'user_id': 'benchmark', 'host': host}
+    return {'volume_id': volume_id,
+            'volume_type': {'name': 'benchmark',
+                            'extra_specs': dict(extra_specs)},
+            'volume_properties': volume_properties}
+
+
+class Timings(object):
+    """Time spent in the filters and weighers, by class name."""
+
+    def __init__(self):
+        self.filters = collections.defaultdict(list)
+        self.weighers = collections.defaultdict(list)
+
+    def reset(self):
+        self.filters.clear()
+        self.weighers.clear()
+
+    def _patch(self, classes, method, samples):
+        # Get all the methods first, a class may inherit from another one
+        # of the list.
+        originals = [(cls, getattr(cls, method)) for cls in classes]
+        patchers = []
+        for cls, original in originals:
+            patchers.append(mock.patch.object(
+                cls, method, self._timed(original, cls.__name__, samples)))
+        return patchers
+
+    @staticmethod
+    def _timed(func, name, samples):
+        def wrapper(self, *args, **kwargs):
+            start = time.time()
+            try:
+                result = func(self, *args, **kwargs)
+                # filter_all may return a generator, consume it here.
+                return None if result is None else list(result)
+            finally:
+                samples[name].append(time.time() - start)
+        return wrapper
+
+    def patch(self, host_manager):
+        return (self._patch(host_manager.filter_classes, 'filter_all',
+                            self.filters) +
+                self._patch(host_manager.weight_classes, 'weigh_objects',
+                            self.weighers))
+
+
+def summarize(samples):
+    """Return latency statistics in milliseconds."""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {'count': count,
+            'total_ms': sum(ordered) * 1000,
+            'mean_ms': sum(ordered) * 1000 / count,
+            'p50_ms': ordered[count // 2] * 1000,
+            'p95_ms': ordered[min(count - 1, int(count * 0.95))] * 1000,
+            'max_ms': ordered[-1] * 1000}
+
+
+def run(name, func, iterations, timings):
+    """Call func the given number of times and return its statistics."""
+    timings.reset()
+    samples = []
+    failures = 0
+    for i in range(iterations):
+        start = time.time()
+        try:
+            func(i)
+        except exception.NoValidHost:
+            failures += 1
+        samples.append(time.time() - start)
+    result = summarize(samples)
+    result['failures'] = failures
+    result['filters'] = dict((cls_name, summarize(cls_samples)) for
+                             cls_name, cls_samples in timings.filters.items())
+    result['weighers'] = dict(
+        (cls_name, summarize(cls_samples)) for
+        cls_name, cls_samples in timings.weighers.items())
+    print('%-28s %8.3f ms/op %6d failures' % (name, result['mean_ms'],
+                                              failures), file=sys.stderr)
+    return result
+
+
+def benchmark(args):
+    rand = random.Random(args.seed)
+    hosts = ['host%04d@lvm' % i for i in range(args.hosts)]
+    reports = [make_capabilities(i, args.pools, rand)
+               for i in range(args.hosts)]
+    extra_specs = dict(item.split('=', 1) for item in args.extra_spec)
+
+    if args.filters:
+        CONF.set_override('scheduler_default_filters',
+                          args.filters.split(','))
+    if args.weighers:
+        CONF.set_override('scheduler_default_weighers',
+                          args.weighers.split(','))
+
+    # The host manager looks the volume services up when it is created,
+    # the database is replaced before building the scheduler.
+    patchers = [
+        mock.patch('cinder.db.sqlalchemy.api.service_get_all_by_topic',
+                   return_value=make_services(hosts, args.zones)),
+        mock.patch('cinder.db.sqlalchemy.api.volume_data_get_by_host',
+                   return_value={}),
+        mock.patch('cinder.utils.service_is_up', return_value=True),
+        mock.patch('cinder.scheduler.driver.volume_update_db'),
+    ]
+    for patcher in patchers:
+        patcher.start()
+    try:
+        with mock.patch('cinder.volume.rpcapi.VolumeAPI'):
+            scheduler = filter_scheduler.FilterScheduler()
+    except Exception:
+        for patcher in reversed(patchers):
+            patcher.stop()
+        raise
+    host_manager = scheduler.host_manager
+    ctxt = context.get_admin_context()
+    timings = Timings()
+    results = collections.OrderedDict()
+
+    def update_capabilities(i):
+        host_manager.update_service_capabilities('volume', hosts[i],
+                                                 reports[i])
+
+    def create_volume(i):
+        scheduler.schedule_create_volume(
+            ctxt, make_request_spec(args.size, extra_specs), {})
+
+    def retype_volume(i):
+        host = '%s#pool%d' % (rand.choice(hosts), rand.randrange(args.pools))
+        scheduler.find_retype_host(
+            ctxt, make_request_spec(args.size, extra_specs, host), {},
+            migration_policy='on-demand')
+
+    def get_pools(i):
+        scheduler.get_pools(ctxt, None)
+
+    timing_patchers = timings.patch(host_manager)
+    for patcher in timing_patchers:
+        patcher.start()
+    patchers.extend(timing_patchers)
+    try:
+        # The first reports are only stored, the host states are created
+        # when the volume services are looked up.  The next ones are
+        # applied as they are received.
+        run('initial capabilities', update_capabilities, args.hosts,
+            timings)
+        results['get_pools (first)'] = run('get_pools (first)', get_pools,
+                                           1, timings)
+        results['update_service_capabilities'] = run(
+            'update_service_capabilities', update_capabilities, args.hosts,
+            timings)
+        results['schedule_create_volume'] = run(
+            'schedule_create_volume', create_volume, args.requests, timings)
+        results['find_retype_host'] = run(
+            'find_retype_host', retype_volume, args.requests, timings)
+        results['get_pools'] = run('get_pools', get_pools, args.requests,
+                                   timings)
+    finally:
+        for patcher in reversed(patchers):
+            patcher.stop()
+
+    return {'config': {'hosts': args.hosts,
+                       'pools_per_host': args.pools,
+                       'zones': args.zones,
+                       'requests': args.requests,
+                       'size': args.size,
+                       'extra_specs': extra_specs,
+                       'filters': CONF.scheduler_default_filters,
+                       'weighers': CONF.scheduler_default_weighers,
+                       'seed': args.seed},
+            'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=100,
+                        help='Number of volume services.')
+    parser.add_argument('--pools', type=int, default=10,
+                        help='Number of pools of each volume service.')
+    parser.add_argument('--zones', type=int, default=1,
+                        help='Number of availability zones.')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Number of requests of each kind.')
+    parser.add_argument('--size', type=int, default=1,
+                        help='Size of the volumes in GB.')
+    parser.add_argument('--filters',
+                        help='Comma separated filters, the configured '
+                             'scheduler_default_filters by default.')
+    parser.add_argument('--weighers',
+                        help='Comma separated weighers, the configured '
+                             'scheduler_default_weighers by default.')
+    parser.add_argument('--extra-spec', action='append', default=[],
+                        metavar='KEY=VALUE',
+                        help='Extra spec of the volume type.')
+    parser.add_argument('--config-file', action='append', default=[],
+                        help='Cinder configuration file.')
+    parser.add_argument('--output',
+                        help='Write the results to this file instead of '
+                             'the standard output.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    CONF([], project='cinder', default_config_files=args.config_file)
+    objects.register_all()
+
+    results = benchmark(args)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == '__main__':
+    main()